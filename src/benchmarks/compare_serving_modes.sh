@@ -0,0 +1,55 @@
+#!/usr/bin/env bash
+# Compare the serving modes
+#
+# Runs the load test against a local uwsgi in threads mode and then in gevent mode,
+# with the database and RabbitMQ settings of the environment. Run from the src directory, eg:
+#
+#   bash benchmarks/compare_serving_modes.sh --clients 50 --duration 60
+#
+# Any arguments are passed to the load test. The results are written to $RESULTS (threads.json, gevent.json),
+# gevent.json includes the relative change compared to threads mode.
+
+set -u # crash on missing env
+set -e # stop on any error
+
+PORT=${PORT:-8143}
+RESULTS=${RESULTS:-/tmp/gob_management_load_test}
+URL="http://localhost:${PORT}"
+
+mkdir -p "${RESULTS}"
+
+serve() {
+  local mode=$1
+  shift
+  SERVING_MODE=${mode} uwsgi --http ":${PORT}" --module gobmanagement.wsgi --callable application \
+    --master --processes 1 --lazy-apps --http-websockets --buffer-size 32768 --need-app --die-on-term \
+    "$@" > "${RESULTS}/uwsgi_${mode}.log" 2>&1 &
+  UWSGI_PID=$!
+  for _ in $(seq 60); do
+    if curl -sf "${URL}/status/health/" > /dev/null; then
+      return
+    fi
+    sleep 1
+  done
+  echo "API did not start in ${mode} mode, see ${RESULTS}/uwsgi_${mode}.log"
+  kill "${UWSGI_PID}"
+  exit 1
+}
+
+stop() {
+  kill "${UWSGI_PID}"
+  wait "${UWSGI_PID}" || true
+}
+
+echo "Load test in threads mode"
+serve threads --enable-threads
+python -m benchmarks.load_test --url "${URL}" --mode threads "$@" > "${RESULTS}/threads.json"
+stop
+
+echo "Load test in gevent mode"
+serve gevent --gevent 100 --gevent-early-monkey-patch
+python -m benchmarks.load_test --url "${URL}" --mode gevent --baseline "${RESULTS}/threads.json" "$@" \
+  > "${RESULTS}/gevent.json"
+stop
+
+cat "${RESULTS}/gevent.json"
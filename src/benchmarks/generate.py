@@ -0,0 +1,289 @@
+"""Synthetic management data
+
+Fills the management database with synthetic jobs, jobsteps, logs, services and service tasks,
+using the gobcore management models. The data is generated from a seed, relative to the current time:
+the same arguments give the same data.
+
+Only use a local benchmark database, eg:
+
+    DATABASE_HOST_OVERRIDE=localhost DATABASE_PORT_OVERRIDE=5432 \\
+        python -m benchmarks.generate --jobs 10000 --logs 20000000 --truncate
+
+Missing tables are created from the models. Indexes that are created by migrations elsewhere are not created.
+"""
+import argparse
+import datetime
+import random
+import time
+
+from sqlalchemy import text
+
+from gobcore.model.sa.management import Base, Job, JobStep, Log, Service, ServiceTask
+
+from gobmanagement.database.base import engine
+
+TABLES = [Job, JobStep, Log, Service, ServiceTask]
+
+WORKFLOWS = {
+    "import": ["accept", "import", "compare", "update", "apply"],
+    "relate": ["prepare", "relate", "update", "apply"],
+    "export": ["export", "test"],
+    "check_relation": ["check"],
+}
+
+SOURCE_ENTITIES = [
+    (source, catalogue, entity)
+    for catalogue, entities, source in [
+        ("gebieden", ["buurten", "wijken", "stadsdelen", "ggwgebieden", "bouwblokken"], "DGDialog"),
+        ("meetbouten", ["meetbouten", "metingen", "referentiepunten", "rollagen"], "AMSBI"),
+        ("nap", ["peilmerken"], "AMSBI"),
+        ("bag", ["panden", "verblijfsobjecten", "nummeraanduidingen", "openbareruimtes", "woonplaatsen"], "BAG"),
+        ("brk", ["kadastraleobjecten", "zakelijkerechten", "tenaamstellingen", "aantekeningen"], "BRK"),
+        ("wkpb", ["beperkingen", "brondocumenten"], "Beperkingen"),
+    ]
+    for entity in entities
+]
+
+LEVELS = ["INFO"] * 85 + ["WARNING"] * 8 + ["ERROR"] * 2 + ["DATAINFO"] * 2 + ["DATAWARNING"] * 2 + ["DATAERROR"]
+
+MESSAGES = [
+    "Start {step}",
+    "End {step}",
+    "Read {count} records",
+    "{count} records have been compared",
+    "{count} events have been applied",
+    "Duplicate identification for {count} records",
+    "Missing bronwaarde for {count} records",
+    "Relation check has been completed, {count} records",
+    "Connection to the objectstore has been restored after {count} seconds",
+    "Validation failed for {count} records",
+]
+
+SERVICES = ["workflow", "import", "upload", "relate", "export", "test", "prepare", "distribute"]
+
+
+class Generator:
+
+    def __init__(self, jobs, logs, days, services, seed):
+        """
+        Initialize the generator
+
+        :param jobs: number of jobs
+        :param logs: approximate number of logs
+        :param days: the jobs are spread over the last number of days
+        :param services: number of services
+        :param seed: seed of the random generator
+        """
+        self.jobs = jobs
+        self.logs = logs
+        self.days = days
+        self.services = services
+        self.random = random.Random(seed)
+        self.now = datetime.datetime.now().replace(microsecond=0)
+
+    def _job(self, jobid, process_id, start):
+        workflow = self.random.choice(list(WORKFLOWS))
+        source, catalogue, entity = self.random.choice(SOURCE_ENTITIES)
+        duration = datetime.timedelta(seconds=self.random.randint(10, 4 * 3600))
+        status = "ended" if start + duration < self.now and self.random.random() < 0.95 else "started"
+        return {
+            "id": jobid,
+            "name": f"{catalogue}.{entity}.{workflow}",
+            "type": workflow,
+            "args": [catalogue, entity, source],
+            "start": start,
+            "end": start + duration if status == "ended" else None,
+            "status": status,
+            "user": self.random.choice([None, "user@amsterdam.nl"]),
+            "process_id": process_id,
+            "attribute": None,
+            "log_counts": {
+                "data_info": self.random.randint(0, 10),
+                "data_warning": self.random.randint(0, 100),
+                "data_error": self.random.randint(0, 5),
+            },
+        }
+
+    def _steps(self, job, first_stepid):
+        names = WORKFLOWS[job["type"]]
+        end = job["end"] or self.now
+        step_duration = (end - job["start"]) / len(names)
+        return [{
+            "id": first_stepid + i,
+            "jobid": job["id"],
+            "name": name,
+            "start": job["start"] + i * step_duration,
+            "end": job["start"] + (i + 1) * step_duration if job["end"] or i < len(names) - 1 else None,
+            "status": "ended" if job["end"] or i < len(names) - 1 else "started",
+        } for i, name in enumerate(names)]
+
+    def _log(self, job, step):
+        source, catalogue, entity = job["args"][2], job["args"][0], job["args"][1]
+        level = self.random.choice(LEVELS)
+        count = self.random.randint(1, 100000)
+        step_end = step["end"] or self.now
+        timestamp = step["start"] + (step_end - step["start"]) * self.random.random()
+        return {
+            "timestamp": timestamp,
+            "process_id": job["process_id"],
+            "jobid": job["id"],
+            "stepid": step["id"],
+            "source": source,
+            "application": source,
+            "destination": "Objectstore" if job["type"] == "export" else "Database",
+            "catalogue": catalogue,
+            "entity": entity,
+            "level": level,
+            "name": job["name"],
+            "msgid": f"{level.lower()}_{self.random.randint(1, 50)}",
+            "msg": self.random.choice(MESSAGES).format(step=step["name"], count=count),
+            "data": {"id": str(count), "bronwaarde": str(count)} if level.startswith("DATA") else None,
+        }
+
+    def jobs_and_logs(self):
+        """
+        Generate the jobs, in order of start time, each with its steps and logs
+
+        The number of logs per job is exponentially distributed so that some jobs have many logs.
+
+        :return: generator of (job, steps, logs)
+        """
+        interval = datetime.timedelta(days=self.days) / max(self.jobs, 1)
+        start = self.now - datetime.timedelta(days=self.days)
+        stepid = 1
+        process_id = None
+        for jobid in range(1, self.jobs + 1):
+            if process_id is None or self.random.random() < 0.5:
+                process_id = f"{start.timestamp():.0f}.{jobid}"
+            job = self._job(jobid, process_id, start)
+            steps = self._steps(job, stepid)
+            stepid += len(steps)
+            n_logs = int(self.random.expovariate(self.jobs / self.logs)) if self.logs else 0
+            logs = sorted((self._log(job, self.random.choice(steps)) for _ in range(n_logs)),
+                          key=lambda log: log["timestamp"])
+            yield job, steps, logs
+            start += interval
+
+    def services_and_tasks(self):
+        services, tasks = [], []
+        for id in range(1, self.services + 1):
+            name = SERVICES[(id - 1) % len(SERVICES)]
+            services.append({
+                "id": id,
+                "name": name,
+                "host": f"{name}-{id}",
+                "pid": self.random.randint(1, 32768),
+                "is_alive": True,
+                "timestamp": self.now - datetime.timedelta(seconds=self.random.randint(0, 60)),
+            })
+            for i in range(3):
+                tasks.append({
+                    "id": len(tasks) + 1,
+                    "service_id": id,
+                    "name": f"{name}_task_{i}",
+                    "is_alive": True,
+                })
+        return services, tasks
+
+
+def _rows(model, rows):
+    """Only keep the values for the columns of the model."""
+    columns = set(model.__table__.columns.keys())
+    return [{key: value for key, value in row.items() if key in columns} for row in rows]
+
+
+class Writer:
+    """Inserts rows in batches."""
+
+    def __init__(self, connection, batch_size):
+        self._connection = connection
+        self._batch_size = batch_size
+        self._batches = {model: [] for model in TABLES}
+        self.counts = {model.__tablename__: 0 for model in TABLES}
+
+    def add(self, model, rows):
+        batch = self._batches[model]
+        batch.extend(rows)
+        if len(batch) >= self._batch_size:
+            self._flush(model)
+
+    def close(self):
+        for model in TABLES:
+            self._flush(model)
+
+    def _flush(self, model):
+        # Jobs and steps are inserted before the logs that refer to them
+        order = TABLES[:TABLES.index(model) + 1] if model in (Job, JobStep, Log) else [model]
+        for table in order:
+            batch = self._batches[table]
+            if batch:
+                self._connection.execute(table.__table__.insert(), _rows(table, batch))
+                self.counts[table.__tablename__] += len(batch)
+                batch.clear()
+
+
+def _check_empty(connection, truncate):
+    tables = ", ".join(model.__tablename__ for model in TABLES)
+    if truncate:
+        connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+        return
+
+    for model in TABLES:
+        if connection.execute(text(f"SELECT EXISTS (SELECT FROM {model.__tablename__})")).scalar():
+            raise SystemExit(f"Table {model.__tablename__} is not empty, use --truncate to remove its contents")
+
+
+def _reset_sequences(connection):
+    """Set the sequences past the explicitly inserted ids."""
+    for model in [Job, JobStep, Service, ServiceTask]:
+        table = model.__tablename__
+        connection.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"))
+
+
+def generate(jobs, logs, days=30, services=10, seed=1, batch_size=10000, truncate=False):
+    """
+    Fill the management database with synthetic data
+
+    :return: number of inserted rows per table
+    """
+    Base.metadata.create_all(engine, tables=[model.__table__ for model in TABLES])
+    generator = Generator(jobs, logs, days, services, seed)
+
+    with engine.begin() as connection:
+        _check_empty(connection, truncate)
+        writer = Writer(connection, batch_size)
+
+        services, tasks = generator.services_and_tasks()
+        writer.add(Service, services)
+        writer.add(ServiceTask, tasks)
+        for job, steps, job_logs in generator.jobs_and_logs():
+            writer.add(Job, [job])
+            writer.add(JobStep, steps)
+            writer.add(Log, job_logs)
+        writer.close()
+        _reset_sequences(connection)
+
+    with engine.begin() as connection:
+        connection.execute(text(f"ANALYZE {', '.join(model.__tablename__ for model in TABLES)}"))
+    return writer.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the management database with synthetic data")
+    parser.add_argument("--jobs", type=int, default=10000, help="number of jobs")
+    parser.add_argument("--logs", type=int, default=1000000, help="approximate number of logs")
+    parser.add_argument("--days", type=int, default=30, help="spread the jobs over the last number of days")
+    parser.add_argument("--services", type=int, default=10, help="number of services")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the random generator")
+    parser.add_argument("--batch-size", type=int, default=10000, help="number of rows per insert")
+    parser.add_argument("--truncate", action="store_true", help="remove any existing data first")
+    args = parser.parse_args()
+
+    start = time.time()
+    counts = generate(args.jobs, args.logs, args.days, args.services, args.seed, args.batch_size, args.truncate)
+    print(f"Generated {counts} in {time.time() - start:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
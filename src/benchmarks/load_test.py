@@ -0,0 +1,150 @@
+"""Load test
+
+Sends requests from a number of concurrent clients to a running management API and reports
+the throughput and latency per request type as JSON.
+
+Run the same load test against the API in each serving mode to compare them, eg:
+
+    SERVING_MODE=threads uwsgi ...
+    python -m benchmarks.load_test --mode threads --clients 50 --duration 60 > threads.json
+
+    SERVING_MODE=gevent UWSGI_GEVENT=100 UWSGI_GEVENT_EARLY_MONKEY_PATCH=1 uwsgi ...
+    python -m benchmarks.load_test --mode gevent --clients 50 --duration 60 --baseline threads.json > gevent.json
+
+The results of the second run then include the relative change of the throughput and latencies per request type.
+benchmarks/compare_serving_modes.sh runs both steps on a local uwsgi.
+
+The requests mix fast requests (health) with slow requests (jobs, queues), so that the results show
+whether slow requests hold up the other requests.
+"""
+import argparse
+import itertools
+import json
+import statistics
+import threading
+import time
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+JOBS_QUERY = "{ jobs(daysAgo: 10) { jobid name status infos warnings errors } }"
+
+REQUESTS = {
+    "health": ("get", "/status/health/", None),
+    "queues": ("get", "/gob_management/public/queues/", None),
+    "jobs": ("post", "/gob_management/public/graphql/", {"query": JOBS_QUERY}),
+}
+
+
+def _percentile(values, percentage):
+    index = min(len(values) - 1, int(len(values) * percentage / 100))
+    return sorted(values)[index]
+
+
+def _client(session, url, names, until, results, lock):
+    """
+    Send requests in a round robin fashion until the given time
+
+    :return: None
+    """
+    for name in itertools.cycle(names):
+        if time.time() >= until:
+            return
+        method, path, body = REQUESTS[name]
+        start = time.perf_counter()
+        try:
+            response = session.request(method, f"{url}{path}", json=body, timeout=60)
+            ok = response.ok
+        except requests.RequestException:
+            ok = False
+        duration = time.perf_counter() - start
+        with lock:
+            results[name].append((duration, ok))
+
+
+def load_test(url, clients, duration, names):
+    """
+    Run the load test
+
+    :param url: base url of the API
+    :param clients: number of concurrent clients
+    :param duration: duration of the test in seconds
+    :param names: names of the requests to send
+    :return: dictionary with the results per request name
+    """
+    results = defaultdict(list)
+    lock = threading.Lock()
+    until = time.time() + duration
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        for i in range(clients):
+            # Start each client with another request type
+            client_names = names[i % len(names):] + names[:i % len(names)]
+            executor.submit(_client, requests.Session(), url, client_names, until, results, lock)
+
+    report = {}
+    for name, measurements in results.items():
+        durations = [duration * 1000 for duration, _ in measurements]
+        report[name] = {
+            "requests": len(measurements),
+            "errors": sum(1 for _, ok in measurements if not ok),
+            "requests_per_second": round(len(measurements) / duration, 2),
+            "mean_ms": round(statistics.mean(durations), 2),
+            "p50_ms": round(_percentile(durations, 50), 2),
+            "p95_ms": round(_percentile(durations, 95), 2),
+            "p99_ms": round(_percentile(durations, 99), 2),
+            "max_ms": round(max(durations), 2),
+        }
+    return report
+
+
+def compare(report, baseline):
+    """
+    Compare the results with the results of a baseline run
+
+    :param report: results per request name
+    :param baseline: load test output of the baseline run
+    :return: dictionary per request name with the relative change of the throughput and latencies,
+        eg 0.1 for 10% more requests per second or a 10% higher latency
+    """
+    return {
+        name: {
+            key: round(result[key] / baseline["results"][name][key] - 1, 3)
+            for key in ["requests_per_second", "p50_ms", "p95_ms", "p99_ms"]
+            if baseline["results"][name][key]
+        }
+        for name, result in report.items()
+        if name in baseline["results"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the management API")
+    parser.add_argument("--url", default="http://localhost:8143", help="base url of the API")
+    parser.add_argument("--clients", type=int, default=20, help="number of concurrent clients")
+    parser.add_argument("--duration", type=int, default=30, help="duration in seconds")
+    parser.add_argument("--requests", nargs="+", choices=list(REQUESTS), default=list(REQUESTS),
+                        help="requests to send")
+    parser.add_argument("--mode", help="serving mode of the API, included in the output")
+    parser.add_argument("--baseline", help="output of an earlier run to compare with")
+    args = parser.parse_args()
+
+    report = load_test(args.url, args.clients, args.duration, args.requests)
+    output = {
+        "url": args.url,
+        "mode": args.mode,
+        "clients": args.clients,
+        "duration": args.duration,
+        "results": report
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        output["compared_to"] = {"mode": baseline.get("mode"), "change": compare(report, baseline)}
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Benchmarks
+
+Times the main paths of the management API against the management database, eg a database that has been filled
+by benchmarks.generate. The results are written as JSON. Compare the results of two commits by passing the results
+of the first commit as baseline:
+
+    python -m benchmarks.run --output before.json
+    git checkout <other commit>
+    python -m benchmarks.run --output after.json --baseline before.json
+
+Each benchmark is run a number of times after a warm up run. Caches are reset before each run,
+except for the benchmarks that measure a cached response.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+import types
+
+from graphql_relay import offset_to_cursor
+from sqlalchemy import text
+
+from gobcore.model.sa.management import Log
+
+from gobmanagement import schemas
+from gobmanagement.cache import MemoryBackend, ResolveCache
+from gobmanagement.catalog import SourceEntities
+from gobmanagement.database import get_process_state
+from gobmanagement.database.base import db_session, engine
+from gobmanagement.fields import encode_cursor
+from gobmanagement.socket import LogBroadcaster
+from gobmanagement.summary import JobSummary
+from gobmanagement.versions import data_versions
+
+JOBS_QUERY = """
+query Jobs($daysAgo: Int, $catalogue: String, $search: String) {
+  jobs(daysAgo: $daysAgo, catalogue: $catalogue, search: $search) {
+    jobid processId name source catalogue entity starttime endtime status infos warnings errors
+  }
+}
+"""
+
+SOURCE_ENTITIES_QUERY = "{ sourceEntities { source catalogue entity } }"
+
+LOGS_QUERY = """
+query Logs($after: String, $sort: [LogSortEnum]) {
+  logs(first: 100, after: $after, sort: $sort) {
+    edges { node { logid timestamp level msg } }
+  }
+}
+"""
+
+
+class _SocketIO:
+    """Counts the emitted events instead of sending them."""
+
+    def __init__(self):
+        self.emits = 0
+
+    def emit(self, *args, **kwargs):
+        self.emits += 1
+
+
+def _execute(query, **variables):
+    result = schemas.schema.execute(query, variables=variables, context_value=types.SimpleNamespace())
+    db_session.remove()
+    if result.errors:
+        raise result.errors[0]
+    return result.data
+
+
+def _reset_caches():
+    schemas.Query._resolve_cache = ResolveCache(backend=MemoryBackend())
+    data_versions._versions.clear()
+
+
+def _reset_summary():
+    _reset_caches()
+    schemas.Query._job_summary = JobSummary()
+
+
+def _reset_source_entities():
+    schemas.source_entities = SourceEntities()
+
+
+def _scalar(statement):
+    with engine.connect() as connection:
+        return connection.execute(text(statement)).scalar()
+
+
+# Logids of the logs that have been inserted by the benchmarks, deleted when the benchmarks end
+_copied_logids = []
+
+
+def _copy_recent_logs(count):
+    """Insert a copy of the most recent logs, as new logs."""
+    columns = ", ".join(f'"{column}"' for column in Log.__table__.columns.keys() if column != "logid")
+    with engine.begin() as connection:
+        result = connection.execute(text(f"""
+INSERT INTO logs ({columns})
+SELECT {columns} FROM (SELECT * FROM logs ORDER BY logid DESC LIMIT :count) recent ORDER BY logid
+RETURNING logid
+"""), {"count": count})
+        _copied_logids.extend(logid for logid, in result)
+
+
+def _delete_copied_logs():
+    """Delete the logs that have been inserted by _copy_recent_logs, so that the database is left as it was."""
+    if _copied_logids:
+        with engine.begin() as connection:
+            connection.execute(text("DELETE FROM logs WHERE logid = ANY(:logids)"), {"logids": _copied_logids})
+        _copied_logids.clear()
+
+
+def benchmarks(args):
+    """
+    The benchmarks as name => (setup, function)
+
+    The setup is run before each run of the function, only the function is timed.
+    """
+    middle_logid = _scalar("SELECT (MIN(logid) + MAX(logid)) / 2 FROM logs")
+    offset_cursor = offset_to_cursor(args.deep_offset)
+    process_id = _scalar("SELECT process_id FROM jobs ORDER BY id DESC LIMIT 1")
+    search = args.search
+
+    broadcaster = LogBroadcaster(_SocketIO())
+    broadcaster._check()
+
+    return {
+        "jobs_summary_build": (_reset_summary, lambda: _execute(JOBS_QUERY, daysAgo=10)),
+        "jobs": (_reset_caches, lambda: _execute(JOBS_QUERY, daysAgo=10)),
+        "jobs_cached": (None, lambda: _execute(JOBS_QUERY, daysAgo=10)),
+        "jobs_30_days": (_reset_caches, lambda: _execute(JOBS_QUERY, daysAgo=30)),
+        "jobs_catalogue": (_reset_caches, lambda: _execute(JOBS_QUERY, daysAgo=10, catalogue="meetbouten")),
+        "jobs_search": (_reset_caches, lambda: _execute(JOBS_QUERY, daysAgo=10, search=search)),
+        "source_entities_build": (_reset_source_entities, lambda: _execute(SOURCE_ENTITIES_QUERY)),
+        "source_entities": (None, lambda: _execute(SOURCE_ENTITIES_QUERY)),
+        "logs_deep_page_keyset": (None, lambda: _execute(LOGS_QUERY, after=encode_cursor(middle_logid),
+                                                         sort=["logid_asc"])),
+        "logs_deep_page_offset": (None, lambda: _execute(LOGS_QUERY, after=offset_cursor, sort=["timestamp_desc"])),
+        "process_state": (None, lambda: get_process_state(process_id)),
+        "broadcaster_poll_idle": (None, broadcaster._check),
+        "broadcaster_poll_new_logs": (lambda: _copy_recent_logs(args.new_logs), broadcaster._check),
+    }
+
+
+def _percentile(values, percentage):
+    index = min(len(values) - 1, int(len(values) * percentage / 100))
+    return sorted(values)[index]
+
+
+def run(setup, function, repeat):
+    """
+    Run a benchmark
+
+    :return: dictionary with the statistics of the durations in milliseconds
+    """
+    durations = []
+    for i in range(repeat + 1):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        duration = (time.perf_counter() - start) * 1000
+        if i > 0:
+            # The first run is a warm up run
+            durations.append(duration)
+
+    return {
+        "runs": repeat,
+        "min_ms": round(min(durations), 3),
+        "median_ms": round(statistics.median(durations), 3),
+        "mean_ms": round(statistics.mean(durations), 3),
+        "p95_ms": round(_percentile(durations, 95), 3),
+        "max_ms": round(max(durations), 3),
+    }
+
+
+def compare(results, baseline):
+    """
+    Compare the median durations with the baseline
+
+    :return: dictionary with the relative change of the median per benchmark, eg 0.1 for 10% slower
+    """
+    return {
+        name: round(result["median_ms"] / baseline["results"][name]["median_ms"] - 1, 3)
+        for name, result in results.items()
+        if name in baseline["results"] and baseline["results"][name]["median_ms"]
+    }
+
+
+def _commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the management API")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed runs per benchmark")
+    parser.add_argument("--only", nargs="+", help="names of the benchmarks to run")
+    parser.add_argument("--search", default="bronwaarde", help="search text for the jobs search benchmark")
+    parser.add_argument("--deep-offset", type=int, default=100000, help="offset of the deep logs page")
+    parser.add_argument("--new-logs", type=int, default=100, help="number of new logs per broadcaster poll")
+    parser.add_argument("--output", help="file to write the results to, default stdout")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = {}
+    try:
+        for name, (setup, function) in benchmarks(args).items():
+            if not args.only or name in args.only:
+                results[name] = run(setup, function, args.repeat)
+                print(f"{name}: {results[name]['median_ms']}ms", file=sys.stderr, flush=True)
+    finally:
+        _delete_copied_logs()
+
+    report = {
+        "commit": _commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "database": {table: _scalar(f"SELECT COUNT(*) FROM {table}")
+                     for table in ["jobs", "jobsteps", "logs", "services", "service_tasks"]},
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["compared_to"] = {"commit": baseline.get("commit"), "median_change": compare(results, baseline)}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,14 @@ This module is the main module for the API server.
 On startup the gobmanagement is instantiated.
 
 """
-from gobmanagement.config import API_PORT
-from gobmanagement.api import app, socketio
+from gobmanagement.serving import patch
 
+patch()
+
+from gobmanagement.config import API_PORT  # noqa: E402
+from gobmanagement.api import app, queue_sampler, socketio  # noqa: E402
+from gobmanagement.schemas import warm_up  # noqa: E402
+
+queue_sampler.start()
+warm_up()
 socketio.run(app=app, port=API_PORT)
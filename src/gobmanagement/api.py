@@ -1,18 +1,24 @@
 import re
 
-from flask import jsonify, request
-from flask_graphql import GraphQLView
+from flask import Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO
+from graphql.execution.middleware import MiddlewareManager
 
 from gobcore.message_broker.notifications import NOTIFY_EXCHANGE
 from gobcore.message_broker.config import WORKFLOW_QUEUE
 
-from gobmanagement import gob_model
-from gobmanagement.config import ALLOWED_ORIGINS, API_BASE_PATH, PUBLIC_API_BASE_PATH
+from gobmanagement import gob_model, metrics
+from gobmanagement.config import ALLOWED_ORIGINS, API_BASE_PATH, PUBLIC_API_BASE_PATH, SOCKETIO_MESSAGE_QUEUE, \
+    QUEUE_HISTORY_MAX_POINTS
 from gobmanagement.app import app
-from gobmanagement.database.base import db_session
-from gobmanagement.database import get_process_state
+from gobmanagement.database.base import db_session, engine
+from gobmanagement.database.pool import pool_statistics
+from gobmanagement.database.profiling import QueryOriginMiddleware, init_profiling, slow_queries
+from gobmanagement.database import get_process_state, get_log_batches
+from gobmanagement.export import EXPORT_FORMATS
+from gobmanagement.graphql_documents import DocumentCacheBackend, PersistedQueries, PersistedQueryView
+from gobmanagement.query_cost import QueryCost
 from gobmanagement.schemas import schema
 from gobmanagement.socket import LogBroadcaster
 from gobmanagement.security import SecurityMiddleware
@@ -20,12 +26,38 @@ from gobmanagement.security import SecurityMiddleware
 from gobmanagement.jobs import JobHandler
 
 from gobmanagement.message_broker.management import get_queues, purge_queue
+from gobmanagement.message_broker.queue_history import QueueSampler
 
 
 def _health():
     return 'Connectivity OK'
 
 
+def _metrics():
+    """Metrics in the Prometheus text format
+
+    :return:
+    """
+    data, content_type = metrics.generate()
+    return Response(data, mimetype=content_type)
+
+
+def _slow_queries():
+    """The most recent slow queries of this process
+
+    :return:
+    """
+    return jsonify(slow_queries.get())
+
+
+def _pool():
+    """Statistics of the database connection pool of this process
+
+    :return:
+    """
+    return jsonify(pool_statistics.get(engine.pool))
+
+
 def _validate_request(valid_properties, data):
     """Checks if data confirms to valid_properties.
 
@@ -100,10 +132,17 @@ def _catalogs():
 
 CORS(app, origins=ALLOWED_ORIGINS)
 
-_graphql = GraphQLView.as_view(
+# A list of middleware would wrap the result of every field resolver in a promise, also for the nested fields
+graphql_middleware = MiddlewareManager(metrics.ResolverMetricsMiddleware(), QueryOriginMiddleware(),
+                                       wrap_in_promise=False)
+
+_graphql = PersistedQueryView.as_view(
     'graphql',
     schema=schema,
-    graphiql=True  # for having the GraphiQL interface
+    graphiql=True,  # for having the GraphiQL interface
+    backend=DocumentCacheBackend(query_cost=QueryCost()),
+    persisted_queries=PersistedQueries(),
+    middleware=graphql_middleware
 )
 
 
@@ -119,6 +158,38 @@ def _process_state(process_id):
     return jsonify(state)
 
 
+def _export_logs():
+    """Stream the logs of a job or process as NDJSON (default) or CSV.
+
+    The logs are selected by either the jobid or the process_id request argument.
+    The response is streamed, so the first logs are sent while the remaining logs are still being read.
+
+    :return:
+    """
+    valid_properties = {
+        'jobid': re.compile(r'^\d+$'),
+        'process_id': re.compile(r'^[\w.-]+$'),
+        'format': re.compile(f"^({'|'.join(EXPORT_FORMATS)})$"),
+    }
+    data = request.args.to_dict()
+    errors = _validate_request(valid_properties, data)
+    args = {key: data[key] for key in ['jobid', 'process_id'] if data.get(key)}
+    if len(args) != 1:
+        errors.append("Specify either a jobid or a process_id")
+
+    if errors:
+        return jsonify({'errors': errors}), 400
+
+    (column, value), = args.items()
+    format = data.get('format', 'ndjson')
+    chunks, mimetype = EXPORT_FORMATS[format]
+    return Response(
+        stream_with_context(chunks(get_log_batches(column, value))),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=logs_{column}_{value}.{format}'}
+    )
+
+
 def _workflow_state():
     """Return the workflow state as a list of queues {name, #messages_pending}.
 
@@ -144,6 +215,28 @@ def _queues():
     return jsonify(queues), status_code, {'Content-Type': 'application/json'}
 
 
+def _queue_history():
+    """Return the sampled depths and message rates of the queues over a time window.
+
+    Query parameters:
+    - seconds: length of the window up to now, default 3600
+    - points: maximum number of samples per queue, longer windows are downsampled
+    - queue: name of a queue to return, may be repeated, default all queues
+
+    :return:
+    """
+    try:
+        seconds = int(request.args.get('seconds', 3600))
+        points = int(request.args.get('points', QUEUE_HISTORY_MAX_POINTS))
+    except ValueError:
+        seconds = points = 0
+    if seconds <= 0 or points <= 0:
+        return jsonify({'error': 'seconds and points should be positive integers'}), 400
+
+    history = queue_sampler.history(seconds, points, request.args.getlist('queue') or None)
+    return jsonify(history)
+
+
 def _queue(queue_name):
     """Purge the queue with the specified name.
 
@@ -155,12 +248,18 @@ def _queue(queue_name):
     return jsonify(result), status_code, {'Content-Type': 'application/json'}
 
 
+# Register the metrics first to measure the requests that are denied by the security middleware too
+metrics.init_app(app, engine)
+init_profiling(engine)
 security_middleware = SecurityMiddleware(app)
 
 # Routes
 ROUTES = [
     # Health check URL
     ('/status/health/', _health, ['GET']),
+    ('/status/pool/', _pool, ['GET']),
+    ('/status/metrics/', _metrics, ['GET']),
+    ('/status/slow_queries/', _slow_queries, ['GET']),
 
     # Disabled for now. If needed, enable security middleware again in Openstack.
     # (f'{API_BASE_PATH}/job/', _start_job, ['POST']),
@@ -169,7 +268,9 @@ ROUTES = [
     # Public URLS
     (f'{PUBLIC_API_BASE_PATH}/catalogs/', _catalogs, ['GET']),
     (f'{PUBLIC_API_BASE_PATH}/graphql/', _graphql, ['GET', 'POST']),
+    (f'{PUBLIC_API_BASE_PATH}/logs/export/', _export_logs, ['GET']),
     (f'{PUBLIC_API_BASE_PATH}/queues/', _queues, ['GET']),
+    (f'{PUBLIC_API_BASE_PATH}/queues/history/', _queue_history, ['GET']),
     (f'{PUBLIC_API_BASE_PATH}/state/process/<process_id>', _process_state, ['GET']),
     (f'{PUBLIC_API_BASE_PATH}/state/workflow/', _workflow_state, ['GET'])
 ]
@@ -179,8 +280,11 @@ for route, view_func, methods in ROUTES:
 
 socketio = SocketIO(app,
                     path=f"{API_BASE_PATH}/socket.io",
-                    cors_allowed_origins=ALLOWED_ORIGINS)
-logBroadcaster = LogBroadcaster(socketio)
+                    cors_allowed_origins=ALLOWED_ORIGINS,
+                    message_queue=SOCKETIO_MESSAGE_QUEUE)
+logBroadcaster = LogBroadcaster(socketio, shared=SOCKETIO_MESSAGE_QUEUE is not None)
+# Started by the application entry points (wsgi, __main__)
+queue_sampler = QueueSampler()
 
 
 @app.teardown_appcontext
@@ -190,7 +294,17 @@ def shutdown_session(exception=None):
 
 @socketio.on('connect')
 def socket_connect():
-    logBroadcaster.on_connect()
+    logBroadcaster.on_connect(request.sid)
+
+
+@socketio.on('subscribe')
+def socket_subscribe(data=None):
+    return logBroadcaster.on_subscribe(request.sid, data)
+
+
+@socketio.on('unsubscribe')
+def socket_unsubscribe(data=None):
+    return logBroadcaster.on_unsubscribe(request.sid, data)
 
 
 @socketio.on_error_default
@@ -200,4 +314,4 @@ def error_handler(e):
 
 @socketio.on('disconnect')
 def socket_disconnect():
-    logBroadcaster.on_disconnect()
+    logBroadcaster.on_disconnect(request.sid)
@@ -3,43 +3,346 @@ Resolver caching
 
 Performance critical queries can be routed through the ResolveCache
 
+Results are cached per resolver name and (normalized) resolver arguments.
 If nothing has changed the cached response will be returned
+
+The cached responses are kept in a backend:
+- memory: responses are cached within the process
+- file: responses are serialized to a (shared memory) directory and shared by all processes on the node
+
+Both backends are bounded by the number of entries and by the (approximate) size of the cached responses.
+The least recently used entries are evicted first.
 """
+import fcntl
+import hashlib
+import os
+import pickle
+import stat
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from gobmanagement.config import RESOLVE_CACHE_BACKEND, RESOLVE_CACHE_DIR, RESOLVE_CACHE_MAX_ENTRIES, \
+    RESOLVE_CACHE_MAX_BYTES, RESOLVE_CACHE_TTL
+from gobmanagement.metrics import RESOLVE_CACHE_REQUESTS
+
+
+def _normalize(args):
+    """
+    Normalize resolver arguments into a hashable value
+
+    Dictionaries are normalized independent of the order of their keys
+
+    :param args: resolver arguments
+    :return: hashable representation of the arguments
+    """
+    if isinstance(args, dict):
+        return tuple(sorted((key, _normalize(value)) for key, value in args.items()))
+    if isinstance(args, (list, tuple)):
+        return tuple(_normalize(value) for value in args)
+    return args
+
+
+def _sizeof(obj, seen=None):
+    """
+    Approximate size in bytes of an object including the objects that it refers to
+
+    :param obj: any object
+    :param seen: ids of the objects that have already been counted
+    :return: size in bytes
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_sizeof(key, seen) + _sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += _sizeof(vars(obj), seen)
+    return size
+
+
+class MemoryBackend:
+    """Keeps the cached responses in the memory of the process."""
+
+    LOCKS = 64  # Number of locks to serialize the computation of responses
+
+    def __init__(self, max_entries=RESOLVE_CACHE_MAX_ENTRIES, max_bytes=RESOLVE_CACHE_MAX_BYTES):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(self.LOCKS)]
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Get the entry for the given key and mark it as most recently used
+
+        :param key: cache key
+        :return: cache entry or None
+        """
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        """
+        Store the entry under the given key and evict the least recently used entries if the cache is full
+
+        :param key: cache key
+        :param entry: cache entry
+        :return: None
+        """
+        entry = dict(entry, size=_sizeof(entry["response"]))
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous["size"]
+            self._cache[key] = entry
+            self._bytes += entry["size"]
+
+            # Always keep the most recent entry, even if it exceeds the maximum size on its own
+            while len(self._cache) > 1 and (len(self._cache) > self._max_entries or self._bytes > self._max_bytes):
+                _, evicted = self._cache.popitem(last=False)
+                self._bytes -= evicted["size"]
+                self.evictions += 1
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Serialize the computation of the response for the given key within the process
+
+        :param key: cache key
+        :return: None
+        """
+        with self._key_locks[hash(key) % self.LOCKS]:
+            yield
+
+    def stats(self):
+        with self._lock:
+            return {
+                "evictions": self.evictions,
+                "entries": len(self._cache),
+                "bytes": self._bytes,
+            }
+
+
+class FileBackend:
+    """Keeps the cached responses in files that are shared by all processes on the node.
+
+    Each response is serialized once (compressed pickle) and written atomically.
+    A file lock makes sure that only one process computes a response, the other processes wait and reuse it.
+    The keys are spread over a fixed number of lock files.
+
+    Cached responses are unpickled, anyone that can write to the directory can execute code in the service.
+    The directory is created accessible by the owner only, a directory that is writable by others is refused.
+    """
+
+    SUFFIX = ".cache"
+    # Number of lock files, the computations for keys that share a lock file are serialized
+    LOCKS = 16
+
+    def __init__(self, directory=RESOLVE_CACHE_DIR, max_entries=RESOLVE_CACHE_MAX_ENTRIES,
+                 max_bytes=RESOLVE_CACHE_MAX_BYTES):
+        self._directory = directory
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self.evictions = 0
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if os.stat(directory).st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"Cache directory {directory} must not be writable by others")
+
+    def _digest(self, key):
+        return hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._directory, self._digest(key) + self.SUFFIX)
+
+    def _lock_path(self, key):
+        return os.path.join(self._directory, f"{int(self._digest(key)[:8], 16) % self.LOCKS}.lock")
+
+    def get(self, key):
+        """
+        Get the entry for the given key and mark it as most recently used
+
+        :param key: cache key
+        :return: cache entry or None
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                entry = pickle.loads(zlib.decompress(file.read()))
+            os.utime(path)
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError):
+            return None
+        # Protect against hash collisions
+        return entry if entry["key"] == key else None
+
+    def set(self, key, entry):
+        """
+        Store the entry under the given key and evict the least recently used entries if the cache is full
+
+        :param key: cache key
+        :param entry: cache entry
+        :return: None
+        """
+        data = zlib.compress(pickle.dumps(dict(entry, key=key), pickle.HIGHEST_PROTOCOL))
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _entries(self):
+        """
+        Returns the cache files, least recently used first
+
+        :return: list of (path, size)
+        """
+        entries = []
+        for name in os.listdir(self._directory):
+            if name.endswith(self.SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self._directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, os.path.join(self._directory, name), stat.st_size))
+        return [(path, size) for _, path, size in sorted(entries)]
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size in entries)
+        while len(entries) > 1 and (len(entries) > self._max_entries or total > self._max_bytes):
+            path, size = entries.pop(0)
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Serialize the computation of the response for the given key over all processes
+
+        :param key: cache key
+        :return: None
+        """
+        with open(self._lock_path(key), "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size in entries),
+        }
+
+
+_BACKENDS = {
+    "memory": MemoryBackend,
+    "file": FileBackend,
+}
 
 
 class ResolveCache:
 
-    def __init__(self):
+    def __init__(self, backend=None, ttl=RESOLVE_CACHE_TTL):
         """
         Initialize the cache
+
+        :param backend: backend to store the responses, defaults to the configured backend
+        :param ttl: maximum age in seconds of a cached response, None or 0 for no maximum
         """
-        self._cache = {}
+        self._backend = backend or _BACKENDS[RESOLVE_CACHE_BACKEND]()
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
-    def resolve(self, name, id, query, get_response):
+    def resolve(self, name, id, args, get_response):
         """
         Resolve the given query out of the cache if nothing has changed
-        Update the cache if the id or query has changed
+        Update the cache if the id has changed or the cached response has expired
 
-        :param name: name under which the result will be cached
+        Responses should be plain data (lists, dicts and scalars) so that they can be shared between processes
+
+        :param name: name of the resolver
         :param id: identifier of the result, recompute if it has changed
-        :param query: query string to execute, recompute if it has changed
+        :param args: resolver arguments or query, results are cached per name and args
         :param get_response: function to (re-)compute the response (re-exec query)
         :return: Response for the given query
         """
-        response = None
-        if name in self._cache:
-            # Cached response exist
-            cached_result = self._cache[name]
-            if cached_result["id"] == id and cached_result["query"] == query:
-                # No parameters have changed, respond from cache
-                response = cached_result["response"]
+        key = (name, _normalize(args))
+        response = self._get(key, id)
+        if response is not None:
+            return response
+
+        with self._backend.lock(key):
+            # The response might have been computed while waiting for the lock
+            response = self._get(key, id)
+            if response is not None:
+                return response
 
-        if response is None:
             # Recompute if no cached result exists or cache is not up to date
-            self._cache[name] = {
+            with self._lock:
+                self.misses += 1
+            RESOLVE_CACHE_REQUESTS.labels(resolver=name, result="miss").inc()
+            response = get_response()
+            self._backend.set(key, {
                 "id": id,
-                "query": query,
-                "response": get_response(),
+                "response": response,
+                "timestamp": time.time(),
+            })
+        return response
+
+    def _get(self, key, id):
+        """
+        Get the cached response for the given key if it is up to date
+
+        :param key: cache key
+        :param id: identifier of the result
+        :return: cached response or None
+        """
+        entry = self._backend.get(key)
+        if entry is not None and entry["id"] == id and not self._is_expired(entry):
+            # No parameters have changed, respond from cache
+            with self._lock:
+                self.hits += 1
+            RESOLVE_CACHE_REQUESTS.labels(resolver=key[0], result="hit").inc()
+            return entry["response"]
+
+    def stats(self):
+        """
+        Returns the cache statistics
+
+        :return: dictionary with hits, misses, evictions, entries and bytes
+        """
+        with self._lock:
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
             }
+        return dict(stats, **self._backend.stats())
 
-        return self._cache[name]["response"]
+    def _is_expired(self, entry):
+        return bool(self._ttl) and time.time() - entry["timestamp"] > self._ttl
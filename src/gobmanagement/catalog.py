@@ -0,0 +1,120 @@
+"""Source entities catalog
+
+Keeps the distinct combinations of source, catalogue and entity in the logs in memory.
+
+The catalog is updated incrementally: only the logs that have been added since the previous update are read.
+The version of the catalog is a hash of its contents, so it is equal for all processes that hold the same catalog.
+"""
+import hashlib
+import threading
+import time
+
+from sqlalchemy import text
+
+from gobmanagement.config import SOURCE_ENTITIES_REBUILD_INTERVAL
+from gobmanagement.database.base import session_scope
+
+_SOURCE_ENTITIES = text("""
+SELECT DISTINCT source, catalogue, entity
+FROM logs
+WHERE logid > :after_logid
+AND   logid <= :last_logid
+""")
+
+
+def _sort_key(source_entity):
+    return tuple(value or "" for value in source_entity)
+
+
+class SourceEntities:
+
+    def __init__(self, rebuild_interval=SOURCE_ENTITIES_REBUILD_INTERVAL):
+        """
+        Initialize an empty catalog
+
+        :param rebuild_interval: number of seconds after which the catalog is rebuilt from scratch
+        """
+        self._rebuild_interval = rebuild_interval
+        self._source_entities = set()
+        self._sorted = []
+        self._version = None
+        self._last_logid = None
+        self._built_at = None
+        self._rebuilder = None
+        self._lock = threading.Lock()
+
+    def update(self, last_logid):
+        """
+        Add the combinations of all logs up to and including last_logid
+
+        The catalog is periodically rebuilt in the background to drop combinations of deleted logs
+        and to include any logs that were committed out of logid order, meanwhile the current catalog is used.
+
+        :param last_logid: logid of the most recent log
+        :return: None
+        """
+        with self._lock:
+            if self._built_at is None:
+                self._built_at = time.time()
+            elif time.time() - self._built_at > self._rebuild_interval and \
+                    (self._rebuilder is None or not self._rebuilder.is_alive()):
+                self._rebuilder = threading.Thread(target=self._rebuild, args=(last_logid,), daemon=True)
+                self._rebuilder.start()
+
+            if last_logid is None or last_logid == self._last_logid:
+                return
+
+            with session_scope(True) as session:
+                rows = session.execute(_SOURCE_ENTITIES, {
+                    "after_logid": self._last_logid or 0,
+                    "last_logid": last_logid
+                })
+                new_source_entities = {tuple(row) for row in rows} - self._source_entities
+            self._last_logid = last_logid
+
+            if new_source_entities or self._version is None:
+                self._source_entities |= new_source_entities
+                self._sorted = sorted(self._source_entities, key=_sort_key)
+                self._version = hashlib.sha1(repr(self._sorted).encode()).hexdigest()[:16]
+
+    def _rebuild(self, last_logid):
+        """
+        Build a new catalog up to last_logid and replace the current catalog by it
+
+        Logs after last_logid are added to the new catalog by the next update
+
+        :param last_logid: logid of the most recent log
+        :return: None
+        """
+        catalog = SourceEntities(self._rebuild_interval)
+        try:
+            catalog.update(last_logid)
+        except Exception as e:
+            print(f"Source entities rebuild failed: {str(e)}")
+            catalog = None
+
+        with self._lock:
+            if catalog is None:
+                # Try again after the rebuild interval
+                self._built_at = time.time()
+                return
+            self._source_entities = catalog._source_entities
+            self._sorted = catalog._sorted
+            self._version = catalog._version
+            self._last_logid = catalog._last_logid
+            self._built_at = catalog._built_at
+
+    def get(self):
+        """
+        Get the catalog
+
+        :return: sorted list of (source, catalogue, entity) tuples
+        """
+        return self._sorted
+
+    @property
+    def version(self):
+        return self._version
+
+
+source_entities = SourceEntities()
@@ -1,6 +1,7 @@
 from sqlalchemy import func, text
 
-from gobmanagement.database.base import session_scope
+from gobmanagement.config import LOG_EXPORT_BATCH_SIZE
+from gobmanagement.database.base import session_scope, engine
 
 from gobcore.model.sa.management import Log, Service
 
@@ -71,3 +72,67 @@ def get_process_state(process_id):
     process_state = [dict(row) for row in result.fetchall()]
     result.close()
     return process_state
+
+
+LOG_EXPORT_COLUMNS = ["logid", "timestamp", "process_id", "jobid", "stepid", "source", "application", "destination",
+                      "catalogue", "entity", "level", "name", "msgid", "msg", "data"]
+
+
+def get_log_batches(column, value, batch_size=LOG_EXPORT_BATCH_SIZE):
+    """
+    Yields the logs of a job or process in batches, ordered by logid
+
+    The logs are read using a server side cursor so that memory usage does not depend on the number of logs.
+    DATAINFO, DATAWARNING and DATAERROR logs are not returned
+
+    :param column: jobid or process_id
+    :param value: value to select the logs on
+    :param batch_size: number of logs per batch
+    :return: generator of lists of logs
+    """
+    assert column in ["jobid", "process_id"]
+
+    # Use query parameters to protect the query against SQL injection
+    stmt = text(f"""
+SELECT {", ".join(LOG_EXPORT_COLUMNS)}
+FROM   logs
+WHERE  {column} = :value
+AND    level NOT LIKE 'DATA%'
+ORDER BY logid
+""").bindparams(value=value)
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(stmt)
+        batch = result.fetchmany(batch_size)
+        while batch:
+            yield [dict(row) for row in batch]
+            batch = result.fetchmany(batch_size)
+        result.close()
+
+
+NEW_LOGS_COLUMNS = ["logid", "timestamp", "process_id", "jobid", "stepid", "source", "catalogue", "entity", "level",
+                    "name", "msg"]
+
+
+def get_new_logs(session, after_logid, last_logid, limit):
+    """
+    Returns the logs in the range (after_logid, last_logid], ordered by logid
+
+    DATAINFO, DATAWARNING and DATAERROR logs are not returned
+
+    :param session: database session
+    :param after_logid: logid of the last log that is already known
+    :param last_logid: logid of the most recent log
+    :param limit: maximum number of logs to return
+    :return: list of tuples of NEW_LOGS_COLUMNS values
+    """
+    stmt = text(f"""
+SELECT {", ".join(NEW_LOGS_COLUMNS)}
+FROM   logs
+WHERE  logid > :after_logid
+AND    logid <= :last_logid
+AND    level NOT LIKE 'DATA%'
+ORDER BY logid
+LIMIT  :limit
+""")
+    result = session.execute(stmt, {"after_logid": after_logid, "last_logid": last_logid, "limit": limit})
+    return [tuple(row) for row in result]
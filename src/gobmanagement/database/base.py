@@ -6,11 +6,20 @@ from sqlalchemy.orm import scoped_session, sessionmaker
 
 from gobcore.model.sa.management import Base
 
-from .config import GOB_MANAGEMENT_DB
+from .config import GOB_MANAGEMENT_DB, DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, DATABASE_POOL_TIMEOUT, \
+    DATABASE_POOL_PRE_PING, DATABASE_POOL_RECYCLE
+from .pool import InstrumentedQueuePool
 
 # Create database engine
 db_uri = URL.create(**GOB_MANAGEMENT_DB)
-engine = create_engine(db_uri, connect_args={'sslmode': 'require'})
+engine = create_engine(db_uri,
+                       connect_args={'sslmode': 'require'},
+                       poolclass=InstrumentedQueuePool,
+                       pool_size=DATABASE_POOL_SIZE,
+                       max_overflow=DATABASE_MAX_OVERFLOW,
+                       pool_timeout=DATABASE_POOL_TIMEOUT,
+                       pool_pre_ping=DATABASE_POOL_PRE_PING,
+                       pool_recycle=DATABASE_POOL_RECYCLE)
 
 # Declarative base model to create database tables and classes
 Base.metadata.bind = engine  # Bind engine to metadata of the base class
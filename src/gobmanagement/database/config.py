@@ -14,3 +14,24 @@ GOB_MANAGEMENT_DB = {
     'host': os.getenv("DATABASE_HOST_OVERRIDE", "localhost"),
     'port': os.getenv("DATABASE_PORT_OVERRIDE", 5407),
 }
+
+# Connection pool of the database engine, the pool is per process
+# Maximum number of connections of a process = DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", 5))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", 10))
+# Number of seconds to wait for a connection before a checkout fails
+DATABASE_POOL_TIMEOUT = int(os.getenv("DATABASE_POOL_TIMEOUT", 30))
+# Test connections on checkout, invalid connections are replaced transparently
+DATABASE_POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "true").lower() == "true"
+# Number of seconds after which connections are replaced, -1 to never replace connections
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", 1800))
+
+# Statements that take longer than this number of milliseconds are logged and kept as slow queries
+SLOW_QUERY_THRESHOLD = int(os.getenv("SLOW_QUERY_THRESHOLD", 500))
+# Fraction (0..1) of the slow queries for which the query plan is captured by EXPLAIN (ANALYZE, BUFFERS)
+# The statement is then executed a second time, 0 to never capture query plans
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", 0))
+# Maximum number of milliseconds that capturing a query plan may take
+SLOW_QUERY_EXPLAIN_TIMEOUT = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT", 5000))
+# Number of most recent slow queries that are kept
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", 100))
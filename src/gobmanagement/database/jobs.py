@@ -0,0 +1,186 @@
+"""Jobs query
+
+Builds the statement that aggregates the logs per job.
+
+Each filter is applied at the most selective level, jobid and start date on the jobs table and
+search on the logs that are aggregated.
+Source, catalogue and entity are the values of the first log of a job, as in the job summary,
+they are applied on the first log and not on the logs that are aggregated.
+All values are passed as bound parameters so that the statement text only depends on the filters that are used.
+"""
+import datetime
+
+from sqlalchemy import text
+
+_JOBS_QUERY = """
+SELECT
+    firstlog.process_id,
+    job.id                       AS jobid,
+    job.end - job.start          AS bruto_duration,
+    steps.duration               AS netto_duration,
+    now() - job.start as time_ago,
+    CASE WHEN now() - job.start <= '24 hours'::interval THEN ' 0 - 24 uur'
+         WHEN now() - job.start <= '48 hours'::interval THEN '24 - 48 uur'
+         WHEN now() - job.start <= '96 hours'::interval THEN '48 - 96 uur'
+         ELSE 'Ouder'
+        END                       AS age_category,
+    date(job.start)               AS day,
+    firstlog.name                 AS name,
+    firstlog.source               AS source,
+    firstlog.application          AS application,
+    firstlog.destination          AS destination,
+    firstlog.catalogue            AS catalogue,
+    firstlog.entity               AS entity,
+    job.start                     AS starttime,
+    date_part('year', job.start)  AS startyear,
+    date_part('month', job.start) AS startmonth,
+    job.end                       AS endtime,
+    date_part('year', job.end)    AS endyear,
+    date_part('month', job.end)   AS endmonth,
+    step.name                     AS step,
+    CASE WHEN
+         job.status = 'ended'
+         THEN job.status
+         ELSE step.status
+         END                      AS status,
+    job.user                      AS user,
+    job.attribute                 AS attribute,
+    log.infos,
+    log.warnings,
+    log.errors,
+    COALESCE(job.log_counts->>'data_info', '0')::int     AS datainfos,
+    COALESCE(job.log_counts->>'data_warning', '0')::int  AS datawarnings,
+    COALESCE(job.log_counts->>'data_error', '0')::int    AS dataerrors
+FROM (
+    SELECT
+        sum(case when log.level = 'INFO' then 1 end) as infos,
+        sum(case when log.level = 'WARNING' then 1 end) as warnings,
+        sum(case when log.level = 'ERROR' then 1 end) as errors,
+        min(log.logid) as logid,
+        jobid
+    FROM logs log
+    WHERE {log_conditions}
+    GROUP BY log.jobid
+) log
+join logs firstlog on firstlog.logid = log.logid
+join jobs job ON job.id=log.jobid
+left join (
+    select jobid,
+           SUM(jobsteps.end - jobsteps.start) AS duration,
+           max(id) as stepid
+    from jobsteps
+    group by jobid
+) as steps on steps.jobid = log.jobid
+left join jobsteps step on step.id = steps.stepid
+WHERE {job_conditions}
+ORDER BY starttime DESC, jobid DESC
+"""
+
+_CHANGED_JOBIDS = text("""
+SELECT DISTINCT jobid
+FROM logs
+WHERE logid > :after_logid
+AND   logid <= :last_logid
+AND   jobid IS NOT NULL
+""")
+
+# Filters that are applied on the first log of a job
+_FIRSTLOG_FILTERS = ["source", "catalogue", "entity"]
+
+
+def _start_range(startyear, startmonth):
+    """
+    Returns the [start, end) range of job start times for the given year and optional month
+
+    :param startyear: year, as string
+    :param startmonth: month, as string or None
+    :return: tuple (start, end)
+    """
+    year = int(startyear)
+    if startmonth is None:
+        return datetime.datetime(year, 1, 1), datetime.datetime(year + 1, 1, 1)
+    month = int(startmonth)
+    start = datetime.datetime(year, month, 1)
+    end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+def _start_conditions(startyear, startmonth, params):
+    """
+    Returns the conditions on the job start time for the given year and/or month
+
+    A year (and month) is translated into a range on job.start.
+    As logs are never written before the start of their job, the range start also limits the logs to aggregate.
+
+    :param startyear: year, as string or None
+    :param startmonth: month, as string or None
+    :param params: query parameters, any parameters for the conditions are added
+    :return: tuple (log conditions, job conditions)
+    """
+    if startyear is not None:
+        params["start_from"], params["start_to"] = _start_range(startyear, startmonth)
+        return ["log.timestamp >= :start_from"], ["job.start >= :start_from", "job.start < :start_to"]
+    if startmonth is not None:
+        params["startmonth"] = int(startmonth)
+        return [], ["date_part('month', job.start) = :startmonth"]
+    return [], []
+
+
+def jobs_query(days_ago, search=None, jobids=None, **filters):
+    """
+    Returns the jobs query and its parameters for the given filters
+
+    :param days_ago: only aggregate logs that have been written in the last days_ago days
+    :param search: only aggregate logs whose message contains the search text (case insensitive)
+    :param jobids: only aggregate the logs of these jobs, eg the jobs that match a full text search
+    :param filters: jobid, source, catalogue, entity, startyear, startmonth
+    :return: tuple (statement, params)
+    """
+    params = {"days_ago": days_ago}
+    log_conditions = ["log.timestamp >= now() - :days_ago * '1 day'::interval"]
+    job_conditions = []
+
+    if search is not None:
+        params["search"] = f"%{search.lower()}%"
+        log_conditions.append("lower(log.msg) LIKE :search")
+
+    if jobids is not None:
+        params["jobids"] = list(jobids)
+        log_conditions.append("log.jobid = ANY(:jobids)")
+
+    if filters.get("jobid") is not None:
+        params["jobid"] = filters["jobid"]
+        log_conditions.append("log.jobid = :jobid")
+        job_conditions.append("job.id = :jobid")
+
+    for name in _FIRSTLOG_FILTERS:
+        if filters.get(name) is not None:
+            params[name] = filters[name]
+            job_conditions.append(f"firstlog.{name} = :{name}")
+
+    log_start, job_start = _start_conditions(filters.get("startyear"), filters.get("startmonth"), params)
+    log_conditions.extend(log_start)
+    job_conditions.extend(job_start)
+
+    statement = _JOBS_QUERY.format(
+        log_conditions=" AND ".join(log_conditions),
+        job_conditions=" AND ".join(job_conditions) or "True"
+    )
+    return statement, params
+
+
+def changed_jobids(session, after_logid, last_logid):
+    """
+    Get the ids of the jobs that have changed after the given log
+
+    These are the jobs that have logs in the range (after_logid, last_logid].
+    The range is read from the logid index. Jobs and steps are not scanned for start and end times,
+    the start and end of a job step are logged by the step itself.
+
+    :param session: database session
+    :param after_logid: logid of the last log that is already known
+    :param last_logid: logid of the most recent log
+    :return: set of jobids
+    """
+    result = session.execute(_CHANGED_JOBIDS, {"after_logid": after_logid, "last_logid": last_logid})
+    return {row.jobid for row in result}
@@ -0,0 +1,126 @@
+"""Change notifications
+
+Statement level triggers on the logs and services tables notify the listeners on the CHANNEL.
+
+The logs and services tables are owned by GOB-Core, the service only listens. The function and triggers
+are installed once by running:
+
+    python -m gobmanagement.database.notifications
+
+or by applying CREATE_TRIGGERS in a GOB-Core migration. A listener refuses to connect while the triggers are
+missing, so that the caller can fall back to polling.
+
+A notification only tells which table has changed. Notifications that are sent within the same transaction
+are delivered only once, so a bulk insert of logs results in a single notification.
+"""
+import select
+
+from gobmanagement.database.base import engine
+
+CHANNEL = "gob_management_changes"
+
+TRIGGERS = ["logs_gob_management_notify", "services_gob_management_notify"]
+
+CREATE_TRIGGERS = f"""
+CREATE OR REPLACE FUNCTION gob_management_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CHANNEL}', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT FROM pg_trigger WHERE tgname = 'logs_gob_management_notify') THEN
+        CREATE TRIGGER logs_gob_management_notify
+        AFTER INSERT ON logs
+        FOR EACH STATEMENT EXECUTE PROCEDURE gob_management_notify();
+    END IF;
+    IF NOT EXISTS (SELECT FROM pg_trigger WHERE tgname = 'services_gob_management_notify') THEN
+        CREATE TRIGGER services_gob_management_notify
+        AFTER INSERT OR UPDATE ON services
+        FOR EACH STATEMENT EXECUTE PROCEDURE gob_management_notify();
+    END IF;
+END;
+$$;
+"""
+
+_MISSING_TRIGGERS = """
+SELECT name
+FROM   unnest(%(names)s::text[]) AS name
+WHERE  NOT EXISTS (SELECT FROM pg_trigger WHERE tgname = name)
+"""
+
+
+class ChangeListener:
+
+    def __init__(self, channel=CHANNEL):
+        self._channel = channel
+        self._connection = None
+
+    def connect(self):
+        """
+        Open a dedicated connection and listen on the channel
+
+        The connection is detached from the pool, it is kept open for as long as the listener is used.
+        Raises an exception if the triggers that send the notifications are missing.
+
+        :return: None
+        """
+        connection = engine.raw_connection()
+        connection.detach()
+        self._connection = connection.connection
+        self._connection.autocommit = True
+        with self._connection.cursor() as cursor:
+            cursor.execute(_MISSING_TRIGGERS, {"names": TRIGGERS})
+            missing = [row[0] for row in cursor.fetchall()]
+            if missing:
+                raise RuntimeError(f"Missing notification triggers {', '.join(missing)}, "
+                                   "install them with python -m gobmanagement.database.notifications")
+            cursor.execute(f"LISTEN {self._channel}")
+
+    def wait(self, timeout, interrupt=None):
+        """
+        Wait for notifications
+
+        :param timeout: maximum number of seconds to wait
+        :param interrupt: optional object with a fileno(), waiting ends when it becomes readable
+        :return: list of the names of the changed tables, empty if no notifications arrived within timeout
+        """
+        connections = [self._connection] if interrupt is None else [self._connection, interrupt]
+        readable, _, _ = select.select(connections, [], [], timeout)
+        if self._connection not in readable:
+            return []
+        self._connection.poll()
+        payloads = [notify.payload for notify in self._connection.notifies]
+        self._connection.notifies.clear()
+        return payloads
+
+    def ping(self):
+        """
+        Check that the connection is still alive, raises an exception if it is not
+
+        :return: None
+        """
+        with self._connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def create_triggers():
+    """
+    Install the notification function and triggers
+
+    :return: None
+    """
+    with engine.begin() as connection:
+        connection.exec_driver_sql(CREATE_TRIGGERS)
+    print(f"Notification triggers {', '.join(TRIGGERS)} installed")
+
+
+if __name__ == "__main__":
+    create_triggers()
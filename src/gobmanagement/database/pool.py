@@ -0,0 +1,110 @@
+"""Connection pool
+
+The database engine uses an InstrumentedQueuePool, a QueuePool that keeps statistics on the checkouts:
+the number of checkouts, the time spent waiting for a connection, the number of overflow connections
+that have been opened and the number of checkouts that timed out.
+
+The statistics are per process, each (uwsgi) process has its own pool.
+"""
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolStatistics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.overflows = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def register_checkout(self, wait):
+        """
+        Register a checkout
+
+        :param wait: number of seconds spent waiting for the connection
+        :return: None
+        """
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def register_overflow(self):
+        with self._lock:
+            self.overflows += 1
+
+    def register_timeout(self, wait):
+        with self._lock:
+            self.timeouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def get(self, pool=None):
+        """
+        Get the statistics
+
+        :param pool: optional pool to include the current state of
+        :return: dictionary with the statistics
+        """
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            statistics = {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'overflows': self.overflows,
+                'wait_total_ms': round(self.wait_total * 1000, 3),
+                'wait_mean_ms': round(self.wait_total * 1000 / attempts, 3) if attempts else 0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+        if pool is not None:
+            statistics.update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+            })
+        return statistics
+
+
+pool_statistics = PoolStatistics()
+
+
+class InstrumentedQueuePool(QueuePool):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._checkout = threading.local()
+
+    def _do_get(self):
+        # QueuePool._do_get retries by calling itself, only the outermost call is measured
+        if getattr(self._checkout, "active", False):
+            return super()._do_get()
+
+        self._checkout.active = True
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_statistics.register_timeout(time.perf_counter() - start)
+            raise
+        finally:
+            self._checkout.active = False
+        pool_statistics.register_checkout(time.perf_counter() - start)
+        return connection
+
+    def _inc_overflow(self):
+        # The overflow counter starts at -pool_size, only connections beyond the pool size are overflows
+        opened = super()._inc_overflow()
+        if opened and self._overflow > 0:
+            pool_statistics.register_overflow()
+        return opened
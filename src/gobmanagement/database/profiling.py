@@ -0,0 +1,213 @@
+"""Query profiling
+
+The duration and row count of every statement are recorded in the metrics, by origin.
+The origin of a statement is the GraphQL root field resolver that executes it, eg Query.jobs,
+or else the route of the request, or 'other' for statements outside a request (eg the log broadcaster).
+
+Statements that take longer than SLOW_QUERY_THRESHOLD milliseconds are logged with their parameters
+and kept in a buffer of the most recent slow queries. For a sample of the slow SELECT statements the query plan
+is captured by EXPLAIN (ANALYZE, BUFFERS). The plans are captured by a background thread, on a separate connection
+in a read-only transaction with a statement timeout, and added to the slow query when they are available.
+"""
+import queue
+import random
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from gobmanagement.database.config import SLOW_QUERY_THRESHOLD, SLOW_QUERY_EXPLAIN_RATE, SLOW_QUERY_BUFFER_SIZE, \
+    SLOW_QUERY_EXPLAIN_TIMEOUT
+from gobmanagement.metrics import DB_QUERY_DURATION, DB_QUERY_ROWS
+
+# Maximum length of the parameters of a slow query
+_MAX_PARAMETERS_LENGTH = 1000
+# Maximum number of slow queries that wait for their query plan, any further slow queries are not explained
+_EXPLAIN_QUEUE_SIZE = 10
+
+_origin = ContextVar("query_origin", default=None)
+
+
+@contextmanager
+def query_origin(name):
+    """
+    Tag the statements that are executed within the context with the given origin
+
+    :param name: name of the origin
+    :return: None
+    """
+    token = _origin.set(name)
+    try:
+        yield
+    finally:
+        _origin.reset(token)
+
+
+def get_query_origin():
+    origin = _origin.get()
+    if origin is not None:
+        return origin
+    if has_request_context() and request.url_rule:
+        return request.url_rule.rule
+    return "other"
+
+
+class QueryOriginMiddleware:
+    """GraphQL middleware that tags the statements of the root field resolvers with the name of the field
+
+    Statements that are executed when a promise resolves (eg dataloader batches) are not tagged by the resolver.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if len(info.path) > 1:
+            return next(root, info, **args)
+
+        with query_origin(f"{info.parent_type.name}.{info.field_name}"):
+            return next(root, info, **args)
+
+
+class SlowQueries:
+    """Buffer of the most recent slow queries."""
+
+    def __init__(self, size=SLOW_QUERY_BUFFER_SIZE):
+        self._queries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, query):
+        with self._lock:
+            self._queries.append(query)
+
+    def get(self):
+        """
+        Get the slow queries
+
+        :return: list of slow queries, most recent first
+        """
+        with self._lock:
+            return list(reversed(self._queries))
+
+
+slow_queries = SlowQueries()
+
+
+def _is_select(statement):
+    return statement.lstrip().upper().startswith("SELECT")
+
+
+def _explain(engine, statement, parameters):
+    """
+    Get the query plan of a SELECT statement
+
+    The statement is explained on a separate connection so that a failure does not affect the running transaction.
+    EXPLAIN ANALYZE executes the statement, it runs in a read-only transaction that is rolled back
+    when the connection is returned to the pool.
+
+    :return: list of query plan lines
+    """
+    connection = None
+    try:
+        connection = engine.raw_connection()
+        cursor = connection.cursor()
+        cursor.execute("SET TRANSACTION READ ONLY")
+        cursor.execute("SET LOCAL statement_timeout = %s", (SLOW_QUERY_EXPLAIN_TIMEOUT,))
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+        return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"Explain failed: {str(e)}"]
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+class Explainer:
+    """Captures query plans in a background thread so that requests do not wait for them."""
+
+    def __init__(self, queue_size=_EXPLAIN_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, engine, statement, parameters, slow_query):
+        """
+        Capture the query plan of a SELECT statement and store it as the explain of the slow query
+
+        :param engine: SQLAlchemy engine
+        :param statement: statement to explain
+        :param parameters: parameters of the statement
+        :param slow_query: slow query dictionary
+        :return: True if the query plan will be captured
+        """
+        if not _is_select(statement):
+            return False
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="explainer", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((engine, statement, parameters, slow_query))
+        except queue.Full:
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            engine, statement, parameters, slow_query = self._queue.get()
+            try:
+                slow_query["explain"] = _explain(engine, statement, parameters)
+            finally:
+                self._queue.task_done()
+
+
+explainer = Explainer()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profiling_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_profiling_start", None)
+    if start is None:
+        return
+
+    duration = time.perf_counter() - start
+    origin = get_query_origin()
+    rows = max(cursor.rowcount, 0)
+    DB_QUERY_DURATION.labels(origin=origin).observe(duration)
+    DB_QUERY_ROWS.labels(origin=origin).inc(rows)
+
+    if duration * 1000 < SLOW_QUERY_THRESHOLD:
+        return
+
+    duration_ms = round(duration * 1000, 3)
+    parameters_text = repr(parameters)[:_MAX_PARAMETERS_LENGTH]
+    print(f"Slow query ({origin}, {duration_ms}ms, {rows} rows): {statement} {parameters_text}")
+    slow_query = {
+        "timestamp": time.time(),
+        "origin": origin,
+        "duration_ms": duration_ms,
+        "rows": rows,
+        "statement": statement,
+        "parameters": parameters_text,
+        "explain": None,
+    }
+    slow_queries.add(slow_query)
+    if not executemany and random.random() < SLOW_QUERY_EXPLAIN_RATE:
+        explainer.submit(conn.engine, statement, parameters, slow_query)
+
+
+def init_profiling(engine):
+    """
+    Profile the statements of the engine
+
+    :param engine: SQLAlchemy engine
+    :return: None
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,185 @@
+"""Log search
+
+Full text search on log messages, backed by a GIN index on to_tsvector('simple', msg).
+
+The logs table is owned by GOB-Core, the index is not created by the service while serving requests.
+Create it once, without blocking the writers of logs, by running:
+
+    python -m gobmanagement.database.search
+
+or by applying CREATE_INDEX in a GOB-Core migration. Until the index is valid the caller should fall back
+to a non-indexed search. An index that is left INVALID by a failed build is reported, not rebuilt.
+
+Search text is translated into a tsquery:
+- every word matches as a prefix: meetbout matches meetbouten
+- text between double quotes matches as a phrase: "import started"
+- all words and phrases have to match
+"""
+import re
+import threading
+import time
+
+from sqlalchemy import text
+
+from gobmanagement.config import LOG_SEARCH_INDEX_CHECK_INTERVAL
+from gobmanagement.database.base import engine
+
+SEARCH_INDEX = "logs_msg_search_idx"
+
+CREATE_INDEX = f"""
+CREATE INDEX CONCURRENTLY IF NOT EXISTS {SEARCH_INDEX}
+ON logs USING gin (to_tsvector('simple', msg))
+"""
+
+_DROP_INDEX = f"DROP INDEX CONCURRENTLY IF EXISTS {SEARCH_INDEX}"
+
+# An index that is not valid is either being built or has been left invalid by a failed build
+_INDEX_STATE = text("""
+SELECT CASE
+           WHEN indisvalid THEN 'valid'
+           WHEN EXISTS (SELECT FROM pg_stat_progress_create_index progress
+                        WHERE  progress.index_relid = pg_index.indexrelid) THEN 'building'
+           ELSE 'invalid'
+       END
+FROM   pg_index
+JOIN   pg_class ON pg_class.oid = pg_index.indexrelid
+WHERE  pg_class.relname = :name
+""")
+
+MISSING, BUILDING, INVALID, VALID = "missing", "building", "invalid", "valid"
+
+_STATE_MESSAGES = {
+    MISSING: f"Search index {SEARCH_INDEX} does not exist, create it with python -m gobmanagement.database.search",
+    BUILDING: f"Search index {SEARCH_INDEX} is being built",
+    INVALID: f"Search index {SEARCH_INDEX} is INVALID, recreate it with python -m gobmanagement.database.search",
+    VALID: f"Search index {SEARCH_INDEX} is valid",
+}
+
+_MATCHING_JOBIDS = text("""
+SELECT DISTINCT jobid
+FROM   logs
+WHERE  to_tsvector('simple', msg) @@ to_tsquery('simple', :query)
+AND    timestamp >= now() - :days_ago * '1 day'::interval
+AND    jobid IS NOT NULL
+""")
+
+
+def _words(value):
+    # The tsvector parser also splits words on underscores
+    return re.findall(r"[^\W_]+", value.lower())
+
+
+def to_tsquery(search):
+    """
+    Translate search text into a tsquery
+
+    Any tsquery operators in the search text are ignored
+
+    :param search: search text
+    :return: tsquery text or None if the search text does not contain any words
+    """
+    terms = []
+    for phrase, term in re.findall(r'"([^"]*)"|(\S+)', search):
+        words = _words(phrase or term)
+        if not words:
+            continue
+        if term:
+            # Match the (last) word of a term as prefix
+            words[-1] = f"{words[-1]}:*"
+        terms.append(" <-> ".join(words))
+    return " & ".join(terms) or None
+
+
+def matching_jobids(session, search, days_ago):
+    """
+    Get the ids of the jobs that have logs matching the search text
+
+    :param session: database session
+    :param search: search text
+    :param days_ago: only search logs that have been written in the last days_ago days
+    :return: set of jobids
+    """
+    query = to_tsquery(search)
+    if query is None:
+        return set()
+    result = session.execute(_MATCHING_JOBIDS, {"query": query, "days_ago": days_ago})
+    return {row.jobid for row in result}
+
+
+def get_index_state(connection):
+    """
+    Get the state of the search index
+
+    :param connection: database connection
+    :return: MISSING, BUILDING, INVALID or VALID
+    """
+    return connection.execute(_INDEX_STATE, {"name": SEARCH_INDEX}).scalar() or MISSING
+
+
+class LogSearchIndex:
+
+    def __init__(self, check_interval=LOG_SEARCH_INDEX_CHECK_INTERVAL):
+        """
+        Initialize the index state, the state is checked on first use
+
+        :param check_interval: number of seconds between checks of the index state as long as it is not valid
+        """
+        self._check_interval = check_interval
+        self._state = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def is_valid(self):
+        """
+        Tells if the search index can be used
+
+        The state is read from the catalog, at most once per check interval until the index is valid.
+        A change of state is reported.
+
+        :return: True if the index is valid
+        """
+        with self._lock:
+            recently_checked = self._checked_at is not None and \
+                time.time() - self._checked_at < self._check_interval
+            if self._state == VALID or recently_checked:
+                return self._state == VALID
+            self._checked_at = time.time()
+
+        with engine.connect() as connection:
+            state = get_index_state(connection)
+
+        with self._lock:
+            if state != self._state:
+                print(_STATE_MESSAGES[state])
+            self._state = state
+            return state == VALID
+
+
+log_search_index = LogSearchIndex()
+
+
+def create_index():
+    """
+    Create the search index without locking the logs table for writes
+
+    An INVALID index that is left by an earlier failed build is dropped first.
+    CREATE INDEX CONCURRENTLY cannot run inside a transaction, the statements are executed in autocommit mode
+
+    :return: None
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        state = get_index_state(connection)
+        if state == BUILDING:
+            print(_STATE_MESSAGES[state])
+            return
+        if state == INVALID:
+            print(f"Drop invalid search index {SEARCH_INDEX}")
+            connection.execute(text(_DROP_INDEX))
+        if state != VALID:
+            print(f"Create search index {SEARCH_INDEX}")
+            connection.execute(text(CREATE_INDEX))
+        print(_STATE_MESSAGES[get_index_state(connection)])
+
+
+if __name__ == "__main__":
+    create_index()
@@ -0,0 +1,52 @@
+"""Log export
+
+Formats batches of logs as NDJSON or CSV text chunks that can be streamed to the client.
+"""
+import csv
+import io
+import json
+
+from gobmanagement.database import LOG_EXPORT_COLUMNS
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def ndjson_chunks(batches):
+    """
+    Yields one NDJSON text chunk per batch of logs, one log per line
+
+    :param batches: generator of lists of logs
+    :return: generator of text
+    """
+    for batch in batches:
+        yield "".join(json.dumps(log, default=_json_value) + "\n" for log in batch)
+
+
+def csv_chunks(batches):
+    """
+    Yields the CSV header and then one CSV text chunk per batch of logs
+
+    :param batches: generator of lists of logs
+    :return: generator of text
+    """
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=LOG_EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    yield output.getvalue()
+
+    for batch in batches:
+        output.seek(0)
+        output.truncate()
+        for log in batch:
+            if log.get("data") is not None:
+                log = dict(log, data=json.dumps(log["data"], default=_json_value))
+            writer.writerow(log)
+        yield output.getvalue()
+
+
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+    'csv': (csv_chunks, 'text/csv'),
+}
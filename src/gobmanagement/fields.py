@@ -1,9 +1,42 @@
+import base64
+
+from graphene.relay.connection import PageInfo
 from graphene_sqlalchemy import SQLAlchemyConnectionField
 
+from gobmanagement.config import GRAPHQL_DEFAULT_LIST_SIZE
+
+_CURSOR_PREFIX = "logid:"
+
+
+def encode_cursor(logid):
+    return base64.b64encode(f"{_CURSOR_PREFIX}{logid}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor into the logid that it points to
+
+    :param cursor: opaque cursor
+    :return: logid
+    """
+    try:
+        value = base64.b64decode(cursor).decode()
+        if not value.startswith(_CURSOR_PREFIX):
+            raise ValueError
+        return int(value[len(_CURSOR_PREFIX):])
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
 
 class LogFilterConnectionField(SQLAlchemyConnectionField):
     RELAY_ARGS = ['first', 'last', 'before', 'after', 'sort']
 
+    # Sort orders for which pages are selected on logid instead of by offset
+    KEYSET_SORTS = {
+        'logid_asc': True,
+        'logid_desc': False,
+    }
+
     @classmethod
     def get_query(cls, model, info, **args):
         query = super(LogFilterConnectionField, cls).get_query(model, info, **args)
@@ -14,3 +47,73 @@ class LogFilterConnectionField(SQLAlchemyConnectionField):
             if field not in cls.RELAY_ARGS:
                 query = query.filter(getattr(model, field) == value)
         return query
+
+    @classmethod
+    def _keyset_ascending(cls, sort):
+        """
+        Tells if the connection can be paged on logid and in which direction
+
+        :param sort: sort argument
+        :return: True for ascending, False for descending or None if the sort order does not allow keyset paging
+        """
+        sort = sort or ['logid_asc']
+        if isinstance(sort, str):
+            sort = [sort]
+        return cls.KEYSET_SORTS.get(str(sort[0])) if len(sort) == 1 else None
+
+    @classmethod
+    def resolve_connection(cls, connection_type, model, info, args, resolved):
+        """
+        Resolve a page of logs
+
+        Cursors are encoded on logid so that after and before select a range of logids instead of an offset.
+        Any page can then be read using the logid index, without counting or skipping the preceding logs.
+
+        The total count is only computed when it is requested.
+        Without first or last a page of GRAPHQL_DEFAULT_LIST_SIZE logs is returned, the size that the query cost
+        assumes for a connection without page size.
+        """
+        if args.get('first') is None and args.get('last') is None:
+            args = dict(args, first=GRAPHQL_DEFAULT_LIST_SIZE)
+
+        ascending = cls._keyset_ascending(args.get('sort'))
+        if resolved is not None or ascending is None:
+            return super(LogFilterConnectionField, cls).resolve_connection(
+                connection_type, model, info, args, resolved)
+
+        logid = getattr(model, 'logid')
+        query = cls.get_query(model, info, **args)
+        count_query = query
+
+        for cursor, is_after in [(args.get('after'), True), (args.get('before'), False)]:
+            if cursor is not None:
+                value = decode_cursor(cursor)
+                query = query.filter(logid > value if is_after == ascending else logid < value)
+
+        first, last = args.get('first'), args.get('last')
+        if first is None and last is not None:
+            # Read the page backwards from the end of the range
+            query = query.order_by(None).order_by(logid.desc() if ascending else logid.asc())
+            logs = query.limit(last + 1).all()
+            has_more = len(logs) > last
+            logs = list(reversed(logs[:last]))
+            has_previous_page, has_next_page = has_more, args.get('before') is not None
+        else:
+            logs = query.limit(first + 1).all()
+            has_more = len(logs) > first
+            logs = logs[:first]
+            has_previous_page, has_next_page = args.get('after') is not None, has_more
+
+        edges = [connection_type.Edge(node=log, cursor=encode_cursor(log.logid)) for log in logs]
+        connection = connection_type(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page
+            )
+        )
+        connection.iterable = logs
+        connection.count_query = count_query
+        return connection
@@ -0,0 +1,258 @@
+"""GraphQL documents
+
+Parsing and validating a GraphQL document is done only once per distinct document.
+The parsed and validated documents are kept in a LRU cache, keyed by the hash of the document text.
+
+Persisted queries allow a client to send only the (sha256) hash of a document instead of the full text.
+The protocol follows Automatic Persisted Queries (APQ): the hash is sent as
+extensions.persistedQuery.sha256Hash, if the hash is unknown the client resends the hash with the full document.
+
+Queries can be persisted up front in a JSON file. If GRAPHQL_PERSISTED_QUERIES_ONLY is set, only these queries
+are executed and any other (ad-hoc) document is rejected.
+"""
+import hashlib
+import json
+import threading
+
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import partial
+
+from flask import request
+from flask_graphql import GraphQLView
+from graphql import parse, validate
+from graphql.backend.base import GraphQLDocument
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.execution import ExecutionResult, execute
+from graphql_server import HttpQueryError
+from werkzeug.datastructures import MultiDict
+
+from gobmanagement.config import GRAPHQL_DOCUMENT_CACHE_SIZE, GRAPHQL_PERSISTED_QUERIES, \
+    GRAPHQL_PERSISTED_QUERIES_ONLY
+from gobmanagement.metrics import GRAPHQL_DURATION, operation_label
+from gobmanagement.query_cost import QueryCostError
+
+# Request parameters that graphql-server reads from the query string when the body does not provide them
+_QUERY_STRING_PARAMS = ["query", "operationName", "extensions"]
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class _LRUDict:
+    """Thread-safe dictionary that holds at most max_size items, least recently used items are evicted first."""
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ExtendedExecutionResult(ExecutionResult):
+    """ExecutionResult that includes its extensions in the response."""
+
+    def to_dict(self, *args, **kwargs):
+        response = super().to_dict(*args, **kwargs)
+        if self.extensions:
+            response["extensions"] = self.extensions
+        return response
+
+
+class DocumentCacheBackend(GraphQLCoreBackend):
+    """GraphQL backend that parses and validates each distinct document only once."""
+
+    def __init__(self, max_size=GRAPHQL_DOCUMENT_CACHE_SIZE, query_cost=None):
+        """
+        Initialize the backend
+
+        :param max_size: maximum number of cached documents
+        :param query_cost: optional QueryCost, to reject queries that exceed the cost limits before execution
+        """
+        super().__init__()
+        self._documents = _LRUDict(max_size)
+        self._query_cost = query_cost
+
+    def document_from_string(self, schema, document_string):
+        key = (id(schema), query_hash(document_string))
+        document = self._documents.get(key)
+        if document is None:
+            document = self._validated_document(schema, document_string)
+            self._documents.set(key, document)
+        return document
+
+    def _validated_document(self, schema, document_string):
+        """
+        Parse and validate the document
+
+        Documents with syntax errors raise an exception and are not cached.
+        Documents with validation errors are cached, executing them returns the validation errors.
+
+        :param schema: GraphQL schema
+        :param document_string: GraphQL document text
+        :return: GraphQLDocument
+        """
+        document_ast = parse(document_string)
+        errors = validate(schema, document_ast)
+        if errors:
+            def execute_document(*args, **kwargs):
+                return ExecutionResult(errors=errors, invalid=True)
+        else:
+            execute_document = partial(self._execute, schema, document_ast)
+
+        return GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=execute_document,
+        )
+
+    def _execute(self, schema, document_ast, operation_name=None, variable_values=None, **kwargs):
+        """
+        Execute a validated document
+
+        If query cost limits are set, the cost of the query is checked first and reported in the extensions.
+        """
+        with GRAPHQL_DURATION.labels(operation=operation_label(operation_name)).time():
+            return self._execute_document(schema, document_ast, operation_name, variable_values, **kwargs)
+
+    def _execute_document(self, schema, document_ast, operation_name, variable_values, **kwargs):
+        if self._query_cost is None:
+            return execute(schema, document_ast, operation_name=operation_name, variable_values=variable_values,
+                           **self.execute_params, **kwargs)
+
+        try:
+            cost = self._query_cost.check(schema, document_ast, operation_name, variable_values)
+        except QueryCostError as e:
+            return ExecutionResult(errors=[e], invalid=True)
+
+        result = execute(schema, document_ast, operation_name=operation_name, variable_values=variable_values,
+                         **self.execute_params, **kwargs)
+        return ExtendedExecutionResult(data=result.data, errors=result.errors, invalid=result.invalid,
+                                       extensions=dict(result.extensions, cost=cost))
+
+
+class PersistedQueries:
+
+    def __init__(self, path=GRAPHQL_PERSISTED_QUERIES, only=GRAPHQL_PERSISTED_QUERIES_ONLY,
+                 max_registered=GRAPHQL_DOCUMENT_CACHE_SIZE):
+        """
+        Initialize the persisted queries
+
+        :param path: JSON file with either a list of queries or a dictionary of hash => query
+        :param only: if True, only the queries from the file are allowed
+        :param max_registered: maximum number of queries that are registered by clients
+        """
+        self.only = only
+        self._persisted = self._load(path) if path else {}
+        self._registered = _LRUDict(max_registered)
+
+    def _load(self, path):
+        with open(path) as file:
+            queries = json.load(file)
+        if isinstance(queries, dict):
+            queries = queries.values()
+        return {query_hash(query): query for query in queries}
+
+    def get(self, sha256_hash):
+        return self._persisted.get(sha256_hash) or self._registered.get(sha256_hash)
+
+    @staticmethod
+    def _sha256_hash(params):
+        extensions = params.get("extensions") or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpQueryError(400, "Extensions are invalid JSON.")
+        return (extensions.get("persistedQuery") or {}).get("sha256Hash")
+
+    def resolve(self, params):
+        """
+        Resolve the query for the given request parameters
+
+        :param params: request parameters (query, variables, operationName, extensions)
+        :return: request parameters with the query text
+        """
+        sha256_hash = self._sha256_hash(params)
+        query = params.get("query")
+
+        if sha256_hash is None:
+            if query and self.only and query_hash(query) not in self._persisted:
+                raise HttpQueryError(400, "Only persisted queries are allowed.")
+            return params
+
+        return dict(params, query=self._resolve_hash(sha256_hash, query))
+
+    def _resolve_hash(self, sha256_hash, query):
+        """
+        Get the query for the hash, or register the query under the hash
+
+        :param sha256_hash: hash of the query
+        :param query: query text, None when only the hash is sent
+        :return: query text
+        """
+        if not query:
+            query = self.get(sha256_hash)
+            if query is None:
+                raise HttpQueryError(400, "PersistedQueryNotFound")
+        elif query_hash(query) != sha256_hash:
+            raise HttpQueryError(400, "Provided sha256Hash does not match query.")
+        elif sha256_hash not in self._persisted:
+            if self.only:
+                raise HttpQueryError(400, "Only persisted queries are allowed.")
+            self._registered.set(sha256_hash, query)
+        return query
+
+
+class PersistedQueryView(GraphQLView):
+    """GraphQLView that accepts persisted query hashes instead of query texts."""
+
+    persisted_queries = None
+
+    def parse_body(self):
+        data = super().parse_body()
+        if self.persisted_queries is None:
+            return data
+
+        if isinstance(data, list):
+            return [self.persisted_queries.resolve(self._params(params)) for params in data]
+        return self.persisted_queries.resolve(self._params(data, request.args))
+
+    @staticmethod
+    def _params(data, query_data=None):
+        """
+        Get the request parameters of a single query
+
+        The query string parameters are used when the body does not provide them, as graphql-server does.
+        Merging them before resolving ensures that a query in the query string is also checked.
+
+        :param data: parameters from the request body
+        :param query_data: parameters from the query string, None for a batch request
+        :return: request parameters
+        """
+        if not isinstance(data, Mapping):
+            raise HttpQueryError(400, f"GraphQL params should be a dict. Received {data!r}.")
+
+        params = data.to_dict() if isinstance(data, MultiDict) else dict(data)
+        for key in _QUERY_STRING_PARAMS:
+            if not params.get(key) and query_data and query_data.get(key):
+                params[key] = query_data[key]
+        return params
@@ -0,0 +1,97 @@
+"""Batched loaders
+
+DataLoaders collect the ids that are requested within one GraphQL execution
+and fetch the corresponding jobs and job steps with a single query per loader.
+
+The loaders are kept in the GraphQL context, so any cached results live only as long as the request.
+"""
+from collections import defaultdict
+
+from promise import Promise
+from promise.dataloader import DataLoader
+from sqlalchemy import text
+
+from gobmanagement.database.base import engine
+
+_JOBS = text("""
+SELECT *, id AS jobid, jobs.end - jobs.start AS duration
+FROM   jobs
+WHERE  id = ANY(:ids)
+""")
+
+_PROCESS_JOBS = text("""
+SELECT *, id AS jobid, jobs.end - jobs.start AS duration
+FROM   jobs
+WHERE  process_id = ANY(:ids)
+ORDER BY id
+""")
+
+_JOB_STEPS = text("""
+SELECT *, id AS stepid, jobsteps.end - jobsteps.start AS duration
+FROM   jobsteps
+WHERE  jobid = ANY(:ids)
+ORDER BY start
+""")
+
+
+def _query(statement, keys):
+    return [dict(row) for row in engine.execute(statement, {"ids": list(keys)})]
+
+
+def _group(rows, key, keys):
+    """
+    Group the rows on the given key, in the order of the requested keys
+
+    :param rows: query result
+    :param key: name of the column to group on
+    :param keys: requested keys
+    :return: list of lists of rows
+    """
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row[key]].append(row)
+    return [groups[k] for k in keys]
+
+
+class JobLoader(DataLoader):
+    """Loads jobs by jobid, None for unknown jobs."""
+
+    def batch_load_fn(self, keys):
+        jobs = {job["jobid"]: job for job in _query(_JOBS, keys)}
+        return Promise.resolve([jobs.get(key) for key in keys])
+
+
+class ProcessJobsLoader(DataLoader):
+    """Loads the list of jobs by process_id."""
+
+    def batch_load_fn(self, keys):
+        return Promise.resolve(_group(_query(_PROCESS_JOBS, keys), "process_id", keys))
+
+
+class JobStepsLoader(DataLoader):
+    """Loads the list of steps by jobid, ordered by start time."""
+
+    def batch_load_fn(self, keys):
+        return Promise.resolve(_group(_query(_JOB_STEPS, keys), "jobid", keys))
+
+
+class Loaders:
+
+    def __init__(self):
+        self.jobs = JobLoader()
+        self.process_jobs = ProcessJobsLoader()
+        self.steps = JobStepsLoader()
+
+
+def get_loaders(context):
+    """
+    Get the loaders for the current GraphQL execution
+
+    :param context: GraphQL context (the request)
+    :return: Loaders
+    """
+    loaders = getattr(context, "gob_loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        context.gob_loaders = loaders
+    return loaders
@@ -1,9 +1,118 @@
+"""Message Broker management
+
+The RabbitMQ management API is accessed by a single client per process that keeps its connections alive.
+
+GET responses are cached for a few seconds and shared by all requests of the process.
+Concurrent requests for the same path while no (recent) response is available wait for a single upstream call.
+"""
+import threading
+import time
+
 import requests
 from requests.auth import HTTPBasicAuth
 
 from gobcore.message_broker.config import MESSAGE_BROKER, MESSAGE_BROKER_PORT, MESSAGE_BROKER_VHOST
 from gobcore.message_broker.config import MESSAGE_BROKER_USER, MESSAGE_BROKER_PASSWORD
 
+from gobmanagement.config import MESSAGE_BROKER_MANAGEMENT_CONNECT_TIMEOUT, MESSAGE_BROKER_MANAGEMENT_READ_TIMEOUT, \
+    MESSAGE_BROKER_MANAGEMENT_CACHE_TTL
+
+
+class _Flight:
+    """An upstream call that other requests can wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ManagementClient:
+
+    def __init__(self, cache_ttl=MESSAGE_BROKER_MANAGEMENT_CACHE_TTL,
+                 timeout=(MESSAGE_BROKER_MANAGEMENT_CONNECT_TIMEOUT, MESSAGE_BROKER_MANAGEMENT_READ_TIMEOUT)):
+        """
+        Initialize the client
+
+        :param cache_ttl: number of seconds that a GET response is cached, 0 to disable caching
+        :param timeout: (connect timeout, read timeout) in seconds
+        """
+        self._base_url = f"http://{MESSAGE_BROKER}:{MESSAGE_BROKER_PORT}/api"
+        self._session = requests.Session()
+        self._session.auth = HTTPBasicAuth(MESSAGE_BROKER_USER, MESSAGE_BROKER_PASSWORD)
+        self._timeout = timeout
+        self._cache_ttl = cache_ttl
+        self._cache = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def request(self, path, method="get"):
+        """
+        Request the management API
+
+        :param path: path within management API
+        :param method: HTTP method
+        :return: Response
+        """
+        return self._session.request(method, f"{self._base_url}/{path}", timeout=self._timeout)
+
+    def get_json(self, path):
+        """
+        Get the JSON response for the given path
+
+        Successful responses are cached for cache_ttl seconds.
+
+        :param path: path within management API
+        :return: JSON response, status code
+        """
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and time.monotonic() - cached[0] <= self._cache_ttl:
+                return cached[1]
+
+            flight = self._flights.get(path)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[path] = _Flight()
+
+        if is_leader:
+            self._fetch(path, flight)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _fetch(self, path, flight):
+        """
+        Execute the upstream call for the flight and cache a successful response
+
+        :param path: path within management API
+        :param flight: the flight that waiting requests share
+        :return: None
+        """
+        try:
+            response = self.request(path)
+            flight.result = response.json(), response.status_code
+        except Exception as e:
+            flight.error = e
+        finally:
+            # Always release the waiting requests, also when the call is interrupted
+            if flight.result is None and flight.error is None:
+                flight.error = RuntimeError(f"Request for {path} has been interrupted")
+            with self._lock:
+                del self._flights[path]
+                if flight.error is None and flight.result[1] == 200 and self._cache_ttl:
+                    self._cache[path] = (time.monotonic(), flight.result)
+            flight.done.set()
+
+    def invalidate(self, path):
+        with self._lock:
+            self._cache.pop(path, None)
+
+
+_client = ManagementClient()
+
 
 def _request(path, method="get"):
     """
@@ -12,8 +121,7 @@ def _request(path, method="get"):
     :param path: path within management API
     :return: Response
     """
-    url = f"http://{MESSAGE_BROKER}:{MESSAGE_BROKER_PORT}/api/{path}"
-    return getattr(requests, method)(url, auth=HTTPBasicAuth(MESSAGE_BROKER_USER, MESSAGE_BROKER_PASSWORD))
+    return _client.request(path, method)
 
 
 def purge_queue(queue):
@@ -26,6 +134,7 @@ def purge_queue(queue):
     response = _request(f"queues/{MESSAGE_BROKER_VHOST}/{queue}/contents", method='delete')
     if response.status_code == 204:
         # No response means that purge has succeeded
+        _client.invalidate(f"queues/{MESSAGE_BROKER_VHOST}")
         return {
             'result': 'OK'
         }, 200
@@ -39,5 +148,4 @@ def get_queues():
 
     :return:
     """
-    response = _request(f"queues/{MESSAGE_BROKER_VHOST}")
-    return response.json(), response.status_code
+    return _client.get_json(f"queues/{MESSAGE_BROKER_VHOST}")
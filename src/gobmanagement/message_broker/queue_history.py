@@ -0,0 +1,303 @@
+"""Queue history
+
+A background sampler reads the depth and message rates of all queues at a fixed interval.
+The samples of each queue are kept in a ring buffer, a flat array of floats that grows up to a fixed size.
+The buffers of queues that have not been seen for the length of the history are dropped.
+
+Only one process on the node samples the queues: the process that holds the sampler lock file.
+It writes the buffers to the history file after each sample, the other processes read the history from that file
+whenever it has changed. All processes on the node thus serve the same history.
+
+The history of a time window is served from memory. Windows that contain more samples than requested are
+downsampled by averaging the samples within equally sized buckets.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from array import array
+
+from gobmanagement.config import QUEUE_SAMPLE_INTERVAL, QUEUE_HISTORY_SIZE, QUEUE_HISTORY_FILE
+from gobmanagement.message_broker.management import get_queues
+from gobmanagement.socket import LeaderLock
+
+FIELDS = ["messages", "messages_ready", "messages_unacknowledged", "publish_rate", "deliver_rate", "ack_rate"]
+
+# Field => path of the value in the queue information of the management API
+_PATHS = {
+    "messages": ["messages"],
+    "messages_ready": ["messages_ready"],
+    "messages_unacknowledged": ["messages_unacknowledged"],
+    "publish_rate": ["message_stats", "publish_details", "rate"],
+    "deliver_rate": ["message_stats", "deliver_get_details", "rate"],
+    "ack_rate": ["message_stats", "ack_details", "rate"],
+}
+
+
+def _value(queue, path):
+    for key in path:
+        queue = queue.get(key) if isinstance(queue, dict) else None
+    return float(queue or 0)
+
+
+class RingBuffer:
+    """Bounded buffer of samples, each sample is a timestamp followed by the values of the FIELDS.
+
+    The array grows with the samples until it holds size samples, then the oldest samples are overwritten.
+    """
+
+    STRIDE = 1 + len(FIELDS)
+
+    def __init__(self, size):
+        self._size = size
+        self._data = array('d')
+        self._next = 0
+        self._count = 0
+        self.last_timestamp = None
+
+    def add(self, timestamp, values):
+        """
+        Add a sample, the oldest sample is overwritten if the buffer is full
+
+        :param timestamp: time of the sample
+        :param values: values in the order of FIELDS
+        :return: None
+        """
+        sample = array('d', [timestamp, *values])
+        if self._count < self._size:
+            # Buffer is not yet full, the next sample is at the end of the array
+            self._data.extend(sample)
+        else:
+            offset = self._next * self.STRIDE
+            self._data[offset:offset + self.STRIDE] = sample
+        self._next = (self._next + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+        self.last_timestamp = timestamp
+
+    def state(self):
+        """
+        Get the state of the buffer, to restore it in another process
+
+        :return: tuple (position of the next sample, number of samples, last timestamp, data)
+        """
+        return self._next, self._count, self.last_timestamp, self._data
+
+    @classmethod
+    def from_state(cls, size, state):
+        """
+        Restore a buffer from its state
+
+        :param size: size of the buffer
+        :param state: state of the buffer
+        :return: RingBuffer
+        """
+        buffer = cls(size)
+        buffer._next, buffer._count, buffer.last_timestamp, buffer._data = state
+        return buffer
+
+    def samples(self, since):
+        """
+        Get the samples since the given time, oldest first
+
+        :param since: only samples with a timestamp >= since
+        :return: list of samples, each sample a list of timestamp and values
+        """
+        first = (self._next - self._count) % self._size
+
+        # Samples are added in order of time, find the first sample since the given time
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._data[((first + middle) % self._size) * self.STRIDE] < since:
+                low = middle + 1
+            else:
+                high = middle
+
+        start = (first + low) % self._size
+        end = start + self._count - low
+        if end <= self._size:
+            values = self._data[start * self.STRIDE:end * self.STRIDE].tolist()
+        else:
+            values = self._data[start * self.STRIDE:].tolist() + self._data[:(end - self._size) * self.STRIDE].tolist()
+        return [values[i:i + self.STRIDE] for i in range(0, len(values), self.STRIDE)]
+
+
+def downsample(samples, start, end, points):
+    """
+    Downsample the samples into at most the given number of points
+
+    The window is divided into equally sized buckets. Each non empty bucket results in a sample
+    with the average timestamp and values of the samples in the bucket.
+
+    :param samples: samples, oldest first
+    :param start: start of the window
+    :param end: end of the window
+    :param points: maximum number of points, at least 1
+    :return: list of samples
+    """
+    if points < 1:
+        raise ValueError("points should be at least 1")
+    if len(samples) <= points:
+        return samples
+
+    width = (end - start) / points
+    buckets = {}
+    for sample in samples:
+        bucket = min(int((sample[0] - start) / width), points - 1)
+        buckets.setdefault(bucket, []).append(sample)
+    return [[sum(values) / len(values) for values in zip(*buckets[bucket])] for bucket in sorted(buckets)]
+
+
+class QueueSampler:
+
+    def __init__(self, interval=QUEUE_SAMPLE_INTERVAL, size=QUEUE_HISTORY_SIZE, path=QUEUE_HISTORY_FILE):
+        """
+        Initialize the sampler
+
+        :param interval: number of seconds between samples, 0 to disable sampling
+        :param size: number of samples that are kept per queue
+        :param path: history file that is shared by the processes on the node
+        """
+        self._interval = interval
+        self._size = size
+        self._path = path
+        self._leader_lock = LeaderLock(f"{path}.lock")
+        self._is_leader = False
+        self._loaded = None
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling in a background thread, if not yet started."""
+        with self._lock:
+            if self._interval and self._thread is None:
+                os.makedirs(os.path.dirname(self._path), mode=0o700, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="queue_sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        """
+        Sample the queues while this process holds the sampler lock
+
+        Every process tries to acquire the lock, so that another process takes over when the sampling process ends.
+        """
+        while not self._stop.is_set():
+            if not self._is_leader and self._leader_lock.acquire():
+                # Continue the history of the previous sampling process
+                self._load()
+                self._is_leader = True
+            if self._is_leader:
+                try:
+                    self.sample()
+                    self._save()
+                except Exception as e:
+                    print(f"Queue sample failed: {str(e)}")
+            self._stop.wait(self._interval)
+
+    def sample(self):
+        """
+        Sample all queues
+
+        :return: None
+        """
+        queues, status_code = get_queues()
+        if status_code != 200:
+            raise Exception(f"Management API responded with status {status_code}")
+
+        timestamp = time.time()
+        with self._lock:
+            for queue in queues:
+                buffer = self._buffers.get(queue['name'])
+                if buffer is None:
+                    buffer = self._buffers[queue['name']] = RingBuffer(self._size)
+                buffer.add(timestamp, [_value(queue, _PATHS[field]) for field in FIELDS])
+
+            # Drop the history of queues that have been absent for the length of the history
+            horizon = timestamp - self._interval * self._size
+            self._buffers = {name: buffer for name, buffer in self._buffers.items()
+                             if buffer.last_timestamp >= horizon}
+
+    def _save(self):
+        """
+        Write the buffers to the history file
+
+        The file starts with a JSON line that describes the buffers, followed by the data of the buffers.
+        It is written atomically, so that readers never see a partially written file.
+
+        :return: None
+        """
+        with self._lock:
+            states = {name: buffer.state() for name, buffer in self._buffers.items()}
+            header = [[name, position, count, last_timestamp, len(data)]
+                      for name, (position, count, last_timestamp, data) in states.items()]
+            data = b"".join(state[3].tobytes() for state in states.values())
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self._path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(json.dumps({"size": self._size, "queues": header}).encode() + b"\n")
+            file.write(data)
+        os.replace(tmp_path, self._path)
+
+    def _load(self):
+        """
+        Read the buffers from the history file if it has changed since it has last been read
+
+        :return: None
+        """
+        try:
+            with open(self._path, "rb") as file:
+                # The file is replaced on every write
+                stat = os.fstat(file.fileno())
+                modified = stat.st_ino, stat.st_mtime_ns
+                if modified == self._loaded:
+                    return
+                header = json.loads(file.readline())
+                buffers = {}
+                for name, position, count, last_timestamp, length in header["queues"]:
+                    data = array('d')
+                    data.frombytes(file.read(length * data.itemsize))
+                    buffers[name] = RingBuffer.from_state(header["size"], (position, count, last_timestamp, data))
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"Queue history file is invalid: {str(e)}")
+            return
+
+        with self._lock:
+            self._buffers = buffers
+            self._loaded = modified
+
+    def history(self, seconds, points, names=None):
+        """
+        Get the history of the queues
+
+        Processes that do not sample the queues serve the history of the sampling process.
+
+        :param seconds: length of the window in seconds, up to now
+        :param points: maximum number of samples per queue
+        :param names: optional names of the queues, default all queues
+        :return: dictionary with the sample interval and per queue the samples as columns
+        """
+        if not self._is_leader:
+            self._load()
+
+        end = time.time()
+        start = end - seconds
+        with self._lock:
+            samples = {name: buffer.samples(start) for name, buffer in self._buffers.items()
+                       if names is None or name in names}
+
+        queues = []
+        for name, queue_samples in sorted(samples.items()):
+            columns = list(zip(*downsample(queue_samples, start, end, points))) or [[]] * (1 + len(FIELDS))
+            queue = {"name": name, "timestamps": [round(value, 3) for value in columns[0]]}
+            queue.update({field: [round(value, 3) for value in values] for field, values in zip(FIELDS, columns[1:])})
+            queues.append(queue)
+        return {"interval": self._interval, "queues": queues}
@@ -0,0 +1,131 @@
+"""Metrics
+
+Metrics are collected in process by prometheus_client and exposed in the Prometheus text format.
+
+- request latency per route, method and status
+- number of database queries per request
+- database query latency and rows per origin, see database/profiling.py
+- GraphQL latency per operation and per root field resolver
+- ResolveCache hits and misses per resolver
+- connected socket clients and emitted socket events
+
+When running multiple (uwsgi) processes, set PROMETHEUS_MULTIPROC_DIR to an empty directory that is shared
+by the processes. Each process then writes its metrics to memory mapped files in this directory, and the
+metrics of all processes are aggregated when they are exposed.
+"""
+import atexit
+import os
+import re
+import time
+
+from flask import g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, \
+    generate_latest, multiprocess
+from promise import is_thenable
+from sqlalchemy import event
+
+from gobmanagement.config import PROMETHEUS_MULTIPROC_DIR
+
+_PREFIX = "gob_management"
+
+# Operation names are client defined, other names are reported as 'other' to limit the number of series
+_OPERATION_NAME = re.compile(r"^\w{1,64}$")
+
+REQUEST_DURATION = Histogram(f"{_PREFIX}_request_duration_seconds", "Request latency",
+                             ["route", "method", "status"])
+REQUEST_DB_QUERIES = Histogram(f"{_PREFIX}_request_db_queries", "Number of database queries per request",
+                               ["route"], buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250))
+DB_QUERY_DURATION = Histogram(f"{_PREFIX}_db_query_duration_seconds", "Database query latency", ["origin"])
+DB_QUERY_ROWS = Counter(f"{_PREFIX}_db_query_rows", "Rows returned or affected by database queries", ["origin"])
+GRAPHQL_DURATION = Histogram(f"{_PREFIX}_graphql_duration_seconds", "GraphQL execution latency",
+                             ["operation"])
+GRAPHQL_RESOLVER_DURATION = Histogram(f"{_PREFIX}_graphql_resolver_duration_seconds",
+                                      "GraphQL root field resolver latency", ["resolver"])
+RESOLVE_CACHE_REQUESTS = Counter(f"{_PREFIX}_resolve_cache_requests", "ResolveCache lookups",
+                                 ["resolver", "result"])
+SOCKET_CLIENTS = Gauge(f"{_PREFIX}_socket_clients", "Connected socket clients", multiprocess_mode="livesum")
+SOCKET_EMITS = Counter(f"{_PREFIX}_socket_emits", "Emitted socket events", ["event"])
+
+
+def operation_label(operation_name):
+    if operation_name is None:
+        return "anonymous"
+    return operation_name if _OPERATION_NAME.match(operation_name) else "other"
+
+
+class ResolverMetricsMiddleware:
+    """GraphQL middleware that measures the latency of the root field resolvers
+
+    Nested fields are not measured, their time is included in the time of their root field.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if len(info.path) > 1:
+            return next(root, info, **args)
+
+        resolver = GRAPHQL_RESOLVER_DURATION.labels(resolver=f"{info.parent_type.name}.{info.field_name}")
+        start = time.perf_counter()
+
+        def observe(value):
+            resolver.observe(time.perf_counter() - start)
+            return value
+
+        def observe_error(error):
+            observe(None)
+            raise error
+
+        result = next(root, info, **args)
+        if is_thenable(result):
+            return result.then(observe, observe_error)
+        return observe(result)
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_db_queries = 0
+
+
+def _after_request(response):
+    if "metrics_start" in g:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_DURATION.labels(route=route, method=request.method, status=response.status_code).observe(
+            time.perf_counter() - g.metrics_start)
+        REQUEST_DB_QUERIES.labels(route=route).observe(g.metrics_db_queries)
+    return response
+
+
+def _count_query(*args):
+    if has_request_context() and "metrics_db_queries" in g:
+        g.metrics_db_queries += 1
+
+
+def init_app(app, engine):
+    """
+    Measure the requests of the app and the database queries of the engine
+
+    :param app: Flask app
+    :param engine: SQLAlchemy engine
+    :return: None
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    event.listen(engine, "before_cursor_execute", _count_query)
+
+
+def generate():
+    """
+    Generate the metrics of this process, or of all processes in multiprocess mode
+
+    :return: metrics text, content type
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+if PROMETHEUS_MULTIPROC_DIR:
+    # Remove the live gauges (connected socket clients) of this process on exit
+    atexit.register(lambda: multiprocess.mark_process_dead(os.getpid()))
@@ -0,0 +1,202 @@
+"""Query cost
+
+Static analysis of a GraphQL query before it is executed.
+
+Each object that a query can return costs 1, scalar fields are free.
+The number of objects in a list is estimated by the page size (first or last argument) of a connection,
+or by a default list size for lists that have no page size.
+Aliases and fragments are counted for every time they occur in the query.
+
+Queries that exceed the maximum cost, depth or page size are rejected. The limits are checked while the query
+is analysed, so that the analysis of a deeply nested or expanding query stops as soon as a limit is exceeded.
+"""
+from graphql import GraphQLError
+from graphql.language import ast
+from graphql.type.definition import GraphQLList, GraphQLNonNull, get_named_type
+from graphql.utils.type_from_ast import type_from_ast
+from graphql.utils.value_from_ast import value_from_ast
+
+from gobmanagement.config import GRAPHQL_DEFAULT_LIST_SIZE, GRAPHQL_MAX_COST, GRAPHQL_MAX_DEPTH, \
+    GRAPHQL_MAX_PAGE_SIZE
+
+PAGE_SIZE_ARGS = ['first', 'last']
+
+
+class QueryCostError(GraphQLError):
+    pass
+
+
+def _is_list(field_type):
+    if isinstance(field_type, GraphQLNonNull):
+        field_type = field_type.of_type
+    return isinstance(field_type, GraphQLList)
+
+
+class QueryCost:
+
+    def __init__(self, max_cost=GRAPHQL_MAX_COST, max_depth=GRAPHQL_MAX_DEPTH, max_page_size=GRAPHQL_MAX_PAGE_SIZE,
+                 default_list_size=GRAPHQL_DEFAULT_LIST_SIZE):
+        """
+        Initialize the query cost limits
+
+        :param max_cost: maximum cost of a query
+        :param max_depth: maximum nesting of fields in a query
+        :param max_page_size: maximum value for the first or last argument of a connection
+        :param default_list_size: estimated number of items in a list without a page size
+        """
+        self.max_cost = max_cost
+        self.max_depth = max_depth
+        self.max_page_size = max_page_size
+        self.default_list_size = default_list_size
+
+    def check(self, schema, document_ast, operation_name=None, variable_values=None):
+        """
+        Check the cost of the query against the limits
+
+        :param schema: GraphQL schema
+        :param document_ast: parsed and validated query
+        :param operation_name: name of the operation to execute
+        :param variable_values: query variables
+        :return: dictionary with the cost and depth of the query
+        """
+        cost, depth = _QueryAnalysis(self, schema, document_ast, variable_values).operation_cost(operation_name)
+        return {"cost": cost, "depth": depth, "max_cost": self.max_cost}
+
+
+class _QueryAnalysis:
+
+    def __init__(self, limits, schema, document_ast, variable_values):
+        self.limits = limits
+        self.schema = schema
+        self.variable_values = variable_values or {}
+        self.operations = []
+        self.fragments = {}
+        for definition in document_ast.definitions:
+            if isinstance(definition, ast.OperationDefinition):
+                self.operations.append(definition)
+            elif isinstance(definition, ast.FragmentDefinition):
+                self.fragments[definition.name.value] = definition
+
+    def operation_cost(self, operation_name):
+        """
+        Get the cost and depth of the operation that will be executed
+
+        :param operation_name: name of the operation, may be None if the query contains a single operation
+        :return: cost, depth
+        """
+        operations = [operation for operation in self.operations
+                      if operation_name is None or (operation.name and operation.name.value == operation_name)]
+        if len(operations) != 1:
+            # Leave reporting unknown or ambiguous operations to the execution
+            return 0, 0
+
+        operation, = operations
+        self.variables = self._variables(operation)
+        root_type = {
+            "query": self.schema.get_query_type,
+            "mutation": self.schema.get_mutation_type,
+            "subscription": self.schema.get_subscription_type,
+        }[operation.operation]()
+        return self._selection_cost(root_type, operation.selection_set, level=1)
+
+    def _variables(self, operation):
+        variables = {}
+        for definition in operation.variable_definitions or []:
+            name = definition.variable.name.value
+            if name in self.variable_values:
+                variables[name] = self.variable_values[name]
+            elif definition.default_value is not None:
+                variables[name] = value_from_ast(definition.default_value, type_from_ast(self.schema, definition.type))
+        return variables
+
+    def _selections(self, selection_set):
+        """
+        Get the fields of a selection set, including the fields of any fragments
+
+        :param selection_set: selection set
+        :return: generator of fields
+        """
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                yield selection
+            elif isinstance(selection, ast.InlineFragment):
+                yield from self._selections(selection.selection_set)
+            elif selection.name.value in self.fragments:
+                yield from self._selections(self.fragments[selection.name.value].selection_set)
+
+    def _selection_cost(self, parent_type, selection_set, level, page_size=None):
+        """
+        Get the cost and depth of a selection set
+
+        :param parent_type: type that the selections are selected on
+        :param selection_set: selection set
+        :param level: depth of the fields in the selection set, 1 for the root fields
+        :param page_size: page size of the connection that the selection set belongs to
+        :return: cost, depth
+        """
+        cost, depth = 0, 0
+        fields = getattr(parent_type, "fields", {})
+        for field in self._selections(selection_set):
+            field_def = fields.get(field.name.value)
+            if field_def is None or field.name.value.startswith("__"):
+                # Introspection and type names
+                continue
+            field_cost, field_depth = self._field_cost(field, field_def, level, page_size)
+            cost += field_cost
+            depth = max(depth, field_depth)
+            if cost > self.limits.max_cost:
+                # The cost of the selection set only increases with the remaining fields
+                raise QueryCostError(f"Query cost exceeds the maximum cost of {self.limits.max_cost}")
+        return cost, depth
+
+    def _field_cost(self, field, field_def, level, page_size):
+        """
+        Get the cost and depth of a field
+
+        A list in a connection (edges) contains at most page size items.
+        Other lists are estimated to contain the default list size number of items.
+
+        :param field: field in the query
+        :param field_def: field definition in the schema
+        :param level: depth of the field
+        :param page_size: page size of the connection that the field belongs to
+        :return: cost, depth
+        """
+        if level > self.limits.max_depth:
+            raise QueryCostError(f"Query depth exceeds the maximum depth of {self.limits.max_depth}")
+
+        if field.selection_set is None:
+            return 0, 1
+
+        count = 1
+        if _is_list(field_def.type):
+            count = page_size or self.limits.default_list_size
+
+        child_cost, child_depth = self._selection_cost(get_named_type(field_def.type), field.selection_set,
+                                                       level + 1, self._page_size(field, field_def))
+        return count * (1 + child_cost), 1 + child_depth
+
+    def _page_size(self, field, field_def):
+        """
+        Get the page size of a connection field
+
+        :param field: field in the query
+        :param field_def: field definition in the schema
+        :return: page size, None if the field is not a connection, default list size if no page size is given
+        """
+        if not all(arg in field_def.args for arg in PAGE_SIZE_ARGS):
+            return None
+
+        page_sizes = []
+        for argument in field.arguments or []:
+            name = argument.name.value
+            value = value_from_ast(argument.value, field_def.args[name].type, self.variables) \
+                if name in PAGE_SIZE_ARGS else None
+            if value is not None:
+                if value < 0:
+                    raise QueryCostError(f"{name} of {field.name.value} should not be negative")
+                if value > self.limits.max_page_size:
+                    raise QueryCostError(
+                        f"{name} of {field.name.value} exceeds the maximum page size of {self.limits.max_page_size}")
+                page_sizes.append(value)
+        return max(page_sizes) if page_sizes else self.limits.default_list_size
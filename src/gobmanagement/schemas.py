@@ -1,17 +1,29 @@
+import base64
+import datetime
+
 import graphene
 
+from promise import Promise
+
 from sqlalchemy import text
 from graphene_sqlalchemy import SQLAlchemyObjectType, SQLAlchemyConnectionField
 
 from gobcore.model.sa.management import Log, Service as ServiceModel, ServiceTask as ServiceTaskModel
 
-from gobmanagement.database import get_last_logid
+from gobmanagement.database.jobs import changed_jobids, jobs_query
+from gobmanagement.database.search import log_search_index, matching_jobids
 from gobmanagement.database.base import session_scope
-from gobmanagement.database.base import db_session, engine
+from gobmanagement.database.base import engine
 
 from gobmanagement.fields import LogFilterConnectionField
+from gobmanagement.loaders import get_loaders
 from gobmanagement.scalars import Timedelta
-from gobmanagement.cache import ResolveCache
+from gobmanagement.cache import MemoryBackend, ResolveCache
+from gobmanagement.catalog import source_entities
+from gobmanagement.config import JOBS_PAGE_SIZE, JOBS_MAX_PAGE_SIZE, LOG_SEARCH_MODE, JOBS_CHANGED_MAX_LOGS, \
+    JOBS_CHANGED_CACHE_ENTRIES
+from gobmanagement.summary import JobSummary
+from gobmanagement.versions import data_versions, LAST_LOGID
 
 
 class Service(SQLAlchemyObjectType):
@@ -71,6 +83,14 @@ class LogConnection(graphene.relay.Connection):
     class Meta:
         node = LogType
 
+    total_count = graphene.Int(description="Total number of logs, only computed when requested")
+
+    def resolve_total_count(self, info):
+        count_query = getattr(self, "count_query", None)
+        if count_query is not None:
+            return count_query.order_by(None).count()
+        return getattr(self, "length", None)
+
 
 class MsgCategory(graphene.ObjectType):
     level = graphene.String()
@@ -107,14 +127,75 @@ class Job(graphene.ObjectType):
     step = graphene.String(description="Last step")
     status = graphene.String(description="Status of last step")
     user = graphene.String(description="User or process that started the job")
+    steps = graphene.List(lambda: StepInfo, description="Steps of the job")
 
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
 
+    def resolve_steps(self, info):
+        return get_loaders(info.context).steps.load(self.jobid).then(
+            lambda steps: [StepInfo(step) for step in steps])
+
     class Meta:
         interfaces = (graphene.relay.Node,)
 
 
+class JobConnection(graphene.relay.Connection):
+    class Meta:
+        node = Job
+
+    total_count = graphene.Int(description="Total number of jobs")
+
+
+class JobsChanged(graphene.ObjectType):
+
+    jobs = graphene.List(Job, description="Jobs that have changed")
+    last_logid = graphene.Int(description="Logid of the most recent log, to be used in the next request")
+    refetch = graphene.Boolean(description="Too many logs have been added, refetch all jobs instead")
+
+
+def _encode_job_cursor(job):
+    """
+    Encode the keyset position (starttime, jobid) of a job as cursor
+
+    :param job: jobs row
+    :return: opaque cursor
+    """
+    starttime, jobid = _job_key(job)
+    return base64.b64encode(f"{starttime.isoformat()}|{jobid}".encode()).decode()
+
+
+def _decode_job_cursor(cursor):
+    """
+    Decode a cursor into a keyset position (starttime, jobid)
+
+    :param cursor: opaque cursor
+    :return: tuple (starttime, jobid)
+    """
+    try:
+        starttime, jobid = base64.b64decode(cursor).decode().split("|")
+        return datetime.datetime.fromisoformat(starttime), int(jobid)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _job_key(job):
+    return job["starttime"].replace(tzinfo=None), job["jobid"]
+
+
+def _jobs_args():
+    return {
+        "days_ago": graphene.Int(),
+        "jobid": graphene.Int(),
+        "source": graphene.String(),
+        "catalogue": graphene.String(),
+        "entity": graphene.String(),
+        "startyear": graphene.String(),
+        "startmonth": graphene.String(),
+        "search": graphene.String(),
+    }
+
+
 class SourceEntity(graphene.ObjectType):
 
     source = graphene.String(description="The source for the process")
@@ -198,154 +279,184 @@ class Query(graphene.ObjectType):
 
     source_entities = graphene.List(SourceEntity)
 
+    source_entities_version = graphene.String(description="Version of the source entities, changes on any change")
+
     services = SQLAlchemyConnectionField(ServiceConnection)
 
     tasks = SQLAlchemyConnectionField(ServiceTaskConnection)
 
-    jobs = graphene.List(Job,
-                         days_ago=graphene.Int(),
-                         jobid=graphene.Int(),
-                         source=graphene.String(),
-                         catalogue=graphene.String(),
-                         entity=graphene.String(),
-                         startyear=graphene.String(),
-                         startmonth=graphene.String(),
-                         search=graphene.String())
+    jobs = graphene.List(Job, **_jobs_args())
+
+    paged_jobs = graphene.relay.ConnectionField(JobConnection, **_jobs_args())
+
+    jobs_changed_since = graphene.Field(JobsChanged, last_logid=graphene.Int(required=True), **_jobs_args())
 
     jobinfo = graphene.List(JobInfo, jobid=graphene.Int())
 
     processjobs = graphene.List(JobDetails, process_id=graphene.String())
 
     _resolve_cache = ResolveCache()
+    # Changed jobs are cached apart, so that responses for single clients do not evict the shared responses
+    _changed_cache = ResolveCache(backend=MemoryBackend(max_entries=JOBS_CHANGED_CACHE_ENTRIES))
+    _job_summary = JobSummary()
 
-    def resolve_jobinfo(self, _, jobid):
-        statement = f"""
-        SELECT *, id AS jobid, jobs.end - jobs.start AS duration
-        FROM jobs
-        WHERE id = {jobid}
-"""
-        jobs = [dict(job) for job in engine.execute(statement)]
-        if not jobs:
-            return
-        job = jobs[0]
-
-        statement = f"""
-        SELECT *, id AS stepid, jobsteps.end - jobsteps.start AS duration
-        FROM jobsteps
-        WHERE jobid = {jobid}
-        ORDER BY start
-"""
-        steps = [dict(step) for step in engine.execute(statement)]
-
-        return [JobInfo(job, steps)]
-
-    def resolve_processjobs(self, _, process_id):
-        statement = f"""
-        SELECT *, id AS jobid, jobs.end - jobs.start AS duration
-        FROM jobs
-        WHERE process_id = '{process_id}'
-"""
-        jobs = [dict(job) for job in engine.execute(statement)]
-        return [JobDetails(job) for job in jobs]
+    def resolve_jobinfo(self, info, jobid):
+        loaders = get_loaders(info.context)
+        return Promise.all([
+            loaders.jobs.load(jobid),
+            loaders.steps.load(jobid)
+        ]).then(lambda result: [JobInfo(*result)] if result[0] else None)
+
+    def resolve_processjobs(self, info, process_id):
+        return get_loaders(info.context).process_jobs.load(process_id).then(
+            lambda jobs: [JobDetails(job) for job in jobs])
 
     def resolve_source_entities(self, _):
-        results = db_session.query(Log).distinct(Log.source, Log.catalogue, Log.entity).all()
-        return [SourceEntity(result.source, result.catalogue, result.entity) for result in results]
+        source_entities.update(data_versions.get(LAST_LOGID))
+        return [SourceEntity(*source_entity) for source_entity in source_entities.get()]
 
-    def resolve_jobs(self, _, **kwargs):
-        days_ago = 10
-        if "days_ago" in kwargs:
-            days_ago = int(kwargs["days_ago"])
-            del kwargs["days_ago"]
-
-        search = "true"
-        if "search" in kwargs:
-            search = kwargs["search"].lower()
-            search = f"lower(log.msg) LIKE '%{search}%'"
-            del kwargs["search"]
-
-        where = " AND ".join([f"{key} = '{value}'" for key, value in kwargs.items()]) if kwargs else "True"
-
-        query = f"""
-SELECT
-    firstlog.process_id,
-    job.id                       AS jobid,
-    job.end - job.start          AS bruto_duration,
-    steps.duration               AS netto_duration,
-    now() - job.start as time_ago,
-    CASE WHEN now() - job.start <= '24 hours'::interval THEN ' 0 - 24 uur'
-         WHEN now() - job.start <= '48 hours'::interval THEN '24 - 48 uur'
-         WHEN now() - job.start <= '96 hours'::interval THEN '48 - 96 uur'
-         ELSE 'Ouder'
-        END                       AS age_category,
-    date(job.start)               AS day,
-    firstlog.name                 AS name,
-    firstlog.source               AS source,
-    firstlog.application          AS application,
-    firstlog.destination          AS destination,
-    firstlog.catalogue            AS catalogue,
-    firstlog.entity               AS entity,
-    job.start                     AS starttime,
-    date_part('year', job.start)  AS startyear,
-    date_part('month', job.start) AS startmonth,
-    job.end                       AS endtime,
-    date_part('year', job.end)    AS endyear,
-    date_part('month', job.end)   AS endmonth,
-    step.name                     AS step,
-    CASE WHEN
-         job.status = 'ended'
-         THEN job.status
-         ELSE step.status
-         END                      AS status,
-    job.user                      AS user,
-    job.attribute                 AS attribute,
-    log.infos,
-    log.warnings,
-    log.errors,
-    COALESCE(job.log_counts->>'data_info', '0')::int     AS datainfos,
-    COALESCE(job.log_counts->>'data_warning', '0')::int  AS datawarnings,
-    COALESCE(job.log_counts->>'data_error', '0')::int    AS dataerrors
-FROM (
-    SELECT
-        sum(case when log.level = 'INFO' then 1 end) as infos,
-        sum(case when log.level = 'WARNING' then 1 end) as warnings,
-        sum(case when log.level = 'ERROR' then 1 end) as errors,
-        min(log.logid) as logid,
-        jobid
-    FROM logs log
-    WHERE log.timestamp >= now() - '{days_ago} days'::interval AND {search}
-    GROUP BY log.jobid
-) log
-join logs firstlog on firstlog.logid = log.logid
-join jobs job ON job.id=log.jobid
-left join (
-    select jobid,
-           SUM(jobsteps.end - jobsteps.start) AS duration,
-           max(id) as stepid
-    from jobsteps
-    group by jobid
-) as steps on steps.jobid = log.jobid
-left join jobsteps step on step.id = steps.stepid
-"""
-
-        statement = f"""
-SELECT *
-FROM   ( {query} )
-AS     result
-WHERE  {where}
-ORDER BY starttime DESC
-"""
-        statement = text(statement)
+    def resolve_source_entities_version(self, _):
+        source_entities.update(data_versions.get(LAST_LOGID))
+        return source_entities.version
 
-        # Response will change when a new log has become available
+    @staticmethod
+    def _jobids(days_ago, search, fulltext, changed_since, last_logid):
+        """
+        Get the ids of the jobs that match the full text search and that have changed since the given logid
+
+        :return: set of jobids, None if the jobs are not selected on search or changes
+        """
+        if not fulltext and changed_since is None:
+            return None
+
+        jobids = None
         with session_scope(True) as session:
-            last_logid = get_last_logid(session)
+            if fulltext:
+                jobids = matching_jobids(session, search, days_ago)
+            if changed_since is not None:
+                changed = changed_jobids(session, changed_since, last_logid)
+                jobids = changed if jobids is None else jobids & changed
+        return jobids
+
+    @staticmethod
+    def _query_jobs(days_ago, search, jobids, **kwargs):
+        statement, params = jobs_query(days_ago, search=search, jobids=jobids, **kwargs)
+        return [dict(result) for result in engine.execute(text(statement), params)]
+
+    @staticmethod
+    def _job_rows(days_ago=10, search=None, changed_since=None, last_logid=None, **kwargs):
+        """
+        Get the jobs for the given filters, most recent jobs first
+
+        A search is executed on the full text index if it is available, the matching jobs are then
+        taken from the job summary. Otherwise the logs that match the search text are aggregated.
+
+        :param days_ago: only jobs that have logs within the last days_ago days
+        :param search: only jobs with logs that match the search text
+        :param changed_since: only jobs that have changed after the log with this logid
+        :param last_logid: logid of the most recent log, read from the data versions if not specified
+        :param kwargs: filters
+        :return: list of job dictionaries
+        """
+        days_ago = int(days_ago)
+        fulltext = search is not None and LOG_SEARCH_MODE == "fulltext" and log_search_index.is_valid()
 
-        # Response will also change when the statement changes
-        return Query._resolve_cache.resolve("resolve_jobs",
-                                            last_logid,
-                                            statement,
-                                            lambda: [Job(**dict(result)) for result in engine.execute(statement)])
+        # Response will change when a new log has become available
+        if last_logid is None:
+            last_logid = data_versions.get(LAST_LOGID)
+
+        def get_response():
+            jobids = Query._jobids(days_ago, search, fulltext, changed_since, last_logid)
+
+            if days_ago <= Query._job_summary.days and (search is None or fulltext):
+                # Serve from the incrementally maintained job summary
+                with session_scope(True) as session:
+                    Query._job_summary.update(session, last_logid)
+                jobs, partial = Query._job_summary.jobs(days_ago, jobids=jobids, **kwargs)
+                if not partial:
+                    return jobs
+                # Jobs that also have logs before the window are aggregated over the logs within the window
+                jobs.extend(Query._query_jobs(days_ago, None, partial, **kwargs))
+                return sorted(jobs, key=lambda job: (job["starttime"], job["jobid"]), reverse=True)
+
+            return Query._query_jobs(days_ago, None if fulltext else search, jobids, **kwargs)
+
+        # Response is cached per combination of arguments
+        cache = Query._resolve_cache if changed_since is None else Query._changed_cache
+        return cache.resolve("resolve_jobs",
+                             last_logid,
+                             dict(kwargs, days_ago=days_ago, search=search, fulltext=fulltext,
+                                  changed_since=changed_since),
+                             get_response)
+
+    def resolve_jobs(self, _, **kwargs):
+        return [Job(**job) for job in Query._job_rows(**kwargs)]
+
+    def resolve_jobs_changed_since(self, _, last_logid, **kwargs):
+        """
+        Resolve the jobs that have changed after the log with the given logid
+
+        The returned last_logid is the high-water mark to use in the next request.
+        The data versions can be somewhat behind the client, the high-water mark never moves backwards.
+        If more than JOBS_CHANGED_MAX_LOGS logs have been added, the logs are not read and refetch is returned.
+        """
+        current = data_versions.get(LAST_LOGID)
+        high_water_mark = last_logid if current is None else max(last_logid, current)
+        if high_water_mark == last_logid:
+            return JobsChanged(jobs=[], last_logid=high_water_mark, refetch=False)
+        if high_water_mark - last_logid > JOBS_CHANGED_MAX_LOGS:
+            return JobsChanged(jobs=None, last_logid=high_water_mark, refetch=True)
+        jobs = Query._job_rows(changed_since=last_logid, last_logid=high_water_mark, **kwargs)
+        return JobsChanged(jobs=[Job(**job) for job in jobs], last_logid=high_water_mark, refetch=False)
+
+    def resolve_paged_jobs(self, _, first=None, after=None, last=None, before=None, **kwargs):
+        """
+        Resolve a page of jobs
+
+        Pages are selected on the keyset (starttime, jobid) of the jobs so that cursors stay valid
+        when new jobs are added. Only the jobs within the page are converted into Job objects.
+
+        The page is sliced from the (cached) list of all jobs for the filters, as served by the job summary;
+        the total count requires the complete list anyway.
+        """
+        jobs = Query._job_rows(**kwargs)
+        total_count = len(jobs)
+
+        # Jobs are ordered on descending (starttime, jobid)
+        start, end = 0, total_count
+        if after is not None:
+            position = _decode_job_cursor(after)
+            start = next((i for i, job in enumerate(jobs) if _job_key(job) < position), total_count)
+        if before is not None:
+            position = _decode_job_cursor(before)
+            end = next((i for i, job in enumerate(jobs) if _job_key(job) <= position), total_count)
+        end = max(start, end)
+
+        page_size = next((size for size in [first, last] if size is not None), JOBS_PAGE_SIZE)
+        page_size = min(page_size, JOBS_MAX_PAGE_SIZE)
+        if first is None and last is not None:
+            page_start, page_end = max(start, end - page_size), end
+        else:
+            page_start, page_end = start, min(end, start + page_size)
+
+        edges = [JobConnection.Edge(node=Job(**job), cursor=_encode_job_cursor(job))
+                 for job in jobs[page_start:page_end]]
+        page_info = graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=page_start > 0,
+            has_next_page=page_end < total_count
+        )
+        return JobConnection(edges=edges, page_info=page_info, total_count=total_count)
 
 
 schema = graphene.Schema(query=Query)
+
+
+def warm_up():
+    """
+    Build the job summary in the background, eg on start of the service
+
+    :return: None
+    """
+    Query._job_summary.warm_up()
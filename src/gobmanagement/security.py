@@ -13,6 +13,18 @@ _PERMISSIONS = {
         'methods': ['GET'],
         'roles': _PUBLIC,
     },
+    '/status/pool/?': {
+        'methods': ['GET'],
+        'roles': _PUBLIC,
+    },
+    '/status/metrics/?': {
+        'methods': ['GET'],
+        'roles': _PUBLIC,
+    },
+    '/status/slow_queries/?': {
+        'methods': ['GET'],
+        'roles': [GOB_ADMIN],
+    },
     f'{API_BASE_PATH}/job/?': {
         'methods': ['POST'],
         'roles': [GOB_ADMIN],
@@ -41,10 +53,18 @@ _PERMISSIONS = {
         'methods': ['GET'],
         'roles': _PUBLIC,
     },
+    f'{PUBLIC_API_BASE_PATH}/queues/history/?': {
+        'methods': ['GET'],
+        'roles': _PUBLIC,
+    },
     f'{PUBLIC_API_BASE_PATH}/graphql/?': {
         'methods': ['GET', 'POST'],
         'roles': _PUBLIC,
     },
+    f'{PUBLIC_API_BASE_PATH}/logs/export/?': {
+        'methods': ['GET'],
+        'roles': _PUBLIC,
+    },
     '/.*': {
         'methods': ['GET', 'POST'],
         'roles': [GOB_ADMIN, GOB_ADMIN_R],
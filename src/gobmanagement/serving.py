@@ -0,0 +1,34 @@
+"""Serving mode
+
+"threads" (default): requests are handled by threads.
+Database and HTTP calls block the thread that executes them.
+
+"gevent": requests are handled by greenlets.
+The standard library is monkey patched and psycopg2 waits cooperatively,
+so a slow database query or RabbitMQ management call only suspends the greenlet that executes it.
+
+The standard library has to be monkey patched before any module is imported. This is done by uwsgi
+(gevent-early-monkey-patch), the gobmanagement package itself already imports gobcore and its dependencies.
+patch() checks that the monkey patching has been done and makes psycopg2 cooperative.
+"""
+from gobmanagement.config import SERVING_MODE
+
+
+def patch():
+    """
+    Prepare the process for the configured serving mode
+
+    Raises an exception in gevent mode if the standard library has not been monkey patched early
+
+    :return: None
+    """
+    if SERVING_MODE != "gevent":
+        return
+
+    from gevent import monkey
+    if not monkey.is_module_patched("socket"):
+        raise RuntimeError("Serving mode gevent requires the standard library to be monkey patched "
+                           "before any module is imported, run uwsgi with UWSGI_GEVENT_EARLY_MONKEY_PATCH=1")
+
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
@@ -2,82 +2,433 @@
 
 Broadcast 'new_logs' events on any new log messages
 
+The 'new_logs' event contains the new logs, as columns and rows, so that clients do not need to query them.
+If there are too many new logs, the event contains a refetch marker instead.
+
+Clients receive the events of the rooms that they have subscribed to:
+- "all": all new logs, every client is subscribed to this room on connect
+- "jobid:<jobid>", "process_id:<process_id>", "catalogue:<catalogue>": only the new logs for the job, process
+  or catalogue. Subscribers of a process also receive a 'process_state' event on any new logs for the process.
+  If the events are shared, only the subscribers that are connected to the broadcasting process receive it.
+
+The broadcaster either polls the database every CHECK_LOGS_INTERVAL seconds ("poll")
+or waits for change notifications from the database ("listen").
+In listen mode the broadcaster falls back to polling when the listen connection fails.
+
+The broadcaster runs while any client is connected and stops as soon as the last client disconnects.
+If the events are shared between processes by a SocketIO message queue, only one process on the node
+broadcasts the events: the process that holds the leader lock file.
 """
+import datetime
+import fcntl
+import os
 import time
 import threading
 
-from gobmanagement.database import get_last_logid, get_last_service_timestamp
+from collections import defaultdict
+
+from flask_socketio import join_room, leave_room
+
+from gobmanagement.config import LOG_BROADCAST_MODE, LOG_BROADCAST_DEBOUNCE, LOG_BROADCAST_LISTEN_RETRY_INTERVAL, \
+    LOG_BROADCAST_LOCK_FILE, NEW_LOGS_MAX
+from gobmanagement.database import get_last_logid, get_last_service_timestamp, get_new_logs, get_process_state, \
+    NEW_LOGS_COLUMNS
 from gobmanagement.database.base import session_scope
+from gobmanagement.database.notifications import ChangeListener
+from gobmanagement.metrics import SOCKET_CLIENTS, SOCKET_EMITS
+from gobmanagement.versions import data_versions, LAST_LOGID, LAST_SERVICE_TIMESTAMP
+
+ALL = "all"
+ROOM_KEYS = ["jobid", "process_id", "catalogue"]
+
+
+def room_name(data):
+    """Get the name of the room for the subscription data
+
+    :param data: {} for all logs or {key: value} for key in ROOM_KEYS
+    :return: room name
+    """
+    if not data:
+        return ALL
+    if not isinstance(data, dict) or len(data) != 1 or next(iter(data)) not in ROOM_KEYS:
+        raise ValueError(f"Subscribe to one of {', '.join(ROOM_KEYS)}")
+    (key, value), = data.items()
+    return f"{key}:{value}"
+
+
+def _serializable(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+class StopSignal:
+    """Event to stop a broadcaster
+
+    The signal can also be selected on, to interrupt waiting for database notifications.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._read, self._write = os.pipe()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def set(self):
+        with self._lock:
+            if not self._event.is_set() and not self._closed:
+                self._event.set()
+                os.write(self._write, b"\0")
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def wait(self, timeout):
+        return self._event.wait(timeout)
+
+    def fileno(self):
+        return self._read
+
+    def close(self):
+        with self._lock:
+            self._event.set()
+            if not self._closed:
+                os.close(self._read)
+                os.close(self._write)
+                self._closed = True
+
+
+class LeaderLock:
+    """Exclusive lock on a file, held by at most one process on the node
+
+    The lock is released by the operating system when the process that holds it ends.
+    """
+
+    def __init__(self, path=LOG_BROADCAST_LOCK_FILE):
+        self._path = path
+        self._file = None
+
+    def acquire(self):
+        """Try to acquire the lock without waiting
+
+        :return: True if the lock is acquired
+        """
+        file = open(self._path, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        self._file = file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
 
 
 class LogBroadcaster():
 
     CHECK_LOGS_INTERVAL = 5  # Check for new logs every 5 seconds
 
-    def __init__(self, _socketio):
+    def __init__(self, _socketio, shared=False):
         """Initializes a broadcaster for new log records
 
         On any new log records a 'new_logs' event is broadcasted
 
         :param _socketio: SocketIO instance
+        :param shared: True if the events are shared with other processes by a SocketIO message queue
         """
         self._socketio = _socketio
+        self._shared = shared
+        self._leader_lock = LeaderLock() if shared else None
         self._clients = 0
         self._broadcaster = None
+        self._stop = None
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
         self._previous_last_logid = None
         self._previous_last_timestamp = None
+        self._rooms = defaultdict(set)
+        self._rooms_lock = threading.Lock()
 
-    def on_connect(self):
+    def on_connect(self, sid=None):
         """On connect of a new client
 
-        Start a broadcast thread if not yet running
+        Subscribe the client to all logs and start a broadcast thread if not yet running
 
+        :param sid: session id of the client
         :return: None
         """
-        self._clients += 1
-        self._start_broadcasts()
-        print("Client connected", self._clients)
+        self._join(sid, ALL)
+        with self._lock:
+            self._clients += 1
+            clients = self._clients
+            SOCKET_CLIENTS.set(clients)
+            self._start_broadcasts()
+        print("Client connected", clients)
 
-    def on_disconnect(self):
+    def on_disconnect(self, sid=None):
         """On disconnect of a new client
 
         Stop broadcast thread if no clients are connected anymore
 
+        :param sid: session id of the client
         :return: None
         """
-        self._clients -= 1
-        print("Client disconnected", self._clients)
+        with self._lock:
+            self._clients = max(self._clients - 1, 0)
+            clients = self._clients
+            SOCKET_CLIENTS.set(clients)
+            if clients == 0 and self._stop is not None:
+                self._stop.set()
+        with self._rooms_lock:
+            for room in list(self._rooms):
+                self._remove(sid, room)
+        print("Client disconnected", clients)
+
+    def on_subscribe(self, sid, data):
+        """Subscribe a client to a room
+
+        :param sid: session id of the client
+        :param data: {} for all logs or {key: value} for key in ROOM_KEYS
+        :return: acknowledgement, {'room': room} or {'error': message}
+        """
+        try:
+            room = room_name(data)
+        except ValueError as e:
+            return {'error': str(e)}
+        self._join(sid, room)
+        return {'room': room}
+
+    def on_unsubscribe(self, sid, data):
+        """Unsubscribe a client from a room
+
+        :param sid: session id of the client
+        :param data: {} for all logs or {key: value} for key in ROOM_KEYS
+        :return: acknowledgement, {'room': room} or {'error': message}
+        """
+        try:
+            room = room_name(data)
+        except ValueError as e:
+            return {'error': str(e)}
+        leave_room(room, sid=sid)
+        with self._rooms_lock:
+            self._remove(sid, room)
+        return {'room': room}
+
+    def _join(self, sid, room):
+        join_room(room, sid=sid)
+        with self._rooms_lock:
+            self._rooms[room].add(sid)
+
+    def _remove(self, sid, room):
+        self._rooms[room].discard(sid)
+        if not self._rooms[room]:
+            del self._rooms[room]
 
     def _start_broadcasts(self):
         """Start broadcast thread if not yet running
 
+        A thread that is stopping is not reused, a new thread is started when it has ended.
+        Should be called while holding the lock.
+
         :return: None
         """
-        if self._broadcaster is None:
-            self._broadcaster = threading.Thread(target=self._broadcasts)
+        if self._stop is None or self._stop.is_set() or not self._broadcaster.is_alive():
+            if self._broadcaster is not None:
+                # A stopping thread ends after its current check, any later checks are serialized by the check lock
+                self._broadcaster.join(LogBroadcaster.CHECK_LOGS_INTERVAL)
+            self._stop = StopSignal()
+            self._broadcaster = threading.Thread(target=self._broadcasts, args=(self._stop,), daemon=True)
             self._broadcaster.start()
 
-    def _broadcasts(self):
-        """Broadcast 'new_logs' events on any new log messages
+    def _broadcasts(self, stop):
+        """Broadcast 'new_logs' events on any new log messages until stopped
 
+        If the events are shared, the events are only broadcasted while holding the leader lock
+
+        :param stop: stop signal
         :return: None
         """
-        print("Start broadcast new logs", self._clients)
+        print("Start broadcast new logs")
+        try:
+            while not stop.is_set():
+                if self._leader_lock is None or self._leader_lock.acquire():
+                    try:
+                        self._broadcast(stop)
+                    finally:
+                        if self._leader_lock is not None:
+                            self._leader_lock.release()
+                else:
+                    # Another process broadcasts the events, take over when it stops
+                    stop.wait(LogBroadcaster.CHECK_LOGS_INTERVAL)
+        finally:
+            stop.close()
+        print("End broadcast new logs")
 
-        while self._clients > 0:
-            with session_scope(True) as session:
-                last_logid = get_last_logid(session)
-                last_timestamp = get_last_service_timestamp(session)
+    def _broadcast(self, stop):
+        """Check for new logs by listening or polling until stopped
 
-            if last_logid != self._previous_last_logid:
-                self._socketio.emit('new_logs', {'last_logid': last_logid})
-                self._previous_last_logid = last_logid
+        :param stop: stop signal
+        :return: None
+        """
+        while not stop.is_set():
+            if LOG_BROADCAST_MODE == "listen":
+                try:
+                    self._listen(stop)
+                except Exception as e:
+                    print(f"Listen for new logs failed: {str(e)}, poll for {LOG_BROADCAST_LISTEN_RETRY_INTERVAL}s")
+                    self._poll(stop, until=time.time() + LOG_BROADCAST_LISTEN_RETRY_INTERVAL)
+            else:
+                self._poll(stop)
 
-            if last_timestamp != self._previous_last_timestamp:
-                self._socketio.emit('update_services', {'last_timestamp': last_timestamp.isoformat()})
-                self._previous_last_timestamp = last_timestamp
+    def _poll(self, stop, until=None):
+        """Check for new logs every CHECK_LOGS_INTERVAL seconds
 
-            time.sleep(LogBroadcaster.CHECK_LOGS_INTERVAL)
+        :param stop: stop signal
+        :param until: optional time until which to poll
+        :return: None
+        """
+        while not stop.is_set() and (until is None or time.time() < until):
+            self._check()
+            stop.wait(LogBroadcaster.CHECK_LOGS_INTERVAL)
 
-        self._broadcaster = None
-        print("End broadcast new logs", self._clients)
+    def _listen(self, stop):
+        """Check for new logs on every change notification
+
+        Notifications that arrive within LOG_BROADCAST_DEBOUNCE seconds are handled by a single check.
+        While no notifications arrive, the last known versions are still valid.
+
+        :param stop: stop signal, interrupts waiting for notifications
+        :return: None
+        """
+        listener = ChangeListener()
+        try:
+            listener.connect()
+            self._check()
+            while not stop.is_set():
+                if listener.wait(LogBroadcaster.CHECK_LOGS_INTERVAL, interrupt=stop):
+                    if stop.wait(LOG_BROADCAST_DEBOUNCE):
+                        break
+                    listener.wait(0)
+                    self._check()
+                elif not stop.is_set():
+                    listener.ping()
+                    self._push_versions(self._previous_last_logid, self._previous_last_timestamp)
+        finally:
+            listener.close()
+
+    def _push_versions(self, last_logid, last_timestamp):
+        # Push the versions so that cached responses can be validated without querying the database
+        data_versions.update(LAST_LOGID, last_logid)
+        data_versions.update(LAST_SERVICE_TIMESTAMP, last_timestamp)
+
+    def _check(self):
+        """Emit 'new_logs' and 'update_services' events on any new logs or services
+
+        Checks are serialized, so that the events are emitted once even if a stopping thread is still checking.
+
+        :return: None
+        """
+        with self._check_lock:
+            self._check_versions()
+
+    def _check_versions(self):
+        with session_scope(True) as session:
+            last_logid = get_last_logid(session)
+            last_timestamp = get_last_service_timestamp(session)
+
+        self._push_versions(last_logid, last_timestamp)
+
+        if last_logid != self._previous_last_logid:
+            self._emit_new_logs(self._new_logs(self._previous_last_logid, last_logid))
+            self._previous_last_logid = last_logid
+
+        if last_timestamp != self._previous_last_timestamp:
+            self._emit('update_services', {'last_timestamp': last_timestamp.isoformat()})
+            self._previous_last_timestamp = last_timestamp
+
+    def _new_logs(self, after_logid, last_logid):
+        """Get the 'new_logs' event data
+
+        The new logs are read once for all clients, at most NEW_LOGS_MAX logs are included.
+
+        :param after_logid: last logid of the previous event
+        :param last_logid: logid of the most recent log
+        :return: event data
+        """
+        data = {'last_logid': last_logid, 'after_logid': after_logid}
+        if after_logid is None or last_logid is None or last_logid < after_logid:
+            data['refetch'] = True
+            return data
+
+        with session_scope(True) as session:
+            logs = get_new_logs(session, after_logid, last_logid, NEW_LOGS_MAX + 1)
+
+        if len(logs) > NEW_LOGS_MAX:
+            data['refetch'] = True
+        else:
+            data['columns'] = NEW_LOGS_COLUMNS
+            data['logs'] = [[_serializable(value) for value in log] for log in logs]
+        return data
+
+    def _emit_new_logs(self, data):
+        """Emit the 'new_logs' event to every room that has subscribers
+
+        The rooms for a job, process or catalogue only receive the new logs for that job, process or catalogue.
+        If the events are shared, the subscribers are not known and the event is emitted to all rooms in the logs.
+        A refetch marker is emitted to every client.
+
+        The 'process_state' event is only emitted to the process rooms that have subscribers in this process,
+        so that the state is not read for processes that nobody follows.
+
+        :param data: event data
+        :return: None
+        """
+        with self._rooms_lock:
+            local_rooms = set(self._rooms)
+
+        if data.get('refetch'):
+            self._emit('new_logs', data)
+            changed_rooms = local_rooms
+        else:
+            rooms = None if self._shared else local_rooms
+            if rooms is None or ALL in rooms:
+                self._emit('new_logs', data, to=ALL)
+
+            room_logs = self._room_logs(data, rooms)
+            for room, logs in room_logs.items():
+                self._emit('new_logs', dict(data, logs=logs, room=room), to=room)
+            changed_rooms = local_rooms.intersection(room_logs)
+
+        for room in sorted(changed_rooms):
+            self._emit_process_state(room)
+
+    def _emit(self, event, data, **kwargs):
+        SOCKET_EMITS.labels(event=event).inc()
+        self._socketio.emit(event, data, **kwargs)
+
+    def _emit_process_state(self, room):
+        key, _, value = room.partition(":")
+        if key == "process_id":
+            self._emit('process_state', {
+                'process_id': value,
+                'state': get_process_state(value)
+            }, to=room)
+
+    def _room_logs(self, data, rooms):
+        """Group the new logs by room
+
+        :param data: event data
+        :param rooms: rooms that have subscribers, None for any room
+        :return: dictionary of room => list of logs
+        """
+        room_logs = defaultdict(list)
+        columns = [(key, NEW_LOGS_COLUMNS.index(key)) for key in ROOM_KEYS]
+        for log in data.get('logs', []):
+            for key, index in columns:
+                room = f"{key}:{log[index]}"
+                if log[index] is not None and (rooms is None or room in rooms):
+                    room_logs[room].append(log)
+        return room_logs
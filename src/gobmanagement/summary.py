@@ -0,0 +1,384 @@
+"""
+Job summary
+
+Keeps a summary per job (log counts, first log attributes, last step and netto duration) in memory.
+
+The summary is updated incrementally: only the logs that have been added since the previous update are aggregated.
+This makes the cost of resolving the jobs list proportional to the number of jobs instead of the number of logs.
+
+The counts and first log of a job are those of the logs within the requested window, as in the jobs query.
+The summary holds these for the jobs that have all their logs within the window. The few jobs that also have
+logs before the window are reported separately, so that they can be aggregated over the window by the jobs query.
+
+Times are compared in the clock of the database. The summary is warmed up in the background when the service
+starts and it is periodically rebuilt in the background.
+"""
+import datetime
+import threading
+import time
+
+from sqlalchemy import text
+
+from gobmanagement.config import JOB_SUMMARY_DAYS, JOB_SUMMARY_REBUILD_INTERVAL
+from gobmanagement.database import get_last_logid
+from gobmanagement.database.base import session_scope
+
+# Current time of the database, in the time zone of the (naive) log and job timestamps
+_NOW = text("SELECT LOCALTIMESTAMP")
+
+_LOG_COUNTS = text("""
+SELECT
+    jobid,
+    sum(case when level = 'INFO' then 1 end)    AS infos,
+    sum(case when level = 'WARNING' then 1 end) AS warnings,
+    sum(case when level = 'ERROR' then 1 end)   AS errors,
+    min(logid)                                  AS first_logid,
+    max(logid)                                  AS last_logid,
+    min(timestamp)                              AS first_timestamp,
+    max(timestamp)                              AS last_timestamp
+FROM logs
+WHERE logid > :after_logid
+AND   logid <= :last_logid
+AND   timestamp >= now() - :days * '1 day'::interval
+AND   jobid IS NOT NULL
+GROUP BY jobid
+""")
+
+_FIRST_LOGS = text("""
+SELECT
+    logid,
+    process_id,
+    name,
+    source,
+    application,
+    destination,
+    catalogue,
+    entity
+FROM logs
+WHERE logid = ANY(:logids)
+""")
+
+_JOBS = text("""
+SELECT
+    job.id                        AS jobid,
+    job.start                     AS starttime,
+    job.end                       AS endtime,
+    job.status                    AS job_status,
+    job.user                      AS user,
+    job.attribute                 AS attribute,
+    steps.duration                AS netto_duration,
+    step.name                     AS step,
+    step.status                   AS step_status,
+    COALESCE(job.log_counts->>'data_info', '0')::int     AS datainfos,
+    COALESCE(job.log_counts->>'data_warning', '0')::int  AS datawarnings,
+    COALESCE(job.log_counts->>'data_error', '0')::int    AS dataerrors
+FROM jobs job
+LEFT JOIN (
+    SELECT jobid,
+           SUM(jobsteps.end - jobsteps.start) AS duration,
+           max(id) AS stepid
+    FROM jobsteps
+    WHERE jobid = ANY(:jobids)
+    GROUP BY jobid
+) AS steps ON steps.jobid = job.id
+LEFT JOIN jobsteps step ON step.id = steps.stepid
+WHERE job.id = ANY(:jobids)
+""")
+
+_COUNTS = ["infos", "warnings", "errors"]
+
+_FIRST_LOG_ATTRIBUTES = ["process_id", "name", "source", "application", "destination", "catalogue", "entity"]
+
+_AGE_CATEGORIES = [
+    (datetime.timedelta(hours=24), " 0 - 24 uur"),
+    (datetime.timedelta(hours=48), "24 - 48 uur"),
+    (datetime.timedelta(hours=96), "48 - 96 uur"),
+]
+
+
+def _age_category(time_ago):
+    """
+    Returns the age category for the given time since the start of a job
+
+    :param time_ago: time since the job has started
+    :return: age category
+    """
+    for max_age, category in _AGE_CATEGORIES:
+        if time_ago <= max_age:
+            return category
+    return "Ouder"
+
+
+def _matches(job, filters):
+    """
+    Tells if the job matches all given filters
+
+    startyear and startmonth are specified as strings, all other filters match on equality
+
+    :param job: job summary row
+    :param filters: dictionary of column => value
+    :return: True if the job matches all filters
+    """
+    for key, value in filters.items():
+        if key in ("startyear", "startmonth"):
+            if job[key] != int(value):
+                return False
+        elif job[key] != value:
+            return False
+    return True
+
+
+class JobSummary:
+
+    def __init__(self, days=JOB_SUMMARY_DAYS, rebuild_interval=JOB_SUMMARY_REBUILD_INTERVAL):
+        """
+        Initialize an empty summary
+
+        :param days: number of days of logs that are kept in the summary
+        :param rebuild_interval: number of seconds after which the summary is rebuilt from scratch
+        """
+        self.days = days
+        self._rebuild_interval = rebuild_interval
+        self._jobs = {}
+        self._last_logid = None
+        self._built_at = None
+        # Time of the database and the corresponding monotonic time of the last time that it has been read
+        self._clock = None
+        self._rebuilder = None
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def update(self, session, last_logid):
+        """
+        Update the summary with all logs up to and including last_logid
+
+        The summary is built on first use, unless it has been warmed up. It is periodically rebuilt in the background
+        to include any logs that were committed out of logid order, meanwhile the current summary is updated and used.
+
+        The logs are read outside the summary lock, so that the jobs in the summary stay available meanwhile.
+        Updates are serialized, an update waits for any running update and then only reads the logs after it.
+
+        :param session: database session
+        :param last_logid: logid of the most recent log
+        :return: None
+        """
+        with self._lock:
+            if self._built_at is None:
+                self._built_at = time.time()
+            elif time.time() - self._built_at > self._rebuild_interval and \
+                    (self._rebuilder is None or not self._rebuilder.is_alive()):
+                self._rebuilder = threading.Thread(target=self._rebuild, args=(last_logid,), daemon=True)
+                self._rebuilder.start()
+
+        with self._update_lock:
+            with self._lock:
+                after_logid = self._last_logid
+                known_jobids = set(self._jobs)
+            if last_logid is None or (after_logid is not None and last_logid <= after_logid):
+                return
+
+            now = session.execute(_NOW).scalar()
+            logs = self._read_logs(session, after_logid or 0, last_logid, known_jobids)
+
+            with self._lock:
+                if self._last_logid != after_logid:
+                    # The summary has been replaced by a rebuild meanwhile, the next update reads the logs after it
+                    return
+                self._set_clock(now)
+                self._merge(*logs)
+                self._last_logid = last_logid
+                self._prune()
+
+    def warm_up(self):
+        """
+        Build the summary in the background, so that the first request does not have to
+
+        :return: None
+        """
+        threading.Thread(target=self._warm_up, daemon=True).start()
+
+    def _warm_up(self):
+        try:
+            with session_scope(True) as session:
+                self.update(session, get_last_logid(session))
+        except Exception as e:
+            print(f"Job summary warm up failed: {str(e)}")
+
+    def _rebuild(self, last_logid):
+        """
+        Build a new summary up to last_logid and replace the current summary by it
+
+        Logs after last_logid are added to the new summary by the next update
+
+        :param last_logid: logid of the most recent log
+        :return: None
+        """
+        summary = JobSummary(self.days, self._rebuild_interval)
+        try:
+            with session_scope(True) as session:
+                summary.update(session, last_logid)
+        except Exception as e:
+            print(f"Job summary rebuild failed: {str(e)}")
+            summary = None
+
+        with self._lock:
+            if summary is None:
+                # Try again after the rebuild interval
+                self._built_at = time.time()
+                return
+            self._jobs = summary._jobs
+            self._last_logid = summary._last_logid
+            self._clock = summary._clock or self._clock
+            self._built_at = summary._built_at
+
+    def _set_clock(self, now):
+        self._clock = now, time.monotonic()
+
+    def _now(self):
+        """
+        Get the current time of the database
+
+        :return: current time, None if the time of the database has not yet been read
+        """
+        if self._clock is None:
+            return None
+        now, at = self._clock
+        return now + datetime.timedelta(seconds=time.monotonic() - at)
+
+    def _read_logs(self, session, after_logid, last_logid, known_jobids):
+        """
+        Aggregate the logs in the range (after_logid, last_logid] and read the jobs that they belong to
+
+        :param session: database session
+        :param after_logid: logid of the last log that has already been processed
+        :param last_logid: logid of the most recent log
+        :param known_jobids: ids of the jobs that are already in the summary
+        :return: tuple (log counts per job, first logs of the new jobs by logid, jobs)
+        """
+        counts = session.execute(_LOG_COUNTS, {
+            "after_logid": after_logid,
+            "last_logid": last_logid,
+            "days": self.days
+        }).fetchall()
+        if not counts:
+            return [], {}, []
+
+        logids = [row.first_logid for row in counts if row.jobid not in known_jobids]
+        first_logs = {row.logid: row for row in session.execute(_FIRST_LOGS, {"logids": logids})} if logids else {}
+
+        # Jobs and steps are updated together with the logs that they produce
+        jobs = session.execute(_JOBS, {"jobids": [row.jobid for row in counts]}).fetchall()
+        return counts, first_logs, jobs
+
+    def _merge(self, counts, first_logs, jobs):
+        """
+        Merge the logs and jobs that have been read into the summary
+
+        :param counts: log counts per job
+        :param first_logs: first logs of the new jobs by logid
+        :param jobs: job rows
+        :return: None
+        """
+        for job in self._merge_counts(counts):
+            first_log = first_logs.get(job["first_logid"])
+            if first_log is not None:
+                job.update({attr: getattr(first_log, attr) for attr in _FIRST_LOG_ATTRIBUTES})
+
+        for row in jobs:
+            self._jobs[row.jobid].update(dict(row))
+
+    def _merge_counts(self, counts):
+        """
+        Add the log counts per job to the summary
+
+        :param counts: log counts per job
+        :return: the jobs that were not yet in the summary
+        """
+        new_jobs = []
+        for row in counts:
+            job = self._jobs.get(row.jobid)
+            if job is None:
+                job = self._jobs[row.jobid] = {"jobid": row.jobid, "first_logid": row.first_logid}
+                new_jobs.append(job)
+            for count in _COUNTS:
+                job[count] = (job.get(count) or 0) + (getattr(row, count) or 0)
+            job["last_logid"] = row.last_logid
+            job["first_timestamp"] = min(job.get("first_timestamp", row.first_timestamp), row.first_timestamp)
+            job["last_timestamp"] = row.last_timestamp
+        return new_jobs
+
+    def _prune(self):
+        """
+        Remove the jobs that have no logs within the summary period anymore
+
+        :return: None
+        """
+        horizon = self._now() - datetime.timedelta(days=self.days)
+        self._jobs = {jobid: job for jobid, job in self._jobs.items() if job["last_timestamp"] >= horizon}
+
+    def jobs(self, days_ago, jobids=None, **filters):
+        """
+        Get the jobs that have logs within the last days_ago days, most recent jobs first
+
+        Jobs that also have logs before the window are not included in the rows, their ids are returned instead.
+        Their counts and first log are to be taken from the logs within the window only, eg by the jobs query.
+
+        :param days_ago: number of days to look back, at most the number of days in the summary
+        :param jobids: only these jobs, eg the jobs that match a full text search
+        :param filters: column => value filters (jobid, source, catalogue, entity, startyear, startmonth)
+        :return: tuple (list of job dictionaries, set of ids of the jobs that also have logs before the window)
+        """
+        with self._lock:
+            now = self._now()
+            if jobids is None:
+                jobs = list(self._jobs.values())
+            else:
+                jobs = [self._jobs[jobid] for jobid in jobids if jobid in self._jobs]
+
+        if now is None:
+            return [], set()
+
+        horizon = now - datetime.timedelta(days=days_ago)
+        # Jobs without a job record or without a first log are not reported
+        jobs = [job for job in jobs if "starttime" in job and "process_id" in job and job["last_timestamp"] >= horizon]
+        partial = {job["jobid"] for job in jobs if job["first_timestamp"] < horizon}
+        rows = [self._row(job, now) for job in jobs if job["jobid"] not in partial]
+        result = [row for row in rows if _matches(row, filters)]
+        return sorted(result, key=lambda row: (row["starttime"], row["jobid"]), reverse=True), partial
+
+    def _row(self, job, now):
+        """
+        Convert a job summary into a jobs row
+
+        :param job: job summary
+        :param now: current time of the database
+        :return: jobs row
+        """
+        starttime = job["starttime"]
+        endtime = job["endtime"]
+        time_ago = now - starttime
+        row = {attr: job[attr] for attr in _FIRST_LOG_ATTRIBUTES}
+        row.update({
+            "jobid": job["jobid"],
+            "bruto_duration": endtime - starttime if endtime else None,
+            "netto_duration": job["netto_duration"],
+            "time_ago": time_ago,
+            "age_category": _age_category(time_ago),
+            "day": starttime.date(),
+            "starttime": starttime,
+            "startyear": starttime.year,
+            "startmonth": starttime.month,
+            "endtime": endtime,
+            "endyear": endtime.year if endtime else None,
+            "endmonth": endtime.month if endtime else None,
+            "step": job["step"],
+            "status": job["job_status"] if job["job_status"] == "ended" else job["step_status"],
+            "user": job["user"],
+            "attribute": job["attribute"],
+            "datainfos": job["datainfos"],
+            "datawarnings": job["datawarnings"],
+            "dataerrors": job["dataerrors"],
+        })
+        # Like SQL sum(), report no count instead of a zero count
+        row.update({count: job[count] or None for count in _COUNTS})
+        return row
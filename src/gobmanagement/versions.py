@@ -0,0 +1,68 @@
+"""Data versions
+
+Keeps track of the version of the management data (last logid, most recent service timestamp) within the process.
+
+The versions are pushed by the LogBroadcaster that polls the database for changes.
+Cached responses can be validated against these versions without any database roundtrip.
+Only if no recent version has been pushed (no broadcaster is running) the version is read from the database.
+"""
+import threading
+import time
+
+from gobmanagement.config import DATA_VERSION_MAX_AGE
+from gobmanagement.database import get_last_logid, get_last_service_timestamp
+from gobmanagement.database.base import session_scope
+
+LAST_LOGID = "last_logid"
+LAST_SERVICE_TIMESTAMP = "last_service_timestamp"
+
+_QUERIES = {
+    LAST_LOGID: get_last_logid,
+    LAST_SERVICE_TIMESTAMP: get_last_service_timestamp,
+}
+
+
+class DataVersions:
+
+    def __init__(self, max_age=DATA_VERSION_MAX_AGE):
+        """
+        Initialize without any known versions
+
+        :param max_age: number of seconds that a version is used before it is read again from the database
+        """
+        self._max_age = max_age
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def update(self, name, value):
+        """
+        Register the current version of the data
+
+        :param name: name of the version, eg LAST_LOGID
+        :param value: current value
+        :return: None
+        """
+        with self._lock:
+            self._versions[name] = (value, time.time())
+
+    def get(self, name):
+        """
+        Get the current version of the data
+
+        The last registered version is returned if it is recent enough, otherwise it is read from the database
+
+        :param name: name of the version, eg LAST_LOGID
+        :return: current value
+        """
+        with self._lock:
+            value, timestamp = self._versions.get(name, (None, None))
+        if timestamp is not None and time.time() - timestamp <= self._max_age:
+            return value
+
+        with session_scope(True) as session:
+            value = _QUERIES[name](session)
+        self.update(name, value)
+        return value
+
+
+data_versions = DataVersions()
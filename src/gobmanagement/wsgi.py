@@ -1,3 +1,10 @@
-from gobmanagement.api import app
+from gobmanagement.serving import patch
 
+patch()
+
+from gobmanagement.api import app, queue_sampler  # noqa: E402
+from gobmanagement.schemas import warm_up  # noqa: E402
+
+queue_sampler.start()
+warm_up()
 application = app
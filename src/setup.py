@@ -13,7 +13,6 @@ setup(
         "flask_cors",
         "flask_graphql",
         "flask_socketio",
-        "flask_sqlalchemy",
         "gobcore",
         "graphene",
         "graphene_sqlalchemy",
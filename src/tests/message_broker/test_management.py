@@ -1,20 +1,99 @@
+import threading
+
 from unittest import TestCase
-from unittest.mock import patch, ANY
+from unittest.mock import patch, ANY, MagicMock
+
+from gobmanagement.message_broker.management import ManagementClient, _request, get_queues, purge_queue
 
-from gobmanagement.message_broker.management import _request, get_queues, purge_queue
 
 class TestManagement(TestCase):
-    @patch('gobmanagement.message_broker.management.requests')
-    def test_get(self, mock_requests):
+    @patch('gobmanagement.message_broker.management._client')
+    def test_request(self, mock_client):
         _request("any path")
-        mock_requests.get.assert_called_with(ANY, auth=ANY)
+        mock_client.request.assert_called_with("any path", "get")
 
-    @patch('gobmanagement.message_broker.management._request')
-    def test_get_queues(self, mock_request):
-        get_queues()
-        mock_request.assert_called_with(ANY)
+    @patch('gobmanagement.message_broker.management._client')
+    def test_get_queues(self, mock_client):
+        self.assertEqual(get_queues(), mock_client.get_json.return_value)
+        mock_client.get_json.assert_called_with(ANY)
 
+    @patch('gobmanagement.message_broker.management._client')
     @patch('gobmanagement.message_broker.management._request')
-    def test_purge_queue(self, mock_request):
-        purge_queue('any queue')
+    def test_purge_queue(self, mock_request, mock_client):
+        mock_request.return_value.status_code = 204
+        self.assertEqual(purge_queue('any queue'), ({'result': 'OK'}, 200))
         mock_request.assert_called_with(ANY, method='delete')
+        mock_client.invalidate.assert_called_once()
+
+        mock_request.return_value.status_code = 404
+        self.assertEqual(purge_queue('any queue'), (mock_request.return_value.json.return_value, 404))
+
+
+class TestManagementClient(TestCase):
+
+    def setUp(self):
+        self.client = ManagementClient(cache_ttl=60, timeout=(1, 2))
+        self.client._session = MagicMock()
+        self.response = self.client._session.request.return_value
+        self.response.json.return_value = [{"name": "queue"}]
+        self.response.status_code = 200
+
+    def test_request(self):
+        self.assertEqual(self.client.request("queues", "delete"), self.response)
+        self.client._session.request.assert_called_with("delete", ANY, timeout=(1, 2))
+
+    def test_cache(self):
+        self.assertEqual(self.client.get_json("queues"), ([{"name": "queue"}], 200))
+        self.assertEqual(self.client.get_json("queues"), ([{"name": "queue"}], 200))
+        self.assertEqual(self.client._session.request.call_count, 1)
+
+        self.client.invalidate("queues")
+        self.client.get_json("queues")
+        self.assertEqual(self.client._session.request.call_count, 2)
+
+        # Expired
+        with patch("gobmanagement.message_broker.management.time.monotonic", return_value=10 ** 9):
+            self.client.get_json("queues")
+        self.assertEqual(self.client._session.request.call_count, 3)
+
+    def test_no_cache(self):
+        self.response.status_code = 500
+        self.client.get_json("queues")
+        self.client.get_json("queues")
+        self.assertEqual(self.client._session.request.call_count, 2)
+
+        self.client._session.request.side_effect = Exception("timeout")
+        with self.assertRaises(Exception):
+            self.client.get_json("queues")
+        self.assertEqual(self.client._flights, {})
+
+    def test_single_flight(self):
+        started, release = threading.Event(), threading.Event()
+
+        def request(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return self.response
+        self.client._session.request.side_effect = request
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.client.get_json("queues")))
+        leader.start()
+        self.assertTrue(started.wait(5))
+        followers = [threading.Thread(target=lambda: results.append(self.client.get_json("queues")))
+                     for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(results, [([{"name": "queue"}], 200)] * 4)
+        self.assertEqual(self.client._session.request.call_count, 1)
+
+    def test_single_flight_error(self):
+        self.client._flights["queues"] = flight = MagicMock()
+        flight.error = ValueError("upstream")
+        with self.assertRaises(ValueError):
+            self.client.get_json("queues")
+        flight.done.wait.assert_called_once()
@@ -0,0 +1,189 @@
+import os
+import tempfile
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from gobmanagement.message_broker.queue_history import FIELDS, QueueSampler, RingBuffer, downsample
+
+
+def _queue(name, messages, publish_rate=None):
+    queue = {"name": name, "messages": messages, "messages_ready": messages, "messages_unacknowledged": 0}
+    if publish_rate is not None:
+        queue["message_stats"] = {"publish_details": {"rate": publish_rate}}
+    return queue
+
+
+class TestRingBuffer(TestCase):
+
+    def test_samples(self):
+        buffer = RingBuffer(3)
+        self.assertEqual(buffer.samples(0), [])
+
+        for timestamp in range(1, 6):
+            buffer.add(timestamp, [timestamp * 10] * len(FIELDS))
+        # Oldest samples are overwritten
+        self.assertEqual([sample[0] for sample in buffer.samples(0)], [3, 4, 5])
+        self.assertEqual([sample[0] for sample in buffer.samples(4)], [4, 5])
+        self.assertEqual(buffer.samples(6), [])
+        self.assertEqual(buffer.samples(5)[0], [5.0] + [50.0] * len(FIELDS))
+        self.assertEqual(buffer.last_timestamp, 5)
+
+    def test_grow(self):
+        # The array grows with the samples, up to the size of the buffer
+        buffer = RingBuffer(100)
+        self.assertEqual(len(buffer._data), 0)
+        buffer.add(1, [1] * len(FIELDS))
+        buffer.add(2, [2] * len(FIELDS))
+        self.assertEqual(len(buffer._data), 2 * RingBuffer.STRIDE)
+        self.assertEqual([sample[0] for sample in buffer.samples(0)], [1, 2])
+
+        buffer = RingBuffer(2)
+        for timestamp in range(1, 5):
+            buffer.add(timestamp, [timestamp] * len(FIELDS))
+        self.assertEqual(len(buffer._data), 2 * RingBuffer.STRIDE)
+        self.assertEqual([sample[0] for sample in buffer.samples(0)], [3, 4])
+
+
+class TestDownsample(TestCase):
+
+    def test_downsample(self):
+        samples = [[t, t * 2] for t in range(10)]
+        self.assertEqual(downsample(samples, 0, 10, 10), samples)
+        self.assertEqual(downsample(samples, 0, 10, 2), [[2, 4], [7, 14]])
+        # Empty buckets are left out
+        self.assertEqual(downsample([[0, 1], [1, 1], [9, 3]], 0, 10, 2), [[0.5, 1], [9, 3]])
+        with self.assertRaises(ValueError):
+            downsample(samples, 0, 10, 0)
+
+
+@patch("gobmanagement.message_broker.queue_history.get_queues")
+class TestQueueSampler(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "queue_history")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sample(self, mock_get_queues):
+        sampler = QueueSampler(interval=10, size=10)
+        mock_get_queues.return_value = [_queue("q1", 5, 1.5), _queue("q2", 0)], 200
+        with patch("gobmanagement.message_broker.queue_history.time.time", return_value=1000):
+            sampler.sample()
+
+        mock_get_queues.return_value = [_queue("q1", 7)], 200
+        with patch("gobmanagement.message_broker.queue_history.time.time", return_value=1010):
+            sampler.sample()
+            history = sampler.history(60, 100)
+
+        self.assertEqual(history["interval"], 10)
+        q1, q2 = history["queues"]
+        self.assertEqual(q1["name"], "q1")
+        self.assertEqual(q1["timestamps"], [1000, 1010])
+        self.assertEqual(q1["messages"], [5, 7])
+        self.assertEqual(q1["publish_rate"], [1.5, 0])
+        self.assertEqual(q2["messages"], [0])
+
+        with patch("gobmanagement.message_broker.queue_history.time.time", return_value=1010):
+            self.assertEqual(sampler.history(60, 1, names=["q1"])["queues"],
+                             [{"name": "q1", "timestamps": [1005], "messages": [6], "messages_ready": [6],
+                               "messages_unacknowledged": [0], "publish_rate": [0.75], "deliver_rate": [0],
+                               "ack_rate": [0]}])
+            self.assertEqual(sampler.history(5, 100, names=["q2"])["queues"][0]["timestamps"], [])
+
+    def test_evict(self, mock_get_queues):
+        # History of 10 samples of 10 seconds
+        sampler = QueueSampler(interval=10, size=10)
+        mock_get_queues.return_value = [_queue("q1", 5), _queue("q2", 0)], 200
+        with patch("gobmanagement.message_broker.queue_history.time.time", return_value=1000):
+            sampler.sample()
+
+        mock_get_queues.return_value = [_queue("q1", 5)], 200
+        for timestamp in [1010, 1100]:
+            with patch("gobmanagement.message_broker.queue_history.time.time", return_value=timestamp):
+                sampler.sample()
+        self.assertEqual(set(sampler._buffers), {"q1", "q2"})
+
+        # q2 has been absent for the whole history
+        with patch("gobmanagement.message_broker.queue_history.time.time", return_value=1101):
+            sampler.sample()
+        self.assertEqual(set(sampler._buffers), {"q1"})
+
+    def test_sample_failure(self, mock_get_queues):
+        mock_get_queues.return_value = {"error": "unavailable"}, 503
+        with self.assertRaises(Exception):
+            QueueSampler().sample()
+
+    def test_run(self, mock_get_queues):
+        mock_get_queues.side_effect = Exception("unavailable")
+        sampler = QueueSampler(interval=10, path=self.path)
+        sampler.stop()
+        sampler._stop.is_set = lambda: mock_get_queues.called
+        sampler._run()
+        mock_get_queues.assert_called_once()
+
+    @patch("builtins.print")
+    def test_single_sampler(self, mock_print, mock_get_queues):
+        mock_get_queues.return_value = [_queue("q1", 5)], 200
+        leader, follower = QueueSampler(interval=10, path=self.path), QueueSampler(interval=10, path=self.path)
+        for sampler in [leader, follower]:
+            sampler._stop.wait = lambda timeout, stop=sampler._stop: stop.set()
+            sampler._run()
+
+        # Only the process that holds the lock samples the queues
+        self.assertTrue(leader._is_leader)
+        self.assertFalse(follower._is_leader)
+        mock_get_queues.assert_called_once()
+
+        # The other processes serve the history of the sampling process
+        self.assertEqual(follower.history(60, 100), leader.history(60, 100))
+        self.assertEqual(follower.history(60, 100)["queues"][0]["messages"], [5])
+
+        # The history file is only read again when it has changed
+        with patch("gobmanagement.message_broker.queue_history.json.loads") as mock_loads:
+            follower.history(60, 100)
+            mock_loads.assert_not_called()
+
+        leader._stop.clear()
+        leader._run()
+        self.assertEqual(follower.history(60, 100)["queues"][0]["messages"], [5, 5])
+        leader._leader_lock.release()
+
+    def test_save_and_load(self, mock_get_queues):
+        sampler = QueueSampler(interval=10, size=2, path=self.path)
+        mock_get_queues.return_value = [_queue("q1", 1), _queue("q2", 2)], 200
+        for timestamp in [1000, 1010, 1020]:
+            with patch("gobmanagement.message_broker.queue_history.time.time", return_value=timestamp):
+                sampler.sample()
+        sampler._save()
+
+        loaded = QueueSampler(interval=10, size=2, path=self.path)
+        loaded._load()
+        self.assertEqual(set(loaded._buffers), {"q1", "q2"})
+        for name, buffer in loaded._buffers.items():
+            self.assertEqual(buffer.samples(0), sampler._buffers[name].samples(0))
+            self.assertEqual(buffer.last_timestamp, 1020)
+
+        # A missing or invalid file leaves the history as it is
+        os.remove(self.path)
+        loaded._load()
+        self.assertEqual(set(loaded._buffers), {"q1", "q2"})
+        with open(self.path, "wb") as file:
+            file.write(b"invalid")
+        with patch("builtins.print") as mock_print:
+            loaded._load()
+        mock_print.assert_called_once()
+        self.assertEqual(set(loaded._buffers), {"q1", "q2"})
+
+    def test_start(self, mock_get_queues):
+        sampler = QueueSampler(interval=0, path=self.path)
+        sampler.start()
+        self.assertIsNone(sampler._thread)
+
+        sampler = QueueSampler(interval=10, path=self.path)
+        with patch("gobmanagement.message_broker.queue_history.threading.Thread") as mock_thread:
+            sampler.start()
+            sampler.start()
+        mock_thread.return_value.start.assert_called_once()
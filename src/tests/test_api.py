@@ -1,5 +1,7 @@
 from unittest import TestCase, mock
 
+from werkzeug.datastructures import MultiDict
+
 from gobmanagement import api
 
 
@@ -9,6 +11,29 @@ class TestJob(TestCase):
         result = api._health()
         self.assertEqual(result, "Connectivity OK")
 
+    @mock.patch('gobmanagement.api.Response')
+    @mock.patch('gobmanagement.api.metrics')
+    def test_metrics(self, mock_metrics, mock_response):
+        mock_metrics.generate.return_value = b"metrics", "text/plain"
+        self.assertEqual(api._metrics(), mock_response.return_value)
+        mock_response.assert_called_with(b"metrics", mimetype="text/plain")
+
+    def test_graphql_middleware(self):
+        # Nested field resolvers are not wrapped in a promise
+        self.assertFalse(api.graphql_middleware.wrap_in_promise)
+
+    @mock.patch('gobmanagement.api.jsonify', lambda x: x)
+    @mock.patch('gobmanagement.api.slow_queries')
+    def test_slow_queries(self, mock_slow_queries):
+        self.assertEqual(api._slow_queries(), mock_slow_queries.get.return_value)
+
+    @mock.patch('gobmanagement.api.jsonify', lambda x: x)
+    @mock.patch('gobmanagement.api.engine')
+    @mock.patch('gobmanagement.api.pool_statistics')
+    def test_pool(self, mock_statistics, mock_engine):
+        self.assertEqual(api._pool(), mock_statistics.get.return_value)
+        mock_statistics.get.assert_called_with(mock_engine.pool)
+
     @mock.patch('gobmanagement.api.JobHandler', spec_set=True)
     @mock.patch('gobmanagement.api.jsonify', lambda x: x, spec_set=True)
     def test_start_job(self, mock_servicer):
@@ -100,6 +125,22 @@ class TestQueues(TestCase):
         api._queues()
         mock_get_queues.assert_called()
 
+    @mock.patch('gobmanagement.api.jsonify', lambda x: x, spec_set=True)
+    @mock.patch('gobmanagement.api.queue_sampler')
+    def test_queue_history(self, mock_sampler):
+        mock_request = mock.MagicMock()
+        with mock.patch('gobmanagement.api.request', mock_request):
+            mock_request.args = MultiDict([('seconds', '60'), ('queue', 'q1'), ('queue', 'q2')])
+            self.assertEqual(api._queue_history(), mock_sampler.history.return_value)
+            mock_sampler.history.assert_called_with(60, api.QUEUE_HISTORY_MAX_POINTS, ['q1', 'q2'])
+
+            mock_request.args = MultiDict([('points', '0')])
+            self.assertEqual(api._queue_history()[1], 400)
+            mock_request.args = MultiDict([('seconds', 'x')])
+            self.assertEqual(api._queue_history()[1], 400)
+            mock_request.args = MultiDict([('seconds', '-1')])
+            self.assertEqual(api._queue_history()[1], 400)
+
     @mock.patch('gobmanagement.api.jsonify', lambda x: x, spec_set=True)
     @mock.patch('gobmanagement.api.purge_queue')
     def test_queue(self, purge_queue):
@@ -167,3 +208,37 @@ class TestSecurityMiddlewareLoaded(TestCase):
 
     def test_loaded(self):
         self.assertTrue(isinstance(api.security_middleware, api.SecurityMiddleware))
+
+
+class TestExportLogs(TestCase):
+
+    @mock.patch('gobmanagement.api.stream_with_context', lambda x: x)
+    @mock.patch('gobmanagement.api.Response')
+    @mock.patch('gobmanagement.api.get_log_batches')
+    def test_export_logs(self, mock_get_log_batches, mock_response):
+        mock_request = mock.MagicMock()
+        with mock.patch('gobmanagement.api.request', mock_request):
+            mock_request.args.to_dict.return_value = {'jobid': '123'}
+            result = api._export_logs()
+            self.assertEqual(result, mock_response.return_value)
+            mock_get_log_batches.assert_called_with('jobid', '123')
+            _, kwargs = mock_response.call_args
+            self.assertEqual(kwargs['mimetype'], 'application/x-ndjson')
+
+            mock_request.args.to_dict.return_value = {'process_id': 'any.process-id', 'format': 'csv'}
+            api._export_logs()
+            mock_get_log_batches.assert_called_with('process_id', 'any.process-id')
+            _, kwargs = mock_response.call_args
+            self.assertEqual(kwargs['mimetype'], 'text/csv')
+
+    @mock.patch('gobmanagement.api.jsonify', lambda x: x, spec_set=True)
+    @mock.patch('gobmanagement.api.get_log_batches')
+    def test_export_logs_invalid(self, mock_get_log_batches):
+        mock_request = mock.MagicMock()
+        with mock.patch('gobmanagement.api.request', mock_request):
+            for args in [{}, {'jobid': '1', 'process_id': 'p'}, {'jobid': 'x'}, {'jobid': '1', 'format': 'xml'},
+                         {'process_id': 'p', 'any': 'value'}, {'process_id': 'p; drop'}]:
+                mock_request.args.to_dict.return_value = args
+                _, status_code = api._export_logs()
+                self.assertEqual(status_code, 400)
+        mock_get_log_batches.assert_not_called()
@@ -1,6 +1,10 @@
+import os
+import tempfile
 import unittest
 
-from gobmanagement.cache import ResolveCache
+from unittest.mock import patch, MagicMock
+
+from gobmanagement.cache import ResolveCache, MemoryBackend, FileBackend, _normalize, _sizeof
 
 
 class TestCache(unittest.TestCase):
@@ -10,15 +14,34 @@ class TestCache(unittest.TestCase):
 
     def test_create(self):
         cache = ResolveCache()
-        self.assertEqual(cache._cache, {})
+        self.assertIsInstance(cache._backend, MemoryBackend)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0})
+
+    def test_normalize(self):
+        self.assertEqual(_normalize({"b": 1, "a": [1, {"c": 2}]}), _normalize({"a": [1, {"c": 2}], "b": 1}))
+        self.assertEqual(_normalize("query"), "query")
+        hash(_normalize({"a": [1, 2], "b": {"c": [3]}}))
+
+    def test_sizeof(self):
+        self.assertGreater(_sizeof([{"a": "some text"}]), _sizeof([]))
+
+        class Obj:
+            def __init__(self):
+                self.value = "x" * 1000
+
+        obj = Obj()
+        self.assertGreater(_sizeof(obj), 1000)
+        # Objects are counted only once
+        self.assertLess(_sizeof([obj, obj]), 2 * _sizeof(obj))
 
     def test_resolve(self):
         cache = ResolveCache()
+        key = ("name", "query")
         result = cache.resolve("name", 0, "query", lambda: 123)
         self.assertEqual(result, 123)
-        self.assertEqual(cache._cache["name"]["response"], 123)
+        self.assertEqual(cache._backend._cache[key]["response"], 123)
 
-        cache._cache["name"]["response"] = "cached response"
+        cache._backend._cache[key]["response"] = "cached response"
         result = cache.resolve("name", 0, "query", lambda: 123)
         self.assertEqual(result, "cached response")
 
@@ -27,6 +50,139 @@ class TestCache(unittest.TestCase):
 
         result = cache.resolve("name", 0, "query", lambda: 123)
         self.assertEqual(result, 123)
-        cache._cache["name"]["response"] = "cached response"
-        result = cache.resolve("name", 0, "other query", lambda: 123)
+        cache._backend._cache[key]["response"] = "cached response"
+
+        # Other arguments have their own entry
+        result = cache.resolve("name", 0, "other query", lambda: 456)
+        self.assertEqual(result, 456)
+        result = cache.resolve("name", 0, "query", lambda: 123)
+        self.assertEqual(result, "cached response")
+
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 4)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_resolve_args(self):
+        cache = ResolveCache()
+        cache.resolve("name", 0, {"a": 1, "b": 2}, lambda: 123)
+        result = cache.resolve("name", 0, {"b": 2, "a": 1}, lambda: 456)
         self.assertEqual(result, 123)
+
+    def test_resolve_computed_while_waiting(self):
+        backend = MagicMock()
+        backend.get.side_effect = [None, {"id": 0, "response": 123, "timestamp": 0}]
+        cache = ResolveCache(backend=backend)
+        get_response = MagicMock()
+        self.assertEqual(cache.resolve("name", 0, "query", get_response), 123)
+        get_response.assert_not_called()
+        backend.lock.assert_called_with(("name", "query"))
+        backend.set.assert_not_called()
+
+    @patch("gobmanagement.cache.time.time")
+    def test_ttl(self, mock_time):
+        mock_time.return_value = 100
+        cache = ResolveCache(ttl=10)
+        cache.resolve("name", 0, "query", lambda: 123)
+
+        mock_time.return_value = 110
+        self.assertEqual(cache.resolve("name", 0, "query", lambda: 456), 123)
+
+        mock_time.return_value = 111
+        self.assertEqual(cache.resolve("name", 0, "query", lambda: 456), 456)
+
+
+class TestMemoryBackend(unittest.TestCase):
+
+    def test_evict_entries(self):
+        backend = MemoryBackend(max_entries=2)
+        for key in [1, 2]:
+            backend.set(key, {"response": key})
+        # Use 1, so 2 is the least recently used
+        backend.get(1)
+        backend.set(3, {"response": 3})
+        self.assertEqual(list(backend._cache.keys()), [1, 3])
+        self.assertEqual(backend.stats()["evictions"], 1)
+
+    def test_evict_bytes(self):
+        backend = MemoryBackend(max_bytes=2000)
+        backend.set(1, {"response": "x" * 1000})
+        backend.set(2, {"response": "x" * 1000})
+        self.assertEqual(list(backend._cache.keys()), [2])
+        self.assertEqual(backend.stats()["bytes"], _sizeof("x" * 1000))
+
+        # A single large entry is kept
+        backend.set(3, {"response": "x" * 5000})
+        self.assertEqual(list(backend._cache.keys()), [3])
+
+        # Replace an entry
+        backend.set(3, {"response": "x"})
+        self.assertEqual(backend.stats()["bytes"], _sizeof("x"))
+
+    def test_lock(self):
+        backend = MemoryBackend()
+        with backend.lock("key"):
+            self.assertTrue(backend._key_locks[hash("key") % MemoryBackend.LOCKS].locked())
+
+
+class TestFileBackend(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_get_set(self):
+        backend = FileBackend(self.directory.name)
+        key = ("name", (("a", 1),))
+        self.assertIsNone(backend.get(key))
+
+        backend.set(key, {"id": 1, "response": [{"a": 1}], "timestamp": 0})
+        self.assertEqual(backend.get(key)["response"], [{"a": 1}])
+
+        # Shared with other instances (processes)
+        self.assertEqual(FileBackend(self.directory.name).get(key)["id"], 1)
+        self.assertEqual(backend.stats()["entries"], 1)
+
+    def test_get_invalid(self):
+        backend = FileBackend(self.directory.name)
+        with open(backend._path("key"), "wb") as file:
+            file.write(b"invalid")
+        self.assertIsNone(backend.get("key"))
+
+    def test_evict(self):
+        backend = FileBackend(self.directory.name, max_entries=2)
+        for key in [1, 2, 3]:
+            backend.set(key, {"response": key})
+            os.utime(backend._path(key), (key, key))
+        self.assertIsNone(backend.get(1))
+        self.assertEqual(backend.get(3)["response"], 3)
+        self.assertEqual(backend.stats()["evictions"], 1)
+
+    def test_lock(self):
+        backend = FileBackend(self.directory.name)
+        with backend.lock("key"):
+            self.assertTrue(os.path.exists(backend._lock_path("key")))
+
+        # The number of lock files is bounded
+        for key in range(100):
+            with backend.lock(key):
+                pass
+        locks = [name for name in os.listdir(self.directory.name) if name.endswith(".lock")]
+        self.assertLessEqual(len(locks), FileBackend.LOCKS)
+
+    def test_permissions(self):
+        directory = os.path.join(self.directory.name, "cache")
+        FileBackend(directory)
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+        os.chmod(directory, 0o777)
+        with self.assertRaises(PermissionError):
+            FileBackend(directory)
+
+    def test_resolve(self):
+        cache = ResolveCache(backend=FileBackend(self.directory.name))
+        self.assertEqual(cache.resolve("name", 0, "query", lambda: [1, 2]), [1, 2])
+        other = ResolveCache(backend=FileBackend(self.directory.name))
+        self.assertEqual(other.resolve("name", 0, "query", lambda: None), [1, 2])
+        self.assertEqual(other.stats()["hits"], 1)
@@ -0,0 +1,84 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from gobmanagement.catalog import SourceEntities
+
+
+class TestSourceEntities(TestCase):
+
+    @patch("gobmanagement.catalog.session_scope")
+    def test_update(self, mock_scope):
+        session = mock_scope.return_value.__enter__.return_value
+        session.execute.return_value = [("src", "cat", "b"), ("src", "cat", "a"), (None, None, None)]
+
+        catalog = SourceEntities()
+        catalog.update(10)
+        self.assertEqual(catalog.get(), [(None, None, None), ("src", "cat", "a"), ("src", "cat", "b")])
+        _, params = session.execute.call_args[0]
+        self.assertEqual(params, {"after_logid": 0, "last_logid": 10})
+        version = catalog.version
+        self.assertIsNotNone(version)
+
+        # No new logs, no query
+        session.execute.reset_mock()
+        catalog.update(10)
+        session.execute.assert_not_called()
+
+        # Only the new logs are read, the version only changes on new combinations
+        session.execute.return_value = [("src", "cat", "a")]
+        catalog.update(12)
+        _, params = session.execute.call_args[0]
+        self.assertEqual(params, {"after_logid": 10, "last_logid": 12})
+        self.assertEqual(catalog.version, version)
+
+        session.execute.return_value = [("other", "cat", "a")]
+        catalog.update(14)
+        self.assertEqual(len(catalog.get()), 4)
+        self.assertNotEqual(catalog.version, version)
+
+    @patch("gobmanagement.catalog.threading.Thread")
+    @patch("gobmanagement.catalog.session_scope")
+    def test_rebuild(self, mock_scope, mock_thread):
+        session = mock_scope.return_value.__enter__.return_value
+        session.execute.return_value = [("src", "cat", "a"), ("src", "cat", "b")]
+
+        catalog = SourceEntities(rebuild_interval=60)
+        catalog.update(10)
+
+        # The catalog is rebuilt in the background, the current catalog is still used
+        session.execute.reset_mock()
+        with patch("gobmanagement.catalog.time.time", lambda: catalog._built_at + 61):
+            catalog.update(10)
+            session.execute.assert_not_called()
+            mock_thread.assert_called_with(target=catalog._rebuild, args=(10,), daemon=True)
+            mock_thread.return_value.start.assert_called_once()
+
+            # Only one rebuild at a time
+            mock_thread.return_value.is_alive.return_value = True
+            catalog.update(10)
+            mock_thread.return_value.start.assert_called_once()
+        self.assertEqual(len(catalog.get()), 2)
+
+        # The rebuilt catalog replaces the current catalog
+        version = catalog.version
+        session.execute.return_value = [("src", "cat", "a")]
+        catalog._rebuild(10)
+        _, params = session.execute.call_args[0]
+        self.assertEqual(params["after_logid"], 0)
+        self.assertEqual(catalog.get(), [("src", "cat", "a")])
+        self.assertNotEqual(catalog.version, version)
+
+    @patch("builtins.print")
+    @patch("gobmanagement.catalog.session_scope")
+    def test_rebuild_failed(self, mock_scope, mock_print):
+        session = mock_scope.return_value.__enter__.return_value
+        session.execute.return_value = [("src", "cat", "a")]
+        catalog = SourceEntities(rebuild_interval=60)
+        catalog.update(10)
+        catalog._built_at = 0
+
+        mock_scope.side_effect = Exception("any error")
+        catalog._rebuild(10)
+        mock_print.assert_called_once()
+        self.assertGreater(catalog._built_at, 0)
+        self.assertEqual(catalog.get(), [("src", "cat", "a")])
@@ -3,7 +3,7 @@ from sqlalchemy.sql.elements import TextClause
 from unittest import TestCase, mock
 from unittest.mock import MagicMock
 
-from gobmanagement.database import remove_job, unfinished_jobs, get_process_state
+from gobmanagement.database import remove_job, unfinished_jobs, get_process_state, get_log_batches
 
 class TestDatabase(TestCase):
 
@@ -41,3 +41,26 @@ class TestDatabase(TestCase):
         args, _ = mock_session.execute.call_args_list[0]
         self.assertEqual(len(args), 1)
         self.assertTrue(isinstance(args[0], TextClause))
+
+    @mock.patch('gobmanagement.database.engine')
+    def test_get_log_batches(self, mock_engine):
+        connection = mock_engine.connect.return_value.__enter__.return_value
+        result = connection.execution_options.return_value.execute.return_value
+        result.fetchmany.side_effect = [[{'logid': 1}, {'logid': 2}], [{'logid': 3}], []]
+
+        batches = list(get_log_batches('jobid', 123, batch_size=2))
+        self.assertEqual(batches, [[{'logid': 1}, {'logid': 2}], [{'logid': 3}]])
+        connection.execution_options.assert_called_with(stream_results=True)
+        result.fetchmany.assert_called_with(2)
+        result.close.assert_called()
+
+        with self.assertRaises(AssertionError):
+            list(get_log_batches('msg', 'any value'))
+
+    def test_get_new_logs(self):
+        from gobmanagement.database import get_new_logs
+        session = MagicMock()
+        session.execute.return_value = [(1, 'msg')]
+        self.assertEqual(get_new_logs(session, 0, 10, 5), [(1, 'msg')])
+        _, params = session.execute.call_args[0]
+        self.assertEqual(params, {"after_logid": 0, "last_logid": 10, "limit": 5})
@@ -0,0 +1,66 @@
+import datetime
+
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from gobmanagement.database.jobs import changed_jobids, jobs_query, _start_range, _CHANGED_JOBIDS
+
+
+class TestJobsQuery(TestCase):
+
+    def test_no_filters(self):
+        statement, params = jobs_query(10)
+        self.assertEqual(params, {"days_ago": 10})
+        self.assertIn("WHERE log.timestamp >= now() - :days_ago * '1 day'::interval\n", statement)
+        self.assertIn("WHERE True\n", statement)
+
+    def test_filters(self):
+        statement, params = jobs_query(5, search="Some Text", jobid=123, catalogue="cat", entity="ent",
+                                       source="src", application=None)
+        self.assertEqual(params, {
+            "days_ago": 5,
+            "search": "%some text%",
+            "jobid": 123,
+            "catalogue": "cat",
+            "entity": "ent",
+            "source": "src",
+        })
+        self.assertIn("lower(log.msg) LIKE :search", statement)
+        self.assertIn("log.jobid = :jobid", statement)
+        # Source, catalogue and entity filter the first log of a job, not the aggregated logs
+        self.assertIn("WHERE job.id = :jobid AND firstlog.source = :source AND firstlog.catalogue = :catalogue "
+                      "AND firstlog.entity = :entity\n", statement)
+        self.assertNotIn("log.source = :source", statement.replace("firstlog.", ""))
+
+        # Values never end up in the statement text
+        self.assertNotIn("123", statement)
+        self.assertNotIn("cat'", statement)
+
+    def test_jobids(self):
+        statement, params = jobs_query(10, jobids={1, 2})
+        self.assertEqual(sorted(params["jobids"]), [1, 2])
+        self.assertIn("log.jobid = ANY(:jobids)", statement)
+
+    def test_start_filters(self):
+        statement, params = jobs_query(10, startyear="2020", startmonth="12")
+        self.assertEqual(params["start_from"], datetime.datetime(2020, 12, 1))
+        self.assertEqual(params["start_to"], datetime.datetime(2021, 1, 1))
+        self.assertIn("log.timestamp >= :start_from", statement)
+        self.assertIn("WHERE job.start >= :start_from AND job.start < :start_to\n", statement)
+
+        statement, params = jobs_query(10, startmonth="3")
+        self.assertEqual(params["startmonth"], 3)
+        self.assertIn("WHERE date_part('month', job.start) = :startmonth\n", statement)
+
+    def test_start_range(self):
+        self.assertEqual(_start_range("2020", None), (datetime.datetime(2020, 1, 1), datetime.datetime(2021, 1, 1)))
+        self.assertEqual(_start_range("2020", "2"), (datetime.datetime(2020, 2, 1), datetime.datetime(2020, 3, 1)))
+
+
+class TestChangedJobids(TestCase):
+
+    def test_changed_jobids(self):
+        session = MagicMock()
+        session.execute.return_value = [MagicMock(jobid=1), MagicMock(jobid=2)]
+        self.assertEqual(changed_jobids(session, 10, 20), {1, 2})
+        session.execute.assert_called_with(_CHANGED_JOBIDS, {"after_logid": 10, "last_logid": 20})
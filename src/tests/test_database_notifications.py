@@ -0,0 +1,63 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from gobmanagement.database.notifications import ChangeListener, CHANNEL, CREATE_TRIGGERS, TRIGGERS, create_triggers
+
+
+@patch("gobmanagement.database.notifications.engine")
+class TestChangeListener(TestCase):
+
+    def test_connect(self, mock_engine):
+        listener = ChangeListener()
+        raw = mock_engine.raw_connection.return_value
+        cursor = raw.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = []
+        listener.connect()
+        raw.detach.assert_called_once()
+        connection = raw.connection
+        self.assertTrue(connection.autocommit)
+        cursor.execute.assert_called_with(f"LISTEN {CHANNEL}")
+
+        # The listener does not create any triggers
+        statements = [call[0][0] for call in cursor.execute.call_args_list]
+        self.assertFalse(any("CREATE" in statement for statement in statements))
+        self.assertEqual(cursor.execute.call_args_list[0][0][1], {"names": TRIGGERS})
+
+        listener.close()
+        connection.close.assert_called_once()
+        listener.close()
+
+    def test_connect_missing_triggers(self, mock_engine):
+        listener = ChangeListener()
+        connection = mock_engine.raw_connection.return_value.connection
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [("logs_gob_management_notify",)]
+        with self.assertRaisesRegex(RuntimeError, "logs_gob_management_notify"):
+            listener.connect()
+        self.assertNotIn(f"LISTEN {CHANNEL}", [call[0][0] for call in cursor.execute.call_args_list])
+
+        listener.close()
+        connection.close.assert_called_once()
+
+    @patch("builtins.print", MagicMock())
+    def test_create_triggers(self, mock_engine):
+        create_triggers()
+        connection = mock_engine.begin.return_value.__enter__.return_value
+        connection.exec_driver_sql.assert_called_with(CREATE_TRIGGERS)
+
+    @patch("gobmanagement.database.notifications.select.select")
+    def test_wait(self, mock_select, mock_engine):
+        listener = ChangeListener()
+        mock_engine.raw_connection.return_value.connection.cursor.return_value.__enter__.return_value \
+            .fetchall.return_value = []
+        listener.connect()
+        connection = mock_engine.raw_connection.return_value.connection
+
+        mock_select.return_value = ([], [], [])
+        self.assertEqual(listener.wait(5), [])
+        connection.poll.assert_not_called()
+
+        mock_select.return_value = ([connection], [], [])
+        connection.notifies = [MagicMock(payload="logs"), MagicMock(payload="services")]
+        self.assertEqual(listener.wait(5), ["logs", "services"])
+        self.assertEqual(connection.notifies, [])
@@ -0,0 +1,37 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import exc
+
+from gobmanagement.database.pool import InstrumentedQueuePool, PoolStatistics
+
+
+@patch("gobmanagement.database.pool.pool_statistics", new_callable=PoolStatistics)
+class TestInstrumentedQueuePool(TestCase):
+
+    def test_statistics(self, statistics):
+        pool = InstrumentedQueuePool(MagicMock, pool_size=1, max_overflow=1, timeout=0.01)
+
+        first = pool.connect()
+        second = pool.connect()
+        self.assertEqual(statistics.get(pool)['overflow'], 1)
+        with self.assertRaises(exc.TimeoutError):
+            pool.connect()
+
+        result = statistics.get(pool)
+        self.assertEqual(result['checkouts'], 2)
+        self.assertEqual(result['overflows'], 1)
+        self.assertEqual(result['timeouts'], 1)
+        self.assertEqual(result['checked_out'], 2)
+        self.assertGreaterEqual(result['wait_max_ms'], 10)
+
+        first.close()
+        second.close()
+        pool.connect().close()
+        result = statistics.get(pool)
+        self.assertEqual(result['checkouts'], 3)
+        self.assertEqual(result['overflows'], 1)
+        self.assertEqual(result['checked_out'], 0)
+
+        statistics.reset()
+        self.assertEqual(statistics.get()['checkouts'], 0)
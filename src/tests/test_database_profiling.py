@@ -0,0 +1,106 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import graphene
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from gobmanagement.database import profiling
+from gobmanagement.database.profiling import QueryOriginMiddleware, SlowQueries, get_query_origin, query_origin
+
+
+class TestQueryOrigin(TestCase):
+
+    def test_query_origin(self):
+        self.assertEqual(get_query_origin(), "other")
+        with query_origin("Query.jobs"):
+            self.assertEqual(get_query_origin(), "Query.jobs")
+        self.assertEqual(get_query_origin(), "other")
+
+        app = Flask(__name__)
+        app.add_url_rule("/test/", "test", lambda: "OK")
+        with app.test_request_context("/test/"):
+            app.preprocess_request()
+            self.assertEqual(get_query_origin(), "/test/")
+
+    def test_middleware(self):
+        origins = []
+
+        class Query(graphene.ObjectType):
+            value = graphene.Int()
+
+            def resolve_value(self, info):
+                origins.append(get_query_origin())
+                return 1
+
+        graphene.Schema(query=Query).execute("{ value }", middleware=[QueryOriginMiddleware()])
+        self.assertEqual(origins, ["Query.value"])
+
+
+class TestSlowQueries(TestCase):
+
+    def test_buffer(self):
+        queries = SlowQueries(size=2)
+        for i in range(3):
+            queries.add({"id": i})
+        self.assertEqual(queries.get(), [{"id": 2}, {"id": 1}])
+
+
+@patch("gobmanagement.database.profiling.slow_queries", new_callable=SlowQueries)
+class TestProfiling(TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        profiling.init_profiling(self.engine)
+
+    def test_fast_query(self, mock_slow_queries):
+        with patch("gobmanagement.database.profiling.DB_QUERY_ROWS") as mock_rows:
+            self.engine.execute(text("SELECT 1"))
+        mock_rows.labels.assert_called_with(origin="other")
+        self.assertEqual(mock_slow_queries.get(), [])
+
+    @patch("gobmanagement.database.profiling.SLOW_QUERY_THRESHOLD", 0)
+    def test_slow_query(self, mock_slow_queries):
+        with query_origin("Query.jobs"):
+            self.engine.execute(text("SELECT :value"), {"value": 1})
+        query = mock_slow_queries.get()[0]
+        self.assertEqual(query["origin"], "Query.jobs")
+        self.assertEqual(query["statement"], "SELECT ?")
+        self.assertEqual(query["parameters"], "(1,)")
+        self.assertIsNone(query["explain"])
+
+    @patch("gobmanagement.database.profiling.explainer", new_callable=profiling.Explainer)
+    @patch("gobmanagement.database.profiling.SLOW_QUERY_EXPLAIN_RATE", 1)
+    @patch("gobmanagement.database.profiling.SLOW_QUERY_THRESHOLD", 0)
+    def test_explain(self, mock_explainer, mock_slow_queries):
+        # The plan is captured in the background, SQLite does not support a read-only transaction
+        self.engine.execute(text("SELECT 1"))
+        mock_explainer._queue.join()
+        self.assertTrue(mock_slow_queries.get()[0]["explain"][0].startswith("Explain failed"))
+
+        # Only plain SELECT statements are explained
+        for statement in ["CREATE TABLE t (a INTEGER)", "WITH x AS (SELECT 1) SELECT * FROM x"]:
+            self.engine.execute(text(statement))
+            mock_explainer._queue.join()
+            self.assertIsNone(mock_slow_queries.get()[0]["explain"])
+
+    def test_explainer_queue(self, mock_slow_queries):
+        explainer = profiling.Explainer(queue_size=1)
+        with patch("gobmanagement.database.profiling.threading.Thread"):
+            self.assertTrue(explainer.submit(MagicMock(), "SELECT 1", {}, {}))
+            # Slow queries are not explained while the queue is full
+            self.assertFalse(explainer.submit(MagicMock(), "SELECT 1", {}, {}))
+        self.assertFalse(explainer.submit(MagicMock(), "DELETE FROM logs", {}, {}))
+
+    def test_explain_plan(self, mock_slow_queries):
+        engine = MagicMock()
+        cursor = engine.raw_connection.return_value.cursor.return_value
+        cursor.fetchall.return_value = [("Seq Scan on logs",), ("Planning Time: 0.1 ms",)]
+        plan = profiling._explain(engine, "SELECT * FROM logs WHERE logid > %(logid)s", {"logid": 1})
+        self.assertEqual(plan, ["Seq Scan on logs", "Planning Time: 0.1 ms"])
+        self.assertEqual(cursor.execute.call_args_list[0][0], ("SET TRANSACTION READ ONLY",))
+        self.assertEqual(cursor.execute.call_args_list[1][0], ("SET LOCAL statement_timeout = %s", (5000,)))
+        cursor.execute.assert_called_with("EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM logs WHERE logid > %(logid)s",
+                                          {"logid": 1})
+        engine.raw_connection.return_value.close.assert_called_once()
@@ -0,0 +1,103 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from gobmanagement.database.search import LogSearchIndex, create_index, to_tsquery, matching_jobids
+
+
+class TestSearch(TestCase):
+
+    def test_to_tsquery(self):
+        self.assertEqual(to_tsquery("Meetbout"), "meetbout:*")
+        self.assertEqual(to_tsquery("meetbout import"), "meetbout:* & import:*")
+        self.assertEqual(to_tsquery('"Import started" meetbout'), "import <-> started & meetbout:*")
+        self.assertEqual(to_tsquery("some_name"), "some <-> name:*")
+        self.assertEqual(to_tsquery("a & !b | c:*"), "a:* & b:* & c:*")
+        self.assertIsNone(to_tsquery(' & "" '))
+
+    def test_matching_jobids(self):
+        session = MagicMock()
+        session.execute.return_value = [MagicMock(jobid=1), MagicMock(jobid=2)]
+        self.assertEqual(matching_jobids(session, "meetbout", 10), {1, 2})
+        _, params = session.execute.call_args[0]
+        self.assertEqual(params, {"query": "meetbout:*", "days_ago": 10})
+
+        session.execute.reset_mock()
+        self.assertEqual(matching_jobids(session, "&", 10), set())
+        session.execute.assert_not_called()
+
+
+class TestLogSearchIndex(TestCase):
+
+    @patch("builtins.print")
+    @patch("gobmanagement.database.search.time.time")
+    @patch("gobmanagement.database.search.engine")
+    def test_is_valid(self, mock_engine, mock_time, mock_print):
+        connection = mock_engine.connect.return_value.__enter__.return_value
+        mock_time.return_value = 100
+        index = LogSearchIndex(check_interval=10)
+
+        # Index does not exist, it is reported and not created
+        connection.execute.return_value.scalar.return_value = None
+        self.assertFalse(index.is_valid())
+        mock_print.assert_called_once()
+        self.assertIn("does not exist", mock_print.call_args[0][0])
+        connection.execute.assert_called_once()
+
+        # State is not checked again within the check interval
+        connection.execute.reset_mock()
+        mock_time.return_value = 105
+        self.assertFalse(index.is_valid())
+        connection.execute.assert_not_called()
+
+        # An invalid index is reported once
+        mock_print.reset_mock()
+        connection.execute.return_value.scalar.return_value = "invalid"
+        for mock_time.return_value in [111, 122]:
+            self.assertFalse(index.is_valid())
+        mock_print.assert_called_once()
+        self.assertIn("INVALID", mock_print.call_args[0][0])
+
+        # Index is valid, no more checks
+        mock_time.return_value = 133
+        connection.execute.return_value.scalar.return_value = "valid"
+        self.assertTrue(index.is_valid())
+        connection.execute.reset_mock()
+        mock_time.return_value = 200
+        self.assertTrue(index.is_valid())
+        connection.execute.assert_not_called()
+
+
+class TestCreateIndex(TestCase):
+
+    def _connection(self, mock_engine, states):
+        connection = mock_engine.connect.return_value.execution_options.return_value.__enter__.return_value
+        connection.execute.return_value.scalar.side_effect = states
+        return connection
+
+    def _statements(self, connection):
+        return [str(call[0][0]).strip().split("\n")[0] for call in connection.execute.call_args_list]
+
+    @patch("builtins.print", MagicMock())
+    @patch("gobmanagement.database.search.engine")
+    def test_create_index(self, mock_engine):
+        connection = self._connection(mock_engine, [None, "valid"])
+        create_index()
+        mock_engine.connect.return_value.execution_options.assert_called_with(isolation_level="AUTOCOMMIT")
+        self.assertIn("CREATE INDEX CONCURRENTLY IF NOT EXISTS logs_msg_search_idx", self._statements(connection))
+
+    @patch("builtins.print", MagicMock())
+    @patch("gobmanagement.database.search.engine")
+    def test_create_invalid_index(self, mock_engine):
+        connection = self._connection(mock_engine, ["invalid", "valid"])
+        create_index()
+        statements = self._statements(connection)
+        self.assertIn("DROP INDEX CONCURRENTLY IF EXISTS logs_msg_search_idx", statements)
+        self.assertLess(statements.index("DROP INDEX CONCURRENTLY IF EXISTS logs_msg_search_idx"),
+                        statements.index("CREATE INDEX CONCURRENTLY IF NOT EXISTS logs_msg_search_idx"))
+
+    @patch("builtins.print", MagicMock())
+    @patch("gobmanagement.database.search.engine")
+    def test_create_index_building(self, mock_engine):
+        connection = self._connection(mock_engine, ["building"])
+        create_index()
+        self.assertEqual(connection.execute.call_count, 1)
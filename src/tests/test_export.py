@@ -0,0 +1,28 @@
+import datetime
+import json
+
+from unittest import TestCase
+
+from gobmanagement.export import ndjson_chunks, csv_chunks
+
+
+class TestExport(TestCase):
+
+    def setUp(self):
+        self.batches = [
+            [{"logid": 1, "timestamp": datetime.datetime(2020, 1, 1), "msg": "first", "data": {"a": 1}}],
+            [{"logid": 2, "timestamp": datetime.datetime(2020, 1, 2), "msg": "second, with comma", "data": None}],
+        ]
+
+    def test_ndjson(self):
+        chunks = list(ndjson_chunks(iter(self.batches)))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(json.loads(chunks[0]), {
+            "logid": 1, "timestamp": "2020-01-01T00:00:00", "msg": "first", "data": {"a": 1}})
+
+    def test_csv(self):
+        chunks = list(csv_chunks(iter(self.batches)))
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(chunks[0].startswith("logid,timestamp,"))
+        self.assertIn('"{""a"": 1}"', chunks[1])
+        self.assertIn('"second, with comma"', chunks[2])
@@ -1,7 +1,7 @@
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
-from gobmanagement.fields import LogFilterConnectionField
+from gobmanagement.fields import LogFilterConnectionField, encode_cursor, decode_cursor
 
 
 class TestLogFilterConnectionField(TestCase):
@@ -17,3 +17,105 @@ class TestLogFilterConnectionField(TestCase):
         res = LogFilterConnectionField.get_query(model, MagicMock())
         mock_get_query.return_value.filter.assert_called_with('not like DATA%')
         self.assertEqual(mock_get_query().filter(), res)
+
+
+class TestLogFilterConnectionFieldKeyset(TestCase):
+
+    def setUp(self):
+        import graphene
+        from sqlalchemy import create_engine, Column, Integer, String
+        from sqlalchemy.orm import declarative_base, sessionmaker
+
+        Base = declarative_base()
+
+        class MockLog(Base):
+            __tablename__ = "logs"
+            logid = Column(Integer, primary_key=True)
+            level = Column(String)
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all([MockLog(logid=i, level="DATAINFO" if i == 3 else "INFO") for i in range(1, 8)])
+        self.session.commit()
+        self.model = MockLog
+
+        class Node(graphene.ObjectType):
+            logid = graphene.Int()
+
+        class MockConnection(graphene.relay.Connection):
+            class Meta:
+                node = Node
+
+        self.connection_type = MockConnection
+
+    def get_query(self, model, info, sort=None, **kwargs):
+        order = model.logid.desc() if "logid_desc" in (sort or []) else model.logid.asc()
+        return self.session.query(model).order_by(order)
+
+    def resolve(self, **args):
+        with patch("gobmanagement.fields.SQLAlchemyConnectionField.get_query", self.get_query):
+            return LogFilterConnectionField.resolve_connection(self.connection_type, self.model, MagicMock(), args, None)
+
+    def logids(self, connection):
+        return [edge.node.logid for edge in connection.edges]
+
+    def test_cursor(self):
+        self.assertEqual(decode_cursor(encode_cursor(123)), 123)
+        for cursor in ["invalid", encode_cursor("x"), "YXJyYXljb25uZWN0aW9uOjE="]:
+            with self.assertRaisesRegex(ValueError, "Invalid cursor"):
+                decode_cursor(cursor)
+
+    def test_forward(self):
+        result = self.resolve(first=2)
+        self.assertEqual(self.logids(result), [1, 2])
+        self.assertTrue(result.page_info.has_next_page)
+        self.assertFalse(result.page_info.has_previous_page)
+
+        result = self.resolve(first=2, after=result.page_info.end_cursor)
+        self.assertEqual(self.logids(result), [4, 5])
+        self.assertTrue(result.page_info.has_previous_page)
+
+        result = self.resolve(first=5, after=result.page_info.end_cursor)
+        self.assertEqual(self.logids(result), [6, 7])
+        self.assertFalse(result.page_info.has_next_page)
+
+        self.assertEqual(self.logids(self.resolve()), [1, 2, 4, 5, 6, 7])
+        self.assertEqual(result.count_query.count(), 6)
+
+    @patch("gobmanagement.fields.GRAPHQL_DEFAULT_LIST_SIZE", 3)
+    def test_default_page_size(self):
+        result = self.resolve()
+        self.assertEqual(self.logids(result), [1, 2, 4])
+        self.assertTrue(result.page_info.has_next_page)
+
+    def test_backward(self):
+        result = self.resolve(last=2)
+        self.assertEqual(self.logids(result), [6, 7])
+        self.assertTrue(result.page_info.has_previous_page)
+
+        result = self.resolve(last=3, before=result.page_info.start_cursor)
+        self.assertEqual(self.logids(result), [2, 4, 5])
+
+        result = self.resolve(last=3, before=result.page_info.start_cursor)
+        self.assertEqual(self.logids(result), [1])
+        self.assertFalse(result.page_info.has_previous_page)
+
+    def test_descending(self):
+        result = self.resolve(first=2, sort=["logid_desc"])
+        self.assertEqual(self.logids(result), [7, 6])
+
+        result = self.resolve(first=2, sort="logid_desc", after=result.page_info.end_cursor)
+        self.assertEqual(self.logids(result), [5, 4])
+
+        result = self.resolve(last=2, sort=["logid_desc"], before=encode_cursor(2))
+        self.assertEqual(self.logids(result), [5, 4])
+
+    @patch("gobmanagement.fields.GRAPHQL_DEFAULT_LIST_SIZE", 3)
+    @patch("gobmanagement.fields.SQLAlchemyConnectionField.resolve_connection")
+    def test_other_sort(self, mock_resolve_connection):
+        args = {"sort": ["level_asc"]}
+        result = LogFilterConnectionField.resolve_connection(self.connection_type, self.model, None, args, None)
+        self.assertEqual(result, mock_resolve_connection.return_value)
+        # Also other sort orders are limited to the default page size
+        self.assertEqual(mock_resolve_connection.call_args[0][3], {"sort": ["level_asc"], "first": 3})
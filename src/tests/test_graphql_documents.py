@@ -0,0 +1,184 @@
+import json
+import tempfile
+
+from unittest import TestCase
+from unittest.mock import patch
+
+import graphene
+
+from flask import Flask
+from graphql import validate
+from graphql.execution import ExecutionResult
+from graphql_server import HttpQueryError
+
+from gobmanagement.graphql_documents import DocumentCacheBackend, PersistedQueries, PersistedQueryView, \
+    _LRUDict, query_hash
+from gobmanagement.query_cost import QueryCost
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String(name=graphene.String(default_value="world"))
+
+    def resolve_hello(self, info, name):
+        return f"Hello {name}"
+
+
+schema = graphene.Schema(query=Query)
+
+QUERY = "{ hello }"
+
+
+class TestLRUDict(TestCase):
+
+    def test_lru(self):
+        items = _LRUDict(2)
+        items.set("a", 1)
+        items.set("b", 2)
+        self.assertEqual(items.get("a"), 1)
+        items.set("c", 3)
+        self.assertEqual(len(items), 2)
+        self.assertIsNone(items.get("b"))
+        self.assertEqual(items.get("a"), 1)
+        self.assertEqual(items.get("c"), 3)
+
+
+class TestDocumentCacheBackend(TestCase):
+
+    def test_document_from_string(self):
+        backend = DocumentCacheBackend(max_size=10)
+        with patch("gobmanagement.graphql_documents.validate", wraps=validate) as mock_validate:
+            document = backend.document_from_string(schema, QUERY)
+            self.assertIs(backend.document_from_string(schema, QUERY), document)
+            mock_validate.assert_called_once()
+
+        result = document.execute()
+        self.assertEqual(result.data, {"hello": "Hello world"})
+
+    def test_invalid_document(self):
+        backend = DocumentCacheBackend(max_size=10)
+        document = backend.document_from_string(schema, "{ unknown }")
+        result = document.execute()
+        self.assertTrue(result.invalid)
+        self.assertEqual(len(result.errors), 1)
+        self.assertIs(backend.document_from_string(schema, "{ unknown }"), document)
+
+    def test_syntax_error(self):
+        backend = DocumentCacheBackend(max_size=10)
+        with self.assertRaises(Exception):
+            backend.document_from_string(schema, "{ hello")
+        self.assertEqual(len(backend._documents), 0)
+
+    def test_query_cost(self):
+        backend = DocumentCacheBackend(max_size=10, query_cost=QueryCost(max_cost=10, max_depth=1))
+        result = backend.document_from_string(schema, QUERY).execute()
+        self.assertEqual(result.to_dict(), {
+            "data": {"hello": "Hello world"},
+            "extensions": {"cost": {"cost": 0, "depth": 1, "max_cost": 10}}
+        })
+
+        with patch("gobmanagement.graphql_documents.execute", return_value=ExecutionResult(data={})) as mock_execute:
+            result = backend.document_from_string(schema, "{ a: hello b: __typename }").execute()
+            self.assertFalse(result.invalid)
+            result = DocumentCacheBackend(query_cost=QueryCost(max_depth=0)).document_from_string(
+                schema, QUERY).execute()
+            self.assertTrue(result.invalid)
+            self.assertIn("maximum depth", str(result.errors[0]))
+            mock_execute.assert_called_once()
+
+
+class TestPersistedQueries(TestCase):
+
+    def test_adhoc(self):
+        queries = PersistedQueries(path=None, only=False)
+        self.assertEqual(queries.resolve({"query": QUERY}), {"query": QUERY})
+
+    def test_register(self):
+        queries = PersistedQueries(path=None, only=False)
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(QUERY)}}
+
+        with self.assertRaisesRegex(HttpQueryError, "PersistedQueryNotFound"):
+            queries.resolve({"extensions": extensions})
+
+        self.assertEqual(queries.resolve({"query": QUERY, "extensions": extensions})["query"], QUERY)
+        # Extensions in a GET request are JSON encoded
+        self.assertEqual(queries.resolve({"extensions": json.dumps(extensions)})["query"], QUERY)
+
+        with self.assertRaisesRegex(HttpQueryError, "does not match"):
+            queries.resolve({"query": "{ other }", "extensions": extensions})
+
+        with self.assertRaisesRegex(HttpQueryError, "invalid JSON"):
+            queries.resolve({"extensions": "{"})
+
+    def test_only(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+            json.dump({"hello": QUERY}, file)
+            file.flush()
+            queries = PersistedQueries(path=file.name, only=True)
+
+        sha256_hash = query_hash(QUERY)
+        self.assertEqual(queries.get(sha256_hash), QUERY)
+        self.assertEqual(queries.resolve({"query": QUERY})["query"], QUERY)
+        self.assertEqual(queries.resolve({"extensions": {"persistedQuery": {"sha256Hash": sha256_hash}}})["query"],
+                         QUERY)
+
+        other = "{ hello(name: \"other\") }"
+        with self.assertRaisesRegex(HttpQueryError, "Only persisted"):
+            queries.resolve({"query": other})
+        with self.assertRaisesRegex(HttpQueryError, "Only persisted"):
+            queries.resolve({"query": other, "extensions": {"persistedQuery": {"sha256Hash": query_hash(other)}}})
+
+
+class TestPersistedQueryView(TestCase):
+
+    def setUp(self):
+        self.client = self._client(PersistedQueries(path=None, only=False))
+
+    def _client(self, persisted_queries):
+        app = Flask(__name__)
+        app.add_url_rule('/graphql', view_func=PersistedQueryView.as_view(
+            'graphql',
+            schema=schema,
+            backend=DocumentCacheBackend(),
+            persisted_queries=persisted_queries
+        ))
+        return app.test_client()
+
+    def test_post(self):
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(QUERY)}}
+        response = self.client.post('/graphql', json={"extensions": extensions})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["errors"][0]["message"], "PersistedQueryNotFound")
+
+        response = self.client.post('/graphql', json={"query": QUERY, "extensions": extensions})
+        self.assertEqual(response.get_json(), {"data": {"hello": "Hello world"}})
+
+        response = self.client.post('/graphql', json={"extensions": extensions})
+        self.assertEqual(response.get_json(), {"data": {"hello": "Hello world"}})
+
+    def test_get(self):
+        extensions = json.dumps({"persistedQuery": {"version": 1, "sha256Hash": query_hash(QUERY)}})
+        self.client.post('/graphql', json={"query": QUERY})
+        response = self.client.get('/graphql', query_string={"query": QUERY, "extensions": extensions})
+        self.assertEqual(response.get_json(), {"data": {"hello": "Hello world"}})
+
+        response = self.client.get('/graphql', query_string={"extensions": extensions})
+        self.assertEqual(response.get_json(), {"data": {"hello": "Hello world"}})
+
+    def test_only_query_string(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+            json.dump([QUERY], file)
+            file.flush()
+            client = self._client(PersistedQueries(path=file.name, only=True))
+
+        other = "{ __typename }"
+        response = client.post('/graphql', json={"variables": {}}, query_string={"query": other})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["errors"][0]["message"], "Only persisted queries are allowed.")
+
+        response = client.post('/graphql', json={"variables": {}}, query_string={"query": QUERY})
+        self.assertEqual(response.get_json(), {"data": {"hello": "Hello world"}})
+
+    def test_invalid_body(self):
+        for body in [["query"], "query", 1]:
+            response = self.client.post('/graphql', json=body)
+            self.assertEqual(response.status_code, 400)
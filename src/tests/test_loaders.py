@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from gobmanagement.loaders import get_loaders, Loaders, _group
+
+
+class TestLoaders(TestCase):
+
+    def test_get_loaders(self):
+        context = SimpleNamespace()
+        loaders = get_loaders(context)
+        self.assertIsInstance(loaders, Loaders)
+        self.assertEqual(get_loaders(context), loaders)
+        self.assertNotEqual(get_loaders(SimpleNamespace()), loaders)
+
+    def test_group(self):
+        rows = [{"jobid": 1, "id": 10}, {"jobid": 2, "id": 11}, {"jobid": 1, "id": 12}]
+        self.assertEqual(_group(rows, "jobid", [2, 3, 1]), [
+            [{"jobid": 2, "id": 11}],
+            [],
+            [{"jobid": 1, "id": 10}, {"jobid": 1, "id": 12}]
+        ])
+
+    @patch("gobmanagement.loaders.engine")
+    def test_jobs(self, mock_engine):
+        mock_engine.execute.return_value = [{"jobid": 1}, {"jobid": 2}]
+        loaders = Loaders()
+        result = loaders.jobs.batch_load_fn([2, 3, 1]).get()
+        self.assertEqual(result, [{"jobid": 2}, None, {"jobid": 1}])
+        mock_engine.execute.assert_called_once()
+        _, params = mock_engine.execute.call_args[0]
+        self.assertEqual(params, {"ids": [2, 3, 1]})
+
+    @patch("gobmanagement.loaders.engine")
+    def test_steps(self, mock_engine):
+        mock_engine.execute.return_value = [{"jobid": 1, "stepid": 1}, {"jobid": 1, "stepid": 2}]
+        loaders = Loaders()
+        result = loaders.steps.batch_load_fn([1, 2]).get()
+        self.assertEqual(result, [[{"jobid": 1, "stepid": 1}, {"jobid": 1, "stepid": 2}], []])
+        mock_engine.execute.assert_called_once()
+
+    @patch("gobmanagement.loaders.engine")
+    def test_process_jobs(self, mock_engine):
+        mock_engine.execute.return_value = [{"process_id": "p1", "jobid": 1}]
+        loaders = Loaders()
+        result = loaders.process_jobs.batch_load_fn(["p1", "p2"]).get()
+        self.assertEqual(result, [[{"process_id": "p1", "jobid": 1}], []])
+        mock_engine.execute.assert_called_once()
@@ -5,8 +5,12 @@ from gobmanagement.config import API_PORT
 
 class TestMain(TestCase):
 
+    @patch('gobmanagement.schemas.warm_up')
+    @patch('gobmanagement.api.queue_sampler')
     @patch('gobmanagement.api.app')
     @patch('gobmanagement.api.socketio.run')
-    def test_socketio_run(self, mock_socketio_run, mock_app):
+    def test_socketio_run(self, mock_socketio_run, mock_app, mock_sampler, mock_warm_up):
         from gobmanagement import __main__
         mock_socketio_run.assert_called_with(app=mock_app, port=API_PORT)
+        mock_sampler.start.assert_called_once()
+        mock_warm_up.assert_called_once()
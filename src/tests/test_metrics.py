@@ -0,0 +1,110 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+import graphene
+
+from flask import Flask
+from prometheus_client import REGISTRY
+from graphql.execution.middleware import MiddlewareManager
+from promise import Promise
+from sqlalchemy import create_engine, text
+
+from gobmanagement import metrics
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class Item(graphene.ObjectType):
+    name = graphene.String()
+
+    def resolve_name(self, info):
+        return "item"
+
+
+class Query(graphene.ObjectType):
+    value = graphene.Int()
+    later = graphene.Int()
+    items = graphene.List(Item)
+
+    def resolve_items(self, info):
+        return [Item(), Item()]
+
+    def resolve_value(self, info):
+        return 1
+
+    def resolve_later(self, info):
+        return Promise.resolve(2)
+
+
+class TestMetrics(TestCase):
+
+    def test_operation_label(self):
+        self.assertEqual(metrics.operation_label(None), "anonymous")
+        self.assertEqual(metrics.operation_label("Jobs"), "Jobs")
+        self.assertEqual(metrics.operation_label("x" * 65), "other")
+
+    def test_resolver_middleware(self):
+        schema = graphene.Schema(query=Query)
+        name = "gob_management_graphql_resolver_duration_seconds_count"
+        before = _sample(name, resolver="Query.value"), _sample(name, resolver="Query.later")
+
+        result = schema.execute("{ value later }", middleware=[metrics.ResolverMetricsMiddleware()])
+        self.assertEqual(result.data, {"value": 1, "later": 2})
+        self.assertEqual(_sample(name, resolver="Query.value"), before[0] + 1)
+        self.assertEqual(_sample(name, resolver="Query.later"), before[1] + 1)
+
+    def test_resolver_middleware_not_wrapped(self):
+        schema = graphene.Schema(query=Query)
+        results = []
+
+        class Spy:
+            def resolve(self, next, root, info, **args):
+                result = next(root, info, **args)
+                results.append((info.field_name, result))
+                return result
+
+        middleware = MiddlewareManager(metrics.ResolverMetricsMiddleware(), Spy(), wrap_in_promise=False)
+        result = schema.execute("{ items { name } }", middleware=middleware)
+        self.assertEqual(result.data, {"items": [{"name": "item"}, {"name": "item"}]})
+        self.assertEqual([(name, value) for name, value in results if name == "name"], [("name", "item")] * 2)
+        self.assertFalse(any(isinstance(value, Promise) for _, value in results))
+
+    def test_requests(self):
+        app = Flask(__name__)
+        engine = create_engine("sqlite://")
+        metrics.init_app(app, engine)
+
+        @app.route("/test/")
+        def route():
+            engine.execute(text("SELECT 1"))
+            engine.execute(text("SELECT 2"))
+            return "OK"
+
+        name = "gob_management_request_duration_seconds_count"
+        before = _sample(name, route="/test/", method="GET", status="200")
+        queries = _sample("gob_management_request_db_queries_sum", route="/test/")
+
+        with app.test_client() as client:
+            client.get("/test/")
+            client.get("/unknown")
+        self.assertEqual(_sample(name, route="/test/", method="GET", status="200"), before + 1)
+        self.assertEqual(_sample("gob_management_request_db_queries_sum", route="/test/"), queries + 2)
+        self.assertGreaterEqual(_sample(name, route="unmatched", method="GET", status="404"), 1)
+
+        # Queries outside a request are not counted
+        engine.execute(text("SELECT 1"))
+        self.assertEqual(_sample("gob_management_request_db_queries_sum", route="/test/"), queries + 2)
+
+    def test_generate(self):
+        data, content_type = metrics.generate()
+        self.assertIn(b"gob_management_socket_clients", data)
+        self.assertTrue(content_type.startswith("text/plain"))
+
+    @patch("gobmanagement.metrics.multiprocess.MultiProcessCollector")
+    @patch("gobmanagement.metrics.PROMETHEUS_MULTIPROC_DIR", "/tmp/metrics")
+    def test_generate_multiprocess(self, mock_collector):
+        data, _ = metrics.generate()
+        mock_collector.assert_called_once()
+        self.assertNotIn(b"gob_management_socket_clients", data)
@@ -0,0 +1,108 @@
+from unittest import TestCase
+
+import graphene
+
+from graphql import parse
+
+from gobmanagement.query_cost import QueryCost, QueryCostError
+
+
+class Item(graphene.ObjectType):
+    name = graphene.String()
+    children = graphene.List(lambda: Item)
+
+    class Meta:
+        interfaces = (graphene.relay.Node,)
+
+
+class ItemConnection(graphene.relay.Connection):
+    class Meta:
+        node = Item
+
+
+class Query(graphene.ObjectType):
+    items = graphene.relay.ConnectionField(ItemConnection)
+    item_list = graphene.List(Item)
+    item = graphene.Field(Item)
+
+
+schema = graphene.Schema(query=Query)
+
+
+def check(query, variables=None, operation_name=None, **limits):
+    query_cost = QueryCost(**{"max_cost": 1000, "max_depth": 5, "max_page_size": 50, "default_list_size": 10,
+                              **limits})
+    return query_cost.check(schema, parse(query), operation_name, variables)
+
+
+class TestQueryCost(TestCase):
+
+    def test_scalars_and_objects(self):
+        self.assertEqual(check("{ item { name } }"), {"cost": 1, "depth": 2, "max_cost": 1000})
+        self.assertEqual(check("{ item { name children { name } } }")["cost"], 1 + 10)
+        self.assertEqual(check("{ itemList { name } }")["cost"], 10)
+
+    def test_connection(self):
+        query = "{ items(first: 20) { pageInfo { hasNextPage } edges { node { name } } } }"
+        # items + pageInfo + 20 * (edge + node)
+        self.assertEqual(check(query)["cost"], 1 + 1 + 20 * 2)
+        self.assertEqual(check(query)["depth"], 4)
+
+        # Without first or last the default list size is used
+        self.assertEqual(check("{ items { edges { node { name } } } }")["cost"], 1 + 10 * 2)
+
+    def test_variables(self):
+        query = "query q($n: Int = 5) { items(first: $n) { edges { node { name } } } }"
+        self.assertEqual(check(query)["cost"], 1 + 5 * 2)
+        self.assertEqual(check(query, {"n": 30})["cost"], 1 + 30 * 2)
+
+    def test_aliases_and_fragments(self):
+        query = """
+        query {
+            a: item { ...f }
+            b: item { ... on Item { name } }
+        }
+        fragment f on Item { children { name } }
+        """
+        self.assertEqual(check(query)["cost"], (1 + 10) + 1)
+
+    def test_introspection(self):
+        self.assertEqual(check("{ __schema { types { name fields { name } } } }")["cost"], 0)
+
+    def test_operation_name(self):
+        query = "query a { item { name } } query b { itemList { name } }"
+        self.assertEqual(check(query, operation_name="b")["cost"], 10)
+        self.assertEqual(check(query)["cost"], 0)
+
+    def test_limits(self):
+        with self.assertRaisesRegex(QueryCostError, "maximum page size of 50"):
+            check("{ items(first: 51) { edges { node { name } } } }")
+
+        with self.assertRaisesRegex(QueryCostError, "maximum page size of 50"):
+            check("query q($n: Int) { items(last: $n) { edges { node { name } } } }", {"n": 100})
+
+        with self.assertRaisesRegex(QueryCostError, "first of items should not be negative"):
+            check("{ items(first: -1) { edges { node { name } } } }")
+
+        with self.assertRaisesRegex(QueryCostError, "last of items should not be negative"):
+            check("query q($n: Int) { items(last: $n) { edges { node { name } } } }", {"n": -5})
+
+        with self.assertRaisesRegex(QueryCostError, "maximum cost of 100"):
+            check("{ a: itemList { children { name } } }", max_cost=100)
+
+        with self.assertRaisesRegex(QueryCostError, "maximum depth of 2"):
+            check("{ item { children { name } } }", max_depth=2)
+
+        self.assertEqual(check("{ item { children { name } } }", max_depth=3)["depth"], 3)
+
+    def test_expanding_fragments(self):
+        # Every fragment doubles the number of fields, the analysis stops at the maximum depth
+        fragment = "fragment f{} on Item {{ a: children {{ ...f{} }} b: children {{ ...f{} }} }}"
+        fragments = "\n".join(fragment.format(i, i + 1, i + 1) for i in range(30))
+        query = "{ item { ...f0 } }\nfragment f30 on Item { name }\n" + fragments
+        with self.assertRaisesRegex(QueryCostError, "maximum depth of 5"):
+            check(query, max_cost=10 ** 100)
+
+        # or as soon as the cost exceeds the maximum cost
+        with self.assertRaisesRegex(QueryCostError, "maximum cost of 1000"):
+            check(query, max_depth=100)
@@ -16,3 +16,209 @@ class TestSchema(TestCase):
     def test_source_entity(self):
         se = SourceEntity(None, None, None)
         self.assertIsNotNone(se)
+
+
+class TestPagedJobs(TestCase):
+
+    def setUp(self):
+        import datetime
+        start = datetime.datetime(2020, 1, 1)
+        # Most recent jobs first
+        self.jobs = [{"jobid": i, "starttime": start + datetime.timedelta(hours=i)} for i in range(5, 0, -1)]
+
+    def test_cursor(self):
+        from gobmanagement.schemas import _encode_job_cursor, _decode_job_cursor
+        job = self.jobs[0]
+        self.assertEqual(_decode_job_cursor(_encode_job_cursor(job)), (job["starttime"], job["jobid"]))
+        with self.assertRaises(ValueError):
+            _decode_job_cursor("invalid")
+
+    @mock.patch("gobmanagement.schemas.Query._job_rows")
+    def test_cursor_timezone(self, mock_job_rows):
+        import datetime
+        from gobmanagement.schemas import Query, _encode_job_cursor
+        # A cursor of a job with a time zone aware start time can be compared with the other jobs
+        job = dict(self.jobs[1], starttime=self.jobs[1]["starttime"].replace(tzinfo=datetime.timezone.utc))
+        mock_job_rows.return_value = self.jobs
+        result = Query.resolve_paged_jobs(None, None, first=2, after=_encode_job_cursor(job))
+        self.assertEqual([edge.node.jobid for edge in result.edges], [3, 2])
+
+    @mock.patch("gobmanagement.schemas.Query._job_rows")
+    def test_resolve_paged_jobs(self, mock_job_rows):
+        from gobmanagement.schemas import Query, _encode_job_cursor
+        mock_job_rows.return_value = self.jobs
+
+        result = Query.resolve_paged_jobs(None, None, first=2, days_ago=5)
+        mock_job_rows.assert_called_with(days_ago=5)
+        self.assertEqual(result.total_count, 5)
+        self.assertEqual([edge.node.jobid for edge in result.edges], [5, 4])
+        self.assertTrue(result.page_info.has_next_page)
+        self.assertFalse(result.page_info.has_previous_page)
+
+        result = Query.resolve_paged_jobs(None, None, first=2, after=result.page_info.end_cursor)
+        self.assertEqual([edge.node.jobid for edge in result.edges], [3, 2])
+        self.assertTrue(result.page_info.has_previous_page)
+
+        result = Query.resolve_paged_jobs(None, None, first=10, after=result.page_info.end_cursor)
+        self.assertEqual([edge.node.jobid for edge in result.edges], [1])
+        self.assertFalse(result.page_info.has_next_page)
+
+        # Backwards
+        result = Query.resolve_paged_jobs(None, None, last=2, before=_encode_job_cursor(self.jobs[3]))
+        self.assertEqual([edge.node.jobid for edge in result.edges], [4, 3])
+
+        # Default page size
+        with mock.patch("gobmanagement.schemas.JOBS_PAGE_SIZE", 3):
+            result = Query.resolve_paged_jobs(None, None)
+            self.assertEqual(len(result.edges), 3)
+
+        # Maximum page size
+        with mock.patch("gobmanagement.schemas.JOBS_MAX_PAGE_SIZE", 1):
+            result = Query.resolve_paged_jobs(None, None, first=3)
+            self.assertEqual(len(result.edges), 1)
+
+        # Empty page
+        result = Query.resolve_paged_jobs(None, None, first=0)
+        self.assertEqual(result.edges, [])
+        self.assertTrue(result.page_info.has_next_page)
+        self.assertEqual(len(Query.resolve_paged_jobs(None, None, last=0).edges), 0)
+
+        # Empty result
+        mock_job_rows.return_value = []
+        result = Query.resolve_paged_jobs(None, None)
+        self.assertEqual(result.edges, [])
+        self.assertIsNone(result.page_info.end_cursor)
+
+
+class TestBatchedResolvers(TestCase):
+
+    def setUp(self):
+        from promise import Promise
+        self.loaders = MagicMock()
+        self.loaders.jobs.load.side_effect = lambda jobid: Promise.resolve({"jobid": jobid} if jobid == 1 else None)
+        self.loaders.steps.load.side_effect = lambda jobid: Promise.resolve([{"stepid": 10, "jobid": jobid}])
+        self.loaders.process_jobs.load.side_effect = lambda process_id: Promise.resolve([{"jobid": 1}])
+
+    def test_resolve_jobinfo(self):
+        from gobmanagement.schemas import Query
+        with mock.patch("gobmanagement.schemas.get_loaders", return_value=self.loaders):
+            result = Query.resolve_jobinfo(None, MagicMock(), 1).get()
+            self.assertEqual(result[0].jobid, 1)
+            self.assertEqual(result[0].steps[0].stepid, 10)
+
+            self.assertIsNone(Query.resolve_jobinfo(None, MagicMock(), 2).get())
+
+    def test_resolve_processjobs(self):
+        from gobmanagement.schemas import Query
+        with mock.patch("gobmanagement.schemas.get_loaders", return_value=self.loaders):
+            result = Query.resolve_processjobs(None, MagicMock(), "p1").get()
+            self.assertEqual(result[0].jobid, 1)
+            self.loaders.process_jobs.load.assert_called_with("p1")
+
+    def test_resolve_steps(self):
+        from gobmanagement.schemas import Job
+        with mock.patch("gobmanagement.schemas.get_loaders", return_value=self.loaders):
+            result = Job(jobid=1).resolve_steps(MagicMock()).get()
+            self.assertEqual(result[0].stepid, 10)
+
+
+class TestJobsChangedSince(TestCase):
+
+    @mock.patch("gobmanagement.schemas.data_versions")
+    @mock.patch("gobmanagement.schemas.Query._job_rows")
+    def test_resolve_jobs_changed_since(self, mock_job_rows, mock_versions):
+        from gobmanagement.schemas import Query
+        mock_versions.get.return_value = 20
+        mock_job_rows.return_value = [{"jobid": 1}]
+
+        result = Query.resolve_jobs_changed_since(None, None, last_logid=10, catalogue="cat")
+        mock_job_rows.assert_called_with(changed_since=10, last_logid=20, catalogue="cat")
+        self.assertEqual([job.jobid for job in result.jobs], [1])
+        self.assertEqual(result.last_logid, 20)
+
+        # Nothing changed, no query
+        mock_job_rows.reset_mock()
+        result = Query.resolve_jobs_changed_since(None, None, last_logid=20)
+        mock_job_rows.assert_not_called()
+        self.assertEqual(result.jobs, [])
+        self.assertEqual(result.last_logid, 20)
+
+        # Data versions are behind the client, the high-water mark is not moved backwards
+        result = Query.resolve_jobs_changed_since(None, None, last_logid=25)
+        mock_job_rows.assert_not_called()
+        self.assertEqual(result.last_logid, 25)
+
+        mock_versions.get.return_value = None
+        self.assertEqual(Query.resolve_jobs_changed_since(None, None, last_logid=25).last_logid, 25)
+
+    @mock.patch("gobmanagement.schemas.JOBS_CHANGED_MAX_LOGS", 100)
+    @mock.patch("gobmanagement.schemas.data_versions")
+    @mock.patch("gobmanagement.schemas.Query._job_rows")
+    def test_refetch(self, mock_job_rows, mock_versions):
+        from gobmanagement.schemas import Query
+        mock_versions.get.return_value = 200
+
+        # Too many new logs, the logs are not read
+        result = Query.resolve_jobs_changed_since(None, None, last_logid=0)
+        mock_job_rows.assert_not_called()
+        self.assertTrue(result.refetch)
+        self.assertIsNone(result.jobs)
+        self.assertEqual(result.last_logid, 200)
+
+        mock_job_rows.return_value = []
+        self.assertFalse(Query.resolve_jobs_changed_since(None, None, last_logid=100).refetch)
+
+    @mock.patch("gobmanagement.schemas.data_versions")
+    @mock.patch("gobmanagement.schemas.Query._jobids", return_value={1})
+    @mock.patch("gobmanagement.schemas.Query._query_jobs", return_value=[])
+    def test_changed_cache(self, mock_query_jobs, mock_jobids, mock_versions):
+        from gobmanagement.schemas import Query
+        with mock.patch.object(Query, "_resolve_cache") as mock_cache, \
+                mock.patch.object(Query, "_changed_cache") as mock_changed_cache:
+            Query._job_rows(days_ago=100, changed_since=10, last_logid=20)
+            mock_cache.resolve.assert_not_called()
+            mock_changed_cache.resolve.assert_called_once()
+
+            Query._job_rows(days_ago=100, last_logid=20)
+            mock_cache.resolve.assert_called_once()
+
+    @mock.patch("gobmanagement.schemas.session_scope")
+    @mock.patch("gobmanagement.schemas.changed_jobids", return_value={1, 2})
+    @mock.patch("gobmanagement.schemas.matching_jobids", return_value={2, 3})
+    def test_jobids(self, mock_matching, mock_changed, mock_scope):
+        from gobmanagement.schemas import Query
+        self.assertIsNone(Query._jobids(10, None, False, None, 20))
+        mock_scope.assert_not_called()
+
+        self.assertEqual(Query._jobids(10, "text", True, None, 20), {2, 3})
+        self.assertEqual(Query._jobids(10, None, False, 15, 20), {1, 2})
+        session = mock_scope.return_value.__enter__.return_value
+        mock_changed.assert_called_with(session, 15, 20)
+        self.assertEqual(Query._jobids(10, "text", True, 15, 20), {2})
+
+
+class TestJobRows(TestCase):
+
+    @mock.patch("gobmanagement.schemas.Query._resolve_cache")
+    @mock.patch("gobmanagement.schemas.Query._query_jobs")
+    @mock.patch("gobmanagement.schemas.Query._job_summary")
+    @mock.patch("gobmanagement.schemas.session_scope", MagicMock())
+    def test_summary(self, mock_summary, mock_query_jobs, mock_cache):
+        import datetime
+        from gobmanagement.schemas import Query
+        mock_cache.resolve.side_effect = lambda name, version, args, get_response: get_response()
+        mock_summary.days = 30
+        start = datetime.datetime(2020, 1, 1)
+        mock_summary.jobs.return_value = [{"jobid": 1, "starttime": start}], set()
+
+        self.assertEqual(Query._job_rows(days_ago=10, last_logid=20, catalogue="cat"),
+                         [{"jobid": 1, "starttime": start}])
+        mock_summary.jobs.assert_called_with(10, jobids=None, catalogue="cat")
+        mock_query_jobs.assert_not_called()
+
+        # Jobs that also have logs before the window are aggregated over the window
+        mock_summary.jobs.return_value = [{"jobid": 1, "starttime": start}], {2}
+        mock_query_jobs.return_value = [{"jobid": 2, "starttime": start + datetime.timedelta(hours=1)}]
+        self.assertEqual([job["jobid"] for job in Query._job_rows(days_ago=10, last_logid=20, catalogue="cat")],
+                         [2, 1])
+        mock_query_jobs.assert_called_with(10, None, {2}, catalogue="cat")
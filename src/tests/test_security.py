@@ -62,6 +62,9 @@ class TestSecurityMiddleware(TestCase):
             ('/status/health/', 'GET', _PUBLIC),
             ('/status/health', 'GET', _PUBLIC),
             ('/status/health', 'POST', None),
+            ('/status/pool/', 'GET', _PUBLIC),
+            ('/status/metrics', 'GET', _PUBLIC),
+            ('/status/slow_queries/', 'GET', [GOB_ADMIN]),
             ('/gob_management/job', 'POST', [GOB_ADMIN]),
             ('/gob_management/job', 'DELETE', None),
             ('/gob_management/job/1', 'DELETE', [GOB_ADMIN]),
@@ -75,6 +78,8 @@ class TestSecurityMiddleware(TestCase):
             ('/gob_management/public/state/process/1', 'GET', _PUBLIC),
             ('/gob_management/public/state/process/1', 'POST', None),
             ('/gob_management/public/state/workflow', 'GET', _PUBLIC),
+            ('/gob_management/public/queues/history/', 'GET', _PUBLIC),
+            ('/gob_management/public/queues/history/', 'POST', None),
             ('/gob_management/public/state/workflow/', 'GET', _PUBLIC),
             ('/gob_management/public/state/workflow/', 'POST', None),
         ]
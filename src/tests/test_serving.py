@@ -0,0 +1,31 @@
+import sys
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from gobmanagement import serving
+
+
+class TestServing(TestCase):
+
+    @patch("gobmanagement.serving.SERVING_MODE", "threads")
+    @patch("gevent.monkey.is_module_patched")
+    def test_threads(self, mock_is_patched):
+        serving.patch()
+        mock_is_patched.assert_not_called()
+
+    @patch("gobmanagement.serving.SERVING_MODE", "gevent")
+    @patch("gevent.monkey.patch_all")
+    def test_gevent(self, mock_patch_all):
+        psycogreen = MagicMock()
+        with patch.dict(sys.modules, {"psycogreen": psycogreen, "psycogreen.gevent": psycogreen.gevent}):
+            # Monkey patching is too late once the package has been imported
+            with patch("gevent.monkey.is_module_patched", lambda module: False):
+                with self.assertRaisesRegex(RuntimeError, "UWSGI_GEVENT_EARLY_MONKEY_PATCH"):
+                    serving.patch()
+            psycogreen.gevent.patch_psycopg.assert_not_called()
+
+            with patch("gevent.monkey.is_module_patched", lambda module: True):
+                serving.patch()
+        mock_patch_all.assert_not_called()
+        psycogreen.gevent.patch_psycopg.assert_called_once()
@@ -0,0 +1,284 @@
+import datetime
+import os
+import tempfile
+import threading
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from gobmanagement.socket import LeaderLock, LogBroadcaster, StopSignal, room_name, NEW_LOGS_COLUMNS
+
+
+@patch("gobmanagement.socket.join_room", MagicMock())
+@patch("gobmanagement.socket.leave_room", MagicMock())
+@patch("gobmanagement.socket.data_versions", MagicMock())
+@patch("gobmanagement.socket.session_scope", MagicMock())
+@patch("gobmanagement.socket.get_last_service_timestamp")
+@patch("gobmanagement.socket.get_last_logid")
+class TestLogBroadcaster(TestCase):
+
+    def setUp(self):
+        self.socketio = MagicMock()
+        self.broadcaster = LogBroadcaster(self.socketio)
+        self.timestamp = datetime.datetime(2020, 1, 1)
+
+    def test_check(self, mock_last_logid, mock_last_timestamp):
+        mock_last_logid.return_value = 10
+        mock_last_timestamp.return_value = self.timestamp
+        self.broadcaster.on_subscribe("sid", {})
+
+        self.broadcaster._check()
+        self.socketio.emit.assert_any_call('new_logs', {'last_logid': 10, 'after_logid': None, 'refetch': True})
+        self.socketio.emit.assert_any_call('update_services', {'last_timestamp': self.timestamp.isoformat()})
+
+        # No changes, no events
+        self.socketio.emit.reset_mock()
+        self.broadcaster._check()
+        self.socketio.emit.assert_not_called()
+
+    @patch("gobmanagement.socket.NEW_LOGS_MAX", 2)
+    @patch("gobmanagement.socket.get_new_logs")
+    def test_new_logs(self, mock_new_logs, mock_last_logid, mock_last_timestamp):
+        mock_new_logs.return_value = [(11, self.timestamp, "p1"), (12, self.timestamp, "p1")]
+        data = self.broadcaster._new_logs(10, 12)
+        timestamp = self.timestamp.isoformat()
+        self.assertEqual(data['logs'], [[11, timestamp, "p1"], [12, timestamp, "p1"]])
+        self.assertEqual(data['columns'][0], 'logid')
+        self.assertEqual(data['last_logid'], 12)
+        self.assertEqual(mock_new_logs.call_args[0][1:], (10, 12, 3))
+
+        # Too many new logs
+        mock_new_logs.return_value = [(11,), (12,), (13,)]
+        self.assertEqual(self.broadcaster._new_logs(10, 13), {'last_logid': 13, 'after_logid': 10, 'refetch': True})
+
+        # Logs have been removed
+        self.assertTrue(self.broadcaster._new_logs(10, 5)['refetch'])
+
+    def test_poll(self, mock_last_logid, mock_last_timestamp):
+        mock_last_timestamp.return_value = self.timestamp
+        stop = MagicMock()
+        stop.is_set.side_effect = lambda: stop.wait.called
+
+        with patch("gobmanagement.socket.LOG_BROADCAST_MODE", "poll"):
+            self.broadcaster._broadcasts(stop)
+        mock_last_logid.assert_called_once()
+        stop.wait.assert_called_once_with(LogBroadcaster.CHECK_LOGS_INTERVAL)
+        stop.close.assert_called_once()
+
+    @patch("gobmanagement.socket.ChangeListener")
+    def test_listen(self, mock_listener, mock_last_logid, mock_last_timestamp):
+        mock_last_logid.return_value = 10
+        mock_last_timestamp.return_value = self.timestamp
+        listener = mock_listener.return_value
+        stop = StopSignal()
+
+        def wait(timeout, interrupt=None):
+            if timeout == 0:
+                return []
+            if listener.wait.call_count > 3:
+                stop.set()
+                return []
+            return ["logs"]
+        listener.wait.side_effect = wait
+
+        with patch("gobmanagement.socket.LOG_BROADCAST_MODE", "listen"), \
+                patch("gobmanagement.socket.LOG_BROADCAST_DEBOUNCE", 0):
+            self.broadcaster._broadcasts(stop)
+
+        listener.connect.assert_called_once()
+        listener.close.assert_called_once()
+        # Initial check and one check per notification
+        self.assertEqual(mock_last_logid.call_count, 3)
+        listener.ping.assert_not_called()
+
+    @patch("gobmanagement.socket.ChangeListener")
+    def test_listen_stopped(self, mock_listener, mock_last_logid, mock_last_timestamp):
+        mock_last_logid.return_value = 10
+        mock_last_timestamp.return_value = self.timestamp
+        stop = StopSignal()
+
+        def wait(timeout, interrupt=None):
+            # The broadcaster is stopped while a notification arrives
+            stop.set()
+            return ["logs"]
+        mock_listener.return_value.wait.side_effect = wait
+
+        with patch("gobmanagement.socket.LOG_BROADCAST_MODE", "listen"):
+            self.broadcaster._broadcasts(stop)
+
+        # Only the initial check, no check after the debounce
+        self.assertEqual(mock_last_logid.call_count, 1)
+
+    @patch("gobmanagement.socket.ChangeListener")
+    def test_listen_fallback(self, mock_listener, mock_last_logid, mock_last_timestamp):
+        mock_listener.return_value.connect.side_effect = Exception("no listen")
+        stop = StopSignal()
+
+        with patch("gobmanagement.socket.LOG_BROADCAST_MODE", "listen"), \
+                patch.object(self.broadcaster, "_poll", side_effect=lambda stop, until: stop.set()) as mock_poll:
+            self.broadcaster._broadcasts(stop)
+        mock_poll.assert_called_once()
+        mock_listener.return_value.close.assert_called_once()
+
+
+class TestLifecycle(TestCase):
+
+    @patch("gobmanagement.socket.join_room", MagicMock())
+    def test_start_stop(self):
+        broadcaster = LogBroadcaster(MagicMock())
+        running = threading.Event()
+
+        def broadcast(stop):
+            running.set()
+            stop.wait(60)
+
+        with patch.object(broadcaster, "_broadcast", side_effect=broadcast):
+            broadcaster.on_connect("sid1")
+            broadcaster.on_connect("sid2")
+            thread = broadcaster._broadcaster
+            self.assertTrue(running.wait(5))
+
+            broadcaster.on_disconnect("sid1")
+            self.assertTrue(thread.is_alive())
+
+            # Last client stops the broadcaster without delay
+            broadcaster.on_disconnect("sid2")
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(broadcaster._clients, 0)
+
+            # A new client starts a new broadcaster
+            broadcaster.on_connect("sid3")
+            self.assertIsNot(broadcaster._broadcaster, thread)
+            broadcaster.on_disconnect("sid3")
+            broadcaster._broadcaster.join(5)
+
+    @patch("gobmanagement.socket.threading.Thread")
+    def test_restart_after_stopped(self, mock_thread):
+        broadcaster = LogBroadcaster(MagicMock())
+        stopping = MagicMock()
+        broadcaster._broadcaster = stopping
+        broadcaster._stop = StopSignal()
+        broadcaster._stop.set()
+
+        # The stopping thread is joined before a new thread is started
+        stopping.join.side_effect = lambda timeout: mock_thread.return_value.start.assert_not_called()
+        broadcaster._start_broadcasts()
+        stopping.join.assert_called_once_with(LogBroadcaster.CHECK_LOGS_INTERVAL)
+        mock_thread.return_value.start.assert_called_once()
+        self.assertIs(broadcaster._broadcaster, mock_thread.return_value)
+
+    def test_stop_signal(self):
+        stop = StopSignal()
+        self.assertFalse(stop.wait(0))
+        stop.set()
+        self.assertTrue(stop.is_set())
+        self.assertEqual(os.read(stop.fileno(), 1), b"\0")
+        stop.close()
+        stop.set()
+        stop.close()
+
+    def test_leader_lock(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "leader.lock")
+            leader, follower = LeaderLock(path), LeaderLock(path)
+            self.assertTrue(leader.acquire())
+            self.assertFalse(follower.acquire())
+            leader.release()
+            self.assertTrue(follower.acquire())
+            follower.release()
+
+    def test_follower(self):
+        broadcaster = LogBroadcaster(MagicMock(), shared=True)
+        stop = MagicMock()
+        stop.is_set.side_effect = [False, True]
+        with patch.object(broadcaster, "_leader_lock") as mock_lock, \
+                patch.object(broadcaster, "_broadcast") as mock_broadcast:
+            mock_lock.acquire.return_value = False
+            broadcaster._broadcasts(stop)
+            mock_broadcast.assert_not_called()
+            stop.wait.assert_called_once_with(LogBroadcaster.CHECK_LOGS_INTERVAL)
+
+            stop.is_set.side_effect = [False, True]
+            mock_lock.acquire.return_value = True
+            broadcaster._broadcasts(stop)
+            mock_broadcast.assert_called_once_with(stop)
+            mock_lock.release.assert_called_once()
+
+
+class TestRooms(TestCase):
+
+    def test_room_name(self):
+        self.assertEqual(room_name({}), "all")
+        self.assertEqual(room_name(None), "all")
+        self.assertEqual(room_name({"jobid": 1}), "jobid:1")
+        for data in [{"msg": "x"}, {"jobid": 1, "process_id": "p"}, "jobid"]:
+            with self.assertRaises(ValueError):
+                room_name(data)
+
+    @patch("gobmanagement.socket.leave_room")
+    @patch("gobmanagement.socket.join_room")
+    def test_subscribe(self, mock_join, mock_leave):
+        broadcaster = LogBroadcaster(MagicMock())
+        with patch.object(broadcaster, "_start_broadcasts"):
+            broadcaster.on_connect("sid1")
+        mock_join.assert_called_with("all", sid="sid1")
+
+        self.assertEqual(broadcaster.on_subscribe("sid1", {"jobid": 1}), {"room": "jobid:1"})
+        self.assertEqual(broadcaster.on_subscribe("sid2", {"jobid": 1}), {"room": "jobid:1"})
+        self.assertIn("error", broadcaster.on_subscribe("sid1", {"msg": "x"}))
+        self.assertEqual(broadcaster._rooms, {"all": {"sid1"}, "jobid:1": {"sid1", "sid2"}})
+
+        self.assertEqual(broadcaster.on_unsubscribe("sid1", {}), {"room": "all"})
+        mock_leave.assert_called_with("all", sid="sid1")
+        self.assertIn("error", broadcaster.on_unsubscribe("sid1", {"msg": "x"}))
+
+        broadcaster.on_disconnect("sid1")
+        self.assertEqual(broadcaster._rooms, {"jobid:1": {"sid2"}})
+
+    @patch("gobmanagement.socket.get_process_state")
+    def test_emit_new_logs(self, mock_get_process_state):
+        mock_get_process_state.return_value = [{"id": 1, "status": "started"}]
+        socketio = MagicMock()
+        broadcaster = LogBroadcaster(socketio)
+        broadcaster._rooms = {"jobid:1": {"sid1"}, "process_id:p2": {"sid2"}, "catalogue:other": {"sid3"}}
+
+        def log(logid, jobid, process_id):
+            log = [None] * len(NEW_LOGS_COLUMNS)
+            log[0], log[NEW_LOGS_COLUMNS.index("jobid")] = logid, jobid
+            log[NEW_LOGS_COLUMNS.index("process_id")] = process_id
+            return log
+
+        logs = [log(11, 1, "p1"), log(12, 2, "p2"), log(13, 1, "p1")]
+        broadcaster._emit_new_logs({"last_logid": 13, "logs": logs})
+
+        events = {(call[0][0], call[1]["to"]): call[0][1] for call in socketio.emit.call_args_list}
+        self.assertEqual(set(events), {("new_logs", "jobid:1"), ("new_logs", "process_id:p2"),
+                                       ("process_state", "process_id:p2")})
+        self.assertEqual([log[0] for log in events[("new_logs", "jobid:1")]["logs"]], [11, 13])
+        self.assertEqual(events[("process_state", "process_id:p2")]["state"], [{"id": 1, "status": "started"}])
+
+        # Refetch is sent to all clients
+        socketio.emit.reset_mock()
+        broadcaster._emit_new_logs({"last_logid": 13, "refetch": True})
+        socketio.emit.assert_any_call('new_logs', {"last_logid": 13, "refetch": True})
+        self.assertEqual(socketio.emit.call_count, 2)
+
+        # Shared events are emitted to all rooms in the logs
+        socketio.emit.reset_mock()
+        mock_get_process_state.reset_mock()
+        broadcaster = LogBroadcaster(socketio, shared=True)
+        broadcaster._rooms = {"process_id:p2": {"sid2"}, "process_id:p3": {"sid3"}}
+        broadcaster._emit_new_logs({"last_logid": 13, "logs": logs})
+        events = {(call[0][0], call[1]["to"]) for call in socketio.emit.call_args_list}
+        self.assertEqual({room for _, room in events}, {"all", "jobid:1", "jobid:2", "process_id:p1", "process_id:p2"})
+
+        # The process state is only read for the process rooms in the logs that have local subscribers
+        self.assertEqual({room for event, room in events if event == "process_state"}, {"process_id:p2"})
+        mock_get_process_state.assert_called_once_with("p2")
+
+        # On refetch the state is emitted to every local process room, as in the unshared mode
+        socketio.emit.reset_mock()
+        broadcaster._emit_new_logs({"last_logid": 13, "refetch": True})
+        self.assertEqual([call[1].get("to") for call in socketio.emit.call_args_list],
+                         [None, "process_id:p2", "process_id:p3"])
@@ -0,0 +1,240 @@
+import datetime
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from gobmanagement.summary import JobSummary, _age_category, _matches, _FIRST_LOGS, _JOBS, _LOG_COUNTS, _NOW
+
+
+class Row(dict):
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+def mock_session(counts, first_logs, jobs, now=None):
+    session = MagicMock()
+
+    def execute(statement, params=None):
+        result = MagicMock()
+        if statement is _NOW:
+            result.scalar.return_value = now or datetime.datetime.now()
+            return result
+        rows = {_LOG_COUNTS: counts, _FIRST_LOGS: first_logs, _JOBS: jobs}[statement]
+        result.fetchall.return_value = rows
+        result.__iter__.return_value = iter(rows)
+        return result
+
+    session.execute.side_effect = execute
+    return session
+
+
+class TestJobSummary(TestCase):
+
+    def setUp(self) -> None:
+        self.now = datetime.datetime.now()
+        self.counts = [Row(jobid=1, infos=2, warnings=None, errors=1, first_logid=10, last_logid=12,
+                           first_timestamp=self.now, last_timestamp=self.now)]
+        self.first_logs = [Row(logid=10, process_id="p1", name="import", source="src", application="app",
+                               destination="dst", catalogue="cat", entity="ent")]
+        self.jobs = [Row(jobid=1, starttime=self.now - datetime.timedelta(hours=30), endtime=None,
+                         job_status="started", user="user", attribute=None,
+                         netto_duration=datetime.timedelta(minutes=5), step="compare", step_status="started",
+                         datainfos=0, datawarnings=0, dataerrors=0)]
+
+    def test_age_category(self):
+        self.assertEqual(_age_category(datetime.timedelta(hours=1)), " 0 - 24 uur")
+        self.assertEqual(_age_category(datetime.timedelta(hours=30)), "24 - 48 uur")
+        self.assertEqual(_age_category(datetime.timedelta(hours=50)), "48 - 96 uur")
+        self.assertEqual(_age_category(datetime.timedelta(hours=100)), "Ouder")
+
+    def test_matches(self):
+        job = {"catalogue": "cat", "startyear": 2020, "startmonth": 3}
+        self.assertTrue(_matches(job, {}))
+        self.assertTrue(_matches(job, {"catalogue": "cat", "startyear": "2020", "startmonth": "3"}))
+        self.assertFalse(_matches(job, {"catalogue": "other"}))
+        self.assertFalse(_matches(job, {"startyear": "2021"}))
+
+    def test_update(self):
+        summary = JobSummary(days=10)
+        session = mock_session(self.counts, self.first_logs, self.jobs)
+        summary.update(session, 12)
+        self.assertEqual(session.execute.call_count, 4)
+
+        jobs, partial = summary.jobs(10)
+        self.assertEqual(partial, set())
+        self.assertEqual(len(jobs), 1)
+        job = jobs[0]
+        self.assertEqual(job["jobid"], 1)
+        self.assertEqual(job["process_id"], "p1")
+        self.assertEqual(job["infos"], 2)
+        self.assertIsNone(job["warnings"])
+        self.assertEqual(job["status"], "started")
+        self.assertEqual(job["age_category"], "24 - 48 uur")
+        self.assertIsNone(job["bruto_duration"])
+
+        # No new logs, no queries
+        session.execute.reset_mock()
+        summary.update(session, 12)
+        session.execute.assert_not_called()
+
+        # New logs for an existing job are added to the counts, first log is not queried again
+        self.counts[0].update(infos=1, errors=None, first_logid=13, last_logid=14)
+        self.jobs[0].update(job_status="ended", endtime=self.now)
+        summary.update(session, 14)
+        self.assertEqual(session.execute.call_count, 3)
+        job = summary.jobs(10)[0][0]
+        self.assertEqual(job["infos"], 3)
+        self.assertEqual(job["errors"], 1)
+        self.assertEqual(job["status"], "ended")
+        self.assertEqual(job["bruto_duration"], datetime.timedelta(hours=30))
+
+    def test_update_no_logs(self):
+        summary = JobSummary(days=10)
+        session = mock_session([], [], [])
+        summary.update(session, None)
+        session.execute.assert_not_called()
+
+        self.assertEqual(summary.jobs(10), ([], set()))
+
+        summary.update(session, 5)
+        self.assertEqual(session.execute.call_count, 2)
+        self.assertEqual(summary.jobs(10), ([], set()))
+
+    def test_update_outside_lock(self):
+        summary = JobSummary(days=10)
+        session = mock_session(self.counts, self.first_logs, self.jobs)
+        execute = session.execute.side_effect
+
+        def unlocked_execute(statement, params=None):
+            # The jobs in the summary stay available while the logs are read
+            self.assertFalse(summary._lock.locked())
+            return execute(statement, params)
+        session.execute.side_effect = unlocked_execute
+
+        summary.update(session, 12)
+        self.assertEqual(len(summary.jobs(10)[0]), 1)
+
+        # Data versions that are behind the summary do not read any logs
+        session.execute.reset_mock()
+        summary.update(session, 11)
+        session.execute.assert_not_called()
+        self.assertEqual(summary._last_logid, 12)
+
+    def test_update_replaced(self):
+        summary = JobSummary(days=10)
+        session = mock_session(self.counts, self.first_logs, self.jobs)
+        execute = session.execute.side_effect
+
+        def rebuild_execute(statement, params=None):
+            # A rebuild replaces the summary while the logs are read
+            summary._last_logid = 20
+            return execute(statement, params)
+        session.execute.side_effect = rebuild_execute
+
+        summary.update(session, 12)
+        self.assertEqual(summary._jobs, {})
+        self.assertEqual(summary._last_logid, 20)
+
+    @patch("builtins.print")
+    @patch("gobmanagement.summary.get_last_logid", return_value=12)
+    @patch("gobmanagement.summary.session_scope")
+    def test_warm_up(self, mock_scope, mock_last_logid, mock_print):
+        summary = JobSummary(days=10)
+        mock_scope.return_value.__enter__.return_value = mock_session(self.counts, self.first_logs, self.jobs)
+        with patch("gobmanagement.summary.threading.Thread") as mock_thread:
+            summary.warm_up()
+            mock_thread.assert_called_once_with(target=summary._warm_up, daemon=True)
+            mock_thread.return_value.start.assert_called_once()
+
+        summary._warm_up()
+        self.assertEqual(summary._last_logid, 12)
+        self.assertEqual(len(summary.jobs(10)[0]), 1)
+
+        mock_scope.side_effect = Exception("any error")
+        summary._warm_up()
+        mock_print.assert_called_once()
+
+    @patch("gobmanagement.summary.threading.Thread")
+    def test_rebuild(self, mock_thread):
+        summary = JobSummary(days=10, rebuild_interval=60)
+        session = mock_session(self.counts, self.first_logs, self.jobs)
+        summary.update(session, 12)
+
+        # The summary is rebuilt in the background, the current summary is still used
+        with patch("gobmanagement.summary.time.time", lambda: summary._built_at + 61):
+            session.execute.reset_mock()
+            summary.update(session, 12)
+            session.execute.assert_not_called()
+            mock_thread.assert_called_with(target=summary._rebuild, args=(12,), daemon=True)
+            mock_thread.return_value.start.assert_called_once()
+
+            # Only one rebuild at a time
+            mock_thread.return_value.is_alive.return_value = True
+            summary.update(session, 12)
+            mock_thread.return_value.start.assert_called_once()
+
+        # The rebuilt summary replaces the current summary
+        with patch("gobmanagement.summary.session_scope") as mock_scope:
+            mock_scope.return_value.__enter__.return_value = session
+            summary._jobs[1]["infos"] = 100
+            summary._rebuild(12)
+        _, params = [call[0] for call in session.execute.call_args_list if call[0][0] is _LOG_COUNTS][0]
+        self.assertEqual(params["after_logid"], 0)
+        self.assertEqual(summary._jobs[1]["infos"], 2)
+        self.assertEqual(summary._last_logid, 12)
+
+    @patch("builtins.print")
+    def test_rebuild_failed(self, mock_print):
+        summary = JobSummary(days=10, rebuild_interval=60)
+        summary.update(mock_session(self.counts, self.first_logs, self.jobs), 12)
+        summary._built_at = 0
+        with patch("gobmanagement.summary.session_scope") as mock_scope:
+            mock_scope.side_effect = Exception("any error")
+            summary._rebuild(12)
+        mock_print.assert_called_once()
+        self.assertGreater(summary._built_at, 0)
+        self.assertEqual(summary._jobs[1]["infos"], 2)
+
+    def test_jobs(self):
+        summary = JobSummary(days=10)
+        summary.update(mock_session(self.counts, self.first_logs, self.jobs), 12)
+
+        self.assertEqual(len(summary.jobs(10, catalogue="cat")[0]), 1)
+        self.assertEqual(summary.jobs(10, catalogue="other"), ([], set()))
+        self.assertEqual(summary.jobs(10, jobid=2), ([], set()))
+        self.assertEqual(len(summary.jobs(10, jobids={1, 2})[0]), 1)
+        self.assertEqual(summary.jobs(10, jobids=set()), ([], set()))
+
+        # Jobs without recent logs are skipped
+        summary._jobs[1]["first_timestamp"] = summary._jobs[1]["last_timestamp"] = \
+            self.now - datetime.timedelta(days=5)
+        self.assertEqual(summary.jobs(2), ([], set()))
+        self.assertEqual(len(summary.jobs(10)[0]), 1)
+
+        # Jobs that also have logs before the window are reported separately, whatever the filters
+        summary._jobs[1]["last_timestamp"] = self.now
+        self.assertEqual(summary.jobs(2, catalogue="other"), ([], {1}))
+
+        # Jobs without job record are skipped
+        del summary._jobs[1]["starttime"]
+        self.assertEqual(summary.jobs(10), ([], set()))
+
+    def test_database_clock(self):
+        # Times are compared in the clock of the database, not the local clock
+        summary = JobSummary(days=10)
+        db_now = self.now - datetime.timedelta(days=3)
+        summary.update(mock_session(self.counts, self.first_logs, self.jobs, now=db_now), 12)
+        summary._jobs[1]["first_timestamp"] = summary._jobs[1]["last_timestamp"] = \
+            db_now - datetime.timedelta(days=1, hours=12)
+        self.assertEqual(len(summary.jobs(2)[0]), 1)
+        self.assertEqual(summary.jobs(1), ([], set()))
+        job = summary.jobs(10)[0][0]
+        self.assertAlmostEqual(job["time_ago"].total_seconds(), (db_now - job["starttime"]).total_seconds(), 0)
+
+    def test_prune(self):
+        summary = JobSummary(days=10)
+        summary.update(mock_session(self.counts, self.first_logs, self.jobs), 12)
+        summary._jobs[1]["last_timestamp"] = self.now - datetime.timedelta(days=11)
+        summary._prune()
+        self.assertEqual(summary._jobs, {})
@@ -0,0 +1,32 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from gobmanagement.versions import DataVersions, LAST_LOGID
+
+
+class TestDataVersions(TestCase):
+
+    @patch("gobmanagement.versions.session_scope")
+    @patch("gobmanagement.versions.time.time")
+    def test_get(self, mock_time, mock_scope):
+        mock_get_last_logid = MagicMock(return_value=10)
+        mock_time.return_value = 100
+
+        with patch.dict("gobmanagement.versions._QUERIES", {LAST_LOGID: mock_get_last_logid}):
+            versions = DataVersions(max_age=10)
+
+            # Unknown version is read from the database
+            self.assertEqual(versions.get(LAST_LOGID), 10)
+            mock_get_last_logid.assert_called_with(mock_scope.return_value.__enter__.return_value)
+
+            # Pushed versions are used without any database roundtrip
+            mock_get_last_logid.reset_mock()
+            versions.update(LAST_LOGID, 20)
+            mock_time.return_value = 110
+            self.assertEqual(versions.get(LAST_LOGID), 20)
+            mock_get_last_logid.assert_not_called()
+
+            # Outdated versions are read again from the database
+            mock_time.return_value = 111
+            self.assertEqual(versions.get(LAST_LOGID), 10)
+            mock_get_last_logid.assert_called_once()
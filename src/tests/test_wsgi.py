@@ -3,7 +3,11 @@ from unittest import TestCase, mock
 
 class TestWsgi(TestCase):
 
+    @mock.patch('gobmanagement.schemas.warm_up')
+    @mock.patch('gobmanagement.api.queue_sampler')
     @mock.patch('gobmanagement.api.app')
-    def test_wsgi(self, mock_app):
+    def test_wsgi(self, mock_app, mock_sampler, mock_warm_up):
         from gobmanagement.wsgi import application
         self.assertEqual(application, mock_app)
+        mock_sampler.start.assert_called_once()
+        mock_warm_up.assert_called_once()